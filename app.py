@@ -1,24 +1,55 @@
+import math
 import os
-import logging
-from flask import Flask, render_template, request, jsonify
+import re
+from datetime import datetime
+import click
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event, func, select, true, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
 from utils.openai_api import generate_marketing_report
 from utils.audience_insights import analyze_deep_audience_insights, filter_audience_noise, generate_precision_targeting_recommendations
+from utils.noise_filter import filter_event_noise
+from utils.segmentation import segment_customers
+from utils.audience_sketches import HyperLogLog, ID_COLUMNS, estimate_audience_overlap, normalize_email, union
+from utils.data_loading import detect_format, iter_column_chunks
+from utils.query_counter import init_query_counter
+from utils.db_pool import pool_engine_options, pool_status
+from utils.db_routing import ReplicaRouter, RoutingSession, replica_binds
+from utils.export import EXPORT_FORMATS, stream_export
+from utils.http_cache import conditional, init_compression, make_etag
+from utils.fast_json import engine_options as json_engine_options, init_json
+from utils.logging_config import configure_logging, init_request_logging
+from utils.metrics import init_metrics
+from utils.tracing import init_tracing, load_traces, render_waterfall, span
+from utils.admission import admission
+from utils.idempotency import IdempotencyStore
+from utils.profiling import profiler
+from utils.static_assets import static_assets
+from utils.bulk_import import DEFAULT_IMPORT_BATCH_SIZE, import_campaigns
+from utils.report_jobs import ReportJobQueue
+from utils.report_archive import archive_reports, report_archive
+from utils.report_storage import build_report_summary, compact_reports, resolve_payload
+from utils.rollups import RollupDelta, analytics_summary, apply_rollups, rebuild_rollups, record_deletes, table_version
+from utils.search import campaign_document, reindex_search, report_document, search_documents
+from utils.pagination import encode_cursor, keyset_page, parse_fields, parse_page_size, parse_timestamp, project_rows, serialize_value
 from integrations.ads_manager import AdsManager
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# JSON logs written by a background thread; LOG_LEVEL, LOG_LEVELS, LOG_SAMPLING, LOG_FORMAT
+configure_logging()
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+# orjson-backed jsonify() (stdlib json when orjson is not installed)
+init_json(app)
 CORS(app)
 
 # Database configuration
@@ -26,180 +57,793 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("STORAGE")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    # poolclass, pool_size, max_overflow and pool_timeout from DB_POOL_* env vars
+    **pool_engine_options(app.config["SQLALCHEMY_DATABASE_URI"]),
+    # JSON columns (report_data) encoded and decoded with the same library
+    **json_engine_options(),
 }
+# Optional read replicas (comma-separated URIs); GET requests read from them
+app.config["SQLALCHEMY_BINDS"] = replica_binds(os.environ.get("STORAGE_REPLICAS"))
 
 # Initialize extensions
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
+# Per-route latency/status histograms, in-flight gauge and GET /metrics (Prometheus)
+init_metrics(app)
+# Spans for sampled requests (TRACE_SAMPLE_RATE, or a trusted sampled traceparent), exported to TRACE_FILE
+init_tracing(app)
+# X-Request-ID on every response and log record, plus one access log record per request
+init_request_logging(app)
+# Per-request SQL statement count, returned as X-Query-Count
+init_query_counter(app)
+init_compression(app)
+# Content-hashed, cache-forever /static URLs (asset_url() in templates), precompressed at startup
+static_assets.init_app(app)
+# Opt-in CPU/memory profiles of single requests (X-Profile: PROFILE_TOKEN or PROFILE_SAMPLE_RATE)
+profiler.init_app(app)
+db_router = ReplicaRouter(db)
+db_router.init_app(app)
 
 # Import models after db initialization
-from models import Campaign, Report
+from models import (Campaign, Report, ReportSummary, AudienceSketch, SearchDocument,
+                    AnalyticsDaily, AnalyticsChannel, AnalyticsCampaignReports, AnalyticsTableVersion,
+                    IdempotencyKey)
 
 # Initialize advertising integrations
 ads_manager = AdsManager()
 
+# Background report generation for bulk-imported campaigns
+report_jobs = ReportJobQueue()
+
+# Idempotency-Key support for the report and insight generating POSTs;
+# keys are claimed (or replayed) before admission control sees the request
+idempotency = IdempotencyStore(db, IdempotencyKey)
+idempotency.init_app(app)
+# Concurrency limits, wait queues and per-client rate limits for the LLM/analysis endpoints (429/503)
+admission.init_app(app)
+
 with app.app_context():
-    db.create_all()
+    # Primary only; replicas get their schema through replication
+    db.create_all(bind_key=None)
+
+def get_request_data():
+    """Return the request payload from either a JSON body or a multipart form"""
+    if request.files or request.form:
+        data = request.form.to_dict()
+        if 'include_real_data' in data:
+            data['include_real_data'] = data['include_real_data'].lower() in ('1', 'true', 'yes', 'on')
+        for field in ('budget', 'estimated_audience_size'):
+            if data.get(field):
+                try:
+                    data[field] = float(data[field])
+                except ValueError:
+                    pass
+        return data
+    return request.get_json(silent=True)
+
+def analyze_audience_noise(data, default_size):
+    """Run the real noise filter on uploaded event data, or estimate from a size"""
+    event_file = request.files.get('event_data')
+    if event_file and event_file.filename:
+        fmt = detect_format(event_file.filename, data.get('event_data_format'))
+        return filter_event_noise(event_file.stream, fmt)
+    return filter_audience_noise({'total_users': data.get('estimated_audience_size', default_size)})
+
+def analyze_customer_segments(data):
+    """Cluster an uploaded customer feature table, or return None when absent"""
+    customer_file = request.files.get('customer_data')
+    if not customer_file or not customer_file.filename:
+        return None
+    fmt = detect_format(customer_file.filename, data.get('customer_data_format'))
+    try:
+        n_segments = int(data.get('segment_count') or 3)
+    except (TypeError, ValueError):
+        raise ValueError('segment_count must be a whole number')
+    return segment_customers(
+        customer_file.stream,
+        fmt,
+        n_segments=n_segments,
+        value_column=data.get('value_column') or None
+    )
+
+def load_audience_overlap(level='platform'):
+    """Merge stored audience sketches and estimate deduplicated reach and overlap"""
+    sketches = {}
+    for record in AudienceSketch.query.all():
+        sketch = HyperLogLog.from_bytes(record.registers, record.precision)
+        if level == 'campaign':
+            label = f"{record.platform}:{record.campaign_ref}" if record.campaign_ref else record.platform
+            sketches[label] = sketch
+        else:
+            sketches[record.platform] = union([sketches[record.platform], sketch]) if record.platform in sketches else sketch
+    if not sketches:
+        return None
+    return estimate_audience_overlap(sketches)
 
 @app.route('/')
 def index():
-    """Render the main dashboard page"""
-    return render_template('index.html')
+    """Render the main dashboard page (once per process; it has no per-request content)"""
+    return static_assets.page('index.html')
+
+def parse_budget(value):
+    """Budget as a finite, positive float; ValueError otherwise"""
+    try:
+        budget = float(value)
+    except (ValueError, TypeError):
+        raise ValueError('Budget must be a valid number')
+    if not math.isfinite(budget) or budget <= 0:
+        raise ValueError('Budget must be a positive number')
+    return budget
+
+def parse_duration(value):
+    """Duration in days as an int of at least 1; ValueError otherwise"""
+    try:
+        duration = int(value)
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError('Duration must be a valid number')
+    if duration <= 0:
+        raise ValueError('Duration must be a positive number')
+    return duration
+
+def parse_targeting_span(data):
+    """Optional budget (None when absent) and duration (default 30 days) of an audience request"""
+    budget = data.get('budget')
+    budget = parse_budget(budget) if budget not in (None, '') else None
+    return budget, parse_duration(data.get('duration') or 30)
+
+def validate_campaign_request(data):
+    """
+    Campaign fields of a report generation request
+
+    Raises ValueError with a client-facing message when the body is missing,
+    incomplete or has a non-positive budget or duration.
+    """
+    if not data:
+        raise ValueError('No data provided')
+
+    # Required fields validation
+    required_fields = ['campaign_name', 'target_audience', 'budget', 'duration', 'objectives']
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        raise ValueError(f'Missing required fields: {", ".join(missing_fields)}')
+
+    return {
+        'campaign_name': data.get('campaign_name'),
+        'target_audience': data.get('target_audience'),
+        'budget': parse_budget(data.get('budget')),
+        'duration': parse_duration(data.get('duration')),
+        'objectives': data.get('objectives'),
+        'channels': data.get('channels', ''),
+        'current_metrics': data.get('current_metrics', '')
+    }
+
+def fetch_real_ads_data():
+    """Current campaigns and 30-day performance from the connected ad platforms, or {}"""
+    try:
+        # Get current campaigns and performance; one span per platform call inside
+        with span('ads.fetch'):
+            campaigns_data = ads_manager.get_all_campaigns()
+            performance_data = ads_manager.get_all_performance_data(days=30)
+
+        real_ads_data = {
+            'campaigns': campaigns_data,
+            'performance': performance_data,
+            'connected_platforms': ads_manager.connected_platforms
+        }
+
+        app.logger.info("Retrieved real ads data from %s platforms", len(ads_manager.connected_platforms))
+        return real_ads_data
+    except Exception as e:
+        app.logger.warning("Could not retrieve real ads data: %s", e)
+        return {}
+
+def platform_integrations(real_ads_data):
+    """Platform integration status added to reports generated with ads data"""
+    return {
+        'status': ads_manager.get_connection_status(),
+        'real_data_included': bool(real_ads_data),
+        'connected_platforms': ads_manager.connected_platforms
+    }
+
+# The report generation views, here and their async twins in asgi.py, are
+# these helpers around one LLM call: sync here, awaited there
+def start_report(data, with_ads):
+    """
+    Campaign fields of a report generation request, logged as started
+
+    Raises ValueError with a client-facing message for a bad request.
+    """
+    with span('validate'):
+        campaign_fields = validate_campaign_request(data)
+    app.logger.info("Generating %s for campaign: %s", 'enhanced report' if with_ads else 'report',
+                    campaign_fields['campaign_name'])
+    return campaign_fields
+
+def wants_real_ads_data(data, with_ads):
+    return with_ads and data.get('include_real_data', True)
+
+def finish_report(campaign_fields, report, real_ads_data, with_ads):
+    """Save a generated report with its campaign and build the success response"""
+    if with_ads:
+        # Add platform integration status to report
+        report['platform_integrations'] = platform_integrations(real_ads_data)
+
+    campaign_id, report_id = save_generated_report(Campaign(**campaign_fields), report)
+
+    app.logger.info("%s generated and saved successfully", 'Enhanced report' if with_ads else 'Report')
+
+    payload = {
+        'success': True,
+        'report': report,
+        'campaign_id': campaign_id,
+        'report_id': report_id
+    }
+    if with_ads:
+        payload['real_data_included'] = bool(real_ads_data)
+    return jsonify(payload)
+
+def report_failed(error, with_ads):
+    label = 'enhanced report' if with_ads else 'report'
+    app.logger.error("Error generating %s: %s", label, error)
+    # Rollback in case of error
+    db.session.rollback()
+    return jsonify({
+        'success': False,
+        'error': f'Failed to generate {label}: {str(error)}'
+    }), 500
 
 @app.route('/generate-report', methods=['POST'])
+@idempotency.idempotent
 def generate_report():
     """Generate marketing campaign report using OpenAI GPT-4"""
     try:
-        # Validate request data
-        data = request.get_json()
-        if not data:
+        try:
+            campaign_fields = start_report(request.get_json(), with_ads=False)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': 'No data provided'
+                'error': str(e)
             }), 400
 
-        # Required fields validation
-        required_fields = ['campaign_name', 'target_audience', 'budget', 'duration', 'objectives']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        
-        if missing_fields:
+        # Generate report using OpenAI before touching the database, so no
+        # pooled connection is held while waiting on the LLM
+        report = generate_marketing_report(**campaign_fields)
+
+        return finish_report(campaign_fields, report, None, with_ads=False)
+
+    except Exception as e:
+        return report_failed(e, with_ads=False)
+
+CAMPAIGN_LIST_FIELDS = ['id', 'campaign_name', 'target_audience', 'budget', 'duration', 'objectives',
+                        'channels', 'current_metrics', 'created_at']
+REPORT_SUMMARY_FIELDS = ['executive_summary', 'total_budget', 'daily_budget', 'roi_projection',
+                         'primary_metrics', 'success_benchmarks']
+REPORT_LIST_FIELDS = ['id', 'campaign_id', 'report_data', 'generated_at'] + REPORT_SUMMARY_FIELDS
+REPORT_DEFAULT_FIELDS = ['id', 'campaign_id', 'generated_at']
+# Field name -> column for /reports, including the report_summary side table
+REPORT_COLUMNS = {
+    **{column.key: column for column in Report.__table__.c},
+    **{name: ReportSummary.__table__.c[name] for name in REPORT_SUMMARY_FIELDS}
+}
+PAYLOAD_COLUMNS = ['report_data', 'payload_blob', 'payload_codec',
+                   'archive_segment', 'archive_offset', 'archive_length']
+
+def paginated_list(model, timestamp_column, fields, filters, columns=None, joins=()):
+    """
+    Run a keyset-paginated, column-projected list query for a model
+
+    `columns` maps field names to columns (defaults to the model's own) and
+    `joins` lists (table, onclause) pairs outer-joined for the extra columns.
+    Returns the raw rows, labelled by field name, and the next cursor.
+    """
+    limit = parse_page_size(request.args.get('limit'))
+    columns = columns if columns is not None else model.__table__.c
+    # The cursor needs the id and timestamp even when they are not returned
+    selected = list(dict.fromkeys(fields + ['id', timestamp_column.key]))
+    statement = select(*[columns[name].label(name) for name in selected]).select_from(model.__table__)
+    for table, onclause in joins:
+        statement = statement.outerjoin(table, onclause)
+    statement = keyset_page(statement.where(*filters), timestamp_column, model.id, request.args.get('cursor'), limit)
+
+    rows = db.session.execute(statement).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last[timestamp_column.key], last['id'])
+    return rows, next_cursor
+
+def list_etag(model):
+    """
+    ETag for a list page: the table's row count and write version plus the query string
+
+    Both are kept in analytics_table_version by the transactions that insert
+    or delete rows (compaction and archiving change storage, not content),
+    so this is one primary key lookup instead of a scan of the table.
+    """
+    return make_etag(model.__tablename__, table_version(db.session, TABLE_VERSIONS, model.__tablename__),
+                     request.query_string)
+
+def build_report_record(campaign, report_data):
+    """New Report row with its list-view summary attached"""
+    generated_at = datetime.utcnow()
+    report_record = Report(campaign_id=campaign.id, report_data=report_data, generated_at=generated_at)
+    report_record.summary = ReportSummary(
+        campaign_id=campaign.id,
+        generated_at=generated_at,
+        **build_report_summary(report_data, campaign.budget, campaign.duration)
+    )
+    return report_record
+
+ROLLUP_TABLES = (AnalyticsDaily.__table__, AnalyticsChannel.__table__, AnalyticsCampaignReports.__table__)
+# Row count and write version per table, for the list ETags
+TABLE_VERSIONS = AnalyticsTableVersion.__table__
+
+@event.listens_for(Campaign, 'after_delete')
+@event.listens_for(Report, 'after_delete')
+def count_deleted_row(mapper, connection, target):
+    """Deletes change the list ETags too, in the deleting transaction"""
+    record_deletes(connection, TABLE_VERSIONS, mapper.local_table.name)
+
+def update_rollups(connection, campaigns=(), reports=()):
+    """Count new campaigns and reports into the analytics rollups, in the caller's transaction"""
+    delta = RollupDelta()
+    for campaign in campaigns:
+        delta.add_campaign(campaign.budget, campaign.channels, campaign.created_at)
+    for report in reports:
+        delta.add_report(report.campaign_id, report.generated_at)
+    apply_rollups(connection, delta, *ROLLUP_TABLES, TABLE_VERSIONS)
+
+def rollup_imported_batch(connection, columns, ids, created_at):
+    """import_campaigns hook: rollups for one bulk-inserted batch"""
+    delta = RollupDelta()
+    for budget, channels in zip(columns['budget'].tolist(), columns['channels'].tolist()):
+        delta.add_campaign(budget, channels, created_at)
+    apply_rollups(connection, delta, *ROLLUP_TABLES, TABLE_VERSIONS)
+
+def save_generated_report(campaign, report_data):
+    """
+    Insert a campaign and its generated report in one short transaction
+
+    Called only after the upstream LLM/ads calls have finished, so the
+    connection is checked out for the inserts alone and a failed generation
+    leaves no orphan campaign behind. Returns (campaign_id, report_id).
+    """
+    try:
+        with span('db.save_report'):
+            db.session.add(campaign)
+            db.session.flush()
+            report_record = build_report_record(campaign, report_data)
+            db.session.add(report_record)
+            db.session.flush()
+            db.session.add(SearchDocument(**campaign_document(campaign)))
+            db.session.add(SearchDocument(**report_document(report_record, campaign)))
+            update_rollups(db.session.connection(), campaigns=[campaign], reports=[report_record])
+            # Read the ids before commit expires them, which would cost another query
+            ids = campaign.id, report_record.id
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return ids
+
+def generate_report_for_campaign(campaign_id):
+    """Background job: generate and store a report for an existing campaign"""
+    with app.app_context():
+        campaign = db.session.get(Campaign, campaign_id)
+        if campaign is None:
+            raise ValueError(f"Campaign {campaign_id} not found")
+        # Detach and end the read transaction so no connection is held during the LLM call
+        db.session.expunge(campaign)
+        db.session.rollback()
+
+        report = generate_marketing_report(
+            campaign_name=campaign.campaign_name,
+            target_audience=campaign.target_audience,
+            budget=campaign.budget,
+            duration=campaign.duration,
+            objectives=campaign.objectives,
+            channels=campaign.channels or '',
+            current_metrics=campaign.current_metrics or ''
+        )
+
+        try:
+            report_record = build_report_record(campaign, report)
+            db.session.add(report_record)
+            db.session.flush()
+            db.session.add(SearchDocument(**report_document(report_record, campaign)))
+            update_rollups(db.session.connection(), reports=[report_record])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+@app.route('/campaigns', methods=['GET'])
+def get_campaigns():
+    """Get campaigns, newest first, one keyset page at a time"""
+    try:
+        try:
+            fields = parse_fields(request.args.get('fields'), CAMPAIGN_LIST_FIELDS, CAMPAIGN_LIST_FIELDS)
+            filters = []
+            since = parse_timestamp(request.args.get('since'), 'since')
+            until = parse_timestamp(request.args.get('until'), 'until')
+            if since:
+                filters.append(Campaign.created_at >= since)
+            if until:
+                filters.append(Campaign.created_at < until)
+
+            def build():
+                rows, next_cursor = paginated_list(Campaign, Campaign.created_at, fields, filters)
+                return jsonify({
+                    'success': True,
+                    'campaigns': project_rows(rows, fields),
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None
+                })
+
+            # Unchanged since the client's copy: 304 without running the page query
+            return conditional(list_etag(Campaign), build)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
+                'error': str(e)
             }), 400
+    except Exception as e:
+        app.logger.error("Error fetching campaigns: %s", e)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to fetch campaigns: {str(e)}'
+        }), 500
+
+REPORT_VIEWS = ['full', 'summary', 'none']
+DEFAULT_EMBEDDED_REPORTS = 20
 
-        # Validate budget is numeric
+@app.route('/campaigns/<int:campaign_id>', methods=['GET'])
+def get_campaign(campaign_id):
+    """Get a specific campaign with one keyset page of its reports, in a single query"""
+    try:
         try:
-            budget = float(data.get('budget', 0))
-            if budget <= 0:
-                return jsonify({
-                    'success': False,
-                    'error': 'Budget must be a positive number'
-                }), 400
-        except (ValueError, TypeError):
+            view = request.args.get('reports', 'full')
+            if view not in REPORT_VIEWS:
+                raise ValueError(f"'reports' must be one of: {', '.join(REPORT_VIEWS)}")
+            limit = parse_page_size(request.args.get('reports_limit') or str(DEFAULT_EMBEDDED_REPORTS))
+
+            if view == 'none':
+                rows = db.session.execute(select(Campaign).where(Campaign.id == campaign_id)).all()
+            else:
+                if view == 'full':
+                    columns = [Report.id, Report.generated_at] + [Report.__table__.c[name] for name in PAYLOAD_COLUMNS]
+                    reports_from = Report.__table__
+                else:
+                    # Summaries come from the side table, never touching the payload
+                    columns = [Report.id, Report.generated_at] + [
+                        ReportSummary.__table__.c[name] for name in REPORT_SUMMARY_FIELDS
+                    ]
+                    reports_from = Report.__table__.outerjoin(ReportSummary, ReportSummary.report_id == Report.id)
+                page = keyset_page(
+                    select(*columns).select_from(reports_from).where(Report.campaign_id == campaign_id),
+                    Report.generated_at, Report.id, request.args.get('reports_cursor'), limit
+                ).subquery()
+                # The campaign row is joined onto each report of the page, so the
+                # campaign and its reports arrive in one round trip
+                statement = (
+                    select(Campaign, *[column.label(f'report_{column.key}') for column in page.c])
+                    .outerjoin(page, true())
+                    .where(Campaign.id == campaign_id)
+                    .order_by(page.c.generated_at.desc(), page.c.id.desc())
+                )
+                rows = db.session.execute(statement).all()
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': 'Budget must be a valid number'
+                'error': str(e)
             }), 400
 
-        # Validate duration is numeric
+        if not rows:
+            return jsonify({
+                'success': False,
+                'error': 'Campaign not found'
+            }), 404
+
+        campaign_data = rows[0][0].to_dict()
+        if view != 'none':
+            rows = [row._mapping for row in rows if row._mapping['report_id'] is not None]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            reports = []
+            for row in rows:
+                report = {'id': row['report_id'], 'campaign_id': campaign_id,
+                          'generated_at': serialize_value(row['report_generated_at'])}
+                if view == 'full':
+                    report['report_data'] = resolve_payload(
+                        row['report_report_data'], row['report_payload_blob'], row['report_payload_codec'],
+                        (row['report_archive_segment'], row['report_archive_offset'], row['report_archive_length'])
+                    )
+                else:
+                    report.update({name: row[f'report_{name}'] for name in REPORT_SUMMARY_FIELDS})
+                reports.append(report)
+            campaign_data['reports'] = reports
+            campaign_data['reports_next_cursor'] = (
+                encode_cursor(rows[-1]['report_generated_at'], rows[-1]['report_id']) if has_more else None
+            )
+        
+        return jsonify({
+            'success': True,
+            'campaign': campaign_data
+        })
+    except Exception as e:
+        app.logger.error("Error fetching campaign: %s", e)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to fetch campaign: {str(e)}'
+        }), 500
+
+@app.route('/reports', methods=['GET'])
+def get_reports():
+    """Get reports, newest first, one keyset page at a time (report_data only on request)"""
+    try:
         try:
-            duration = int(data.get('duration', 0))
-            if duration <= 0:
+            fields = parse_fields(request.args.get('fields'), REPORT_LIST_FIELDS, REPORT_DEFAULT_FIELDS)
+            filters = []
+            since = parse_timestamp(request.args.get('since'), 'since')
+            until = parse_timestamp(request.args.get('until'), 'until')
+            if since:
+                filters.append(Report.generated_at >= since)
+            if until:
+                filters.append(Report.generated_at < until)
+            if request.args.get('campaign_id'):
+                filters.append(Report.campaign_id == int(request.args['campaign_id']))
+
+            # Summary fields come from the small side table; report_data is
+            # rebuilt from whichever payload column holds it
+            selected = [field for field in fields if field != 'report_data']
+            if 'report_data' in fields:
+                selected += PAYLOAD_COLUMNS
+            joins = []
+            if set(fields) & set(REPORT_SUMMARY_FIELDS):
+                joins.append((ReportSummary.__table__, ReportSummary.report_id == Report.id))
+
+            def build():
+                rows, next_cursor = paginated_list(Report, Report.generated_at, selected, filters,
+                                                   columns=REPORT_COLUMNS, joins=joins)
+                reports = project_rows(rows, [field for field in fields if field != 'report_data'])
+                if 'report_data' in fields:
+                    for report, row in zip(reports, rows):
+                        report['report_data'] = resolve_payload(
+                            row.report_data, row.payload_blob, row.payload_codec,
+                            (row.archive_segment, row.archive_offset, row.archive_length)
+                        )
                 return jsonify({
-                    'success': False,
-                    'error': 'Duration must be a positive number'
-                }), 400
-        except (ValueError, TypeError):
+                    'success': True,
+                    'reports': reports,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None
+                })
+
+            return conditional(list_etag(Report), build)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': 'Duration must be a valid number'
+                'error': str(e)
             }), 400
+    except Exception as e:
+        app.logger.error("Error fetching reports: %s", e)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to fetch reports: {str(e)}'
+        }), 500
 
-        app.logger.info(f"Generating report for campaign: {data.get('campaign_name')}")
-
-        # Save campaign to database
-        campaign = Campaign(
-            campaign_name=data.get('campaign_name'),
-            target_audience=data.get('target_audience'),
-            budget=budget,
-            duration=duration,
-            objectives=data.get('objectives'),
-            channels=data.get('channels', ''),
-            current_metrics=data.get('current_metrics', '')
+def export_response(statement, fields, name, transform=None):
+    """Streaming NDJSON/CSV download of a select(), optionally gzipped"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"'format' must be one of: {', '.join(EXPORT_FORMATS)}")
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    filename = f"{name}.{fmt}" + ('.gz' if gzip else '')
+
+    chunks = stream_export(db_router.read_engine(), statement, fields, fmt, transform=transform, gzip=gzip)
+    response = Response(stream_with_context(chunks),
+                        mimetype='application/gzip' if gzip else EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def export_filters(timestamp_column):
+    filters = []
+    since = parse_timestamp(request.args.get('since'), 'since')
+    until = parse_timestamp(request.args.get('until'), 'until')
+    if since:
+        filters.append(timestamp_column >= since)
+    if until:
+        filters.append(timestamp_column < until)
+    return filters
+
+@app.route('/export/campaigns', methods=['GET'])
+def export_campaigns():
+    """Stream every campaign as NDJSON or CSV"""
+    try:
+        fields = parse_fields(request.args.get('fields'), CAMPAIGN_LIST_FIELDS, CAMPAIGN_LIST_FIELDS)
+        statement = (
+            select(*[Campaign.__table__.c[name] for name in fields])
+            .where(*export_filters(Campaign.created_at))
+            .order_by(Campaign.id)
         )
-        
-        db.session.add(campaign)
-        db.session.commit()
+        return export_response(statement, fields, 'campaigns')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
 
-        # Generate report using OpenAI
-        report = generate_marketing_report(
-            campaign_name=data.get('campaign_name'),
-            target_audience=data.get('target_audience'),
-            budget=budget,
-            duration=duration,
-            objectives=data.get('objectives'),
-            channels=data.get('channels', ''),
-            current_metrics=data.get('current_metrics', '')
-        )
+@app.route('/export/reports', methods=['GET'])
+def export_reports():
+    """Stream every report (with its summary fields) as NDJSON or CSV"""
+    try:
+        fields = parse_fields(request.args.get('fields'), REPORT_LIST_FIELDS, REPORT_LIST_FIELDS)
+        filters = export_filters(Report.generated_at)
+        if request.args.get('campaign_id'):
+            filters.append(Report.campaign_id == int(request.args['campaign_id']))
+
+        selected = [field for field in fields if field != 'report_data']
+        if 'report_data' in fields:
+            selected = list(dict.fromkeys(selected + PAYLOAD_COLUMNS))
+        statement = select(*[REPORT_COLUMNS[name].label(name) for name in selected]).select_from(Report.__table__)
+        if set(fields) & set(REPORT_SUMMARY_FIELDS):
+            statement = statement.outerjoin(ReportSummary, ReportSummary.report_id == Report.id)
+        statement = statement.where(*filters).order_by(Report.id)
+
+        def rehydrate(row):
+            row['report_data'] = resolve_payload(
+                row.pop('report_data'), row.pop('payload_blob'), row.pop('payload_codec'),
+                (row.pop('archive_segment'), row.pop('archive_offset'), row.pop('archive_length'))
+            )
+            return row
+
+        return export_response(statement, fields, 'reports',
+                               transform=rehydrate if 'report_data' in fields else None)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
 
-        # Save report to database
-        report_record = Report(
-            campaign_id=campaign.id,
-            report_data=report
-        )
-        db.session.add(report_record)
-        db.session.commit()
+@app.route('/campaigns/import', methods=['POST'])
+def import_campaigns_endpoint():
+    """Bulk-create campaigns from an uploaded CSV or NDJSON file"""
+    try:
+        try:
+            upload = request.files.get('file')
+            if upload and upload.filename:
+                fmt = detect_format(upload.filename, request.values.get('format'))
+                source = upload.stream
+            elif request.content_length:
+                # Raw request body; the format must be given explicitly
+                fmt = detect_format('', request.values.get('format') or 'csv')
+                source = request.stream
+            else:
+                raise ValueError("Upload a CSV or NDJSON file as 'file' or send it as the request body")
+            batch_size = int(request.values.get('batch_size') or DEFAULT_IMPORT_BATCH_SIZE)
+            generate_reports = request.values.get('generate_reports', '').lower() in ('1', 'true', 'yes')
+            # Refuse before importing anything, so a retry does not import twice
+            if generate_reports and report_jobs.available() == 0:
+                response = jsonify({
+                    'success': False,
+                    'error': 'The report job queue is full, retry later'
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = '60'
+                return response
+
+            result = import_campaigns(db.engine, source, fmt, batch_size=batch_size,
+                                      on_batch=rollup_imported_batch)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
 
-        app.logger.info("Report generated and saved successfully")
+        campaign_ids = result.pop('campaign_ids')
+        result['reports_queued'] = report_jobs.enqueue(generate_report_for_campaign, campaign_ids) if generate_reports else 0
+        # Campaigns that did not fit in the job queue; they are imported without a report
+        result['reports_not_queued'] = campaign_ids[result['reports_queued']:] if generate_reports else []
 
         return jsonify({
             'success': True,
-            'report': report,
-            'campaign_id': campaign.id,
-            'report_id': report_record.id
+            **result
         })
-
     except Exception as e:
-        app.logger.error(f"Error generating report: {str(e)}")
-        # Rollback in case of error
-        db.session.rollback()
+        app.logger.error("Error importing campaigns: %s", e)
         return jsonify({
             'success': False,
-            'error': f'Failed to generate report: {str(e)}'
+            'error': f'Failed to import campaigns: {str(e)}'
         }), 500
 
-@app.route('/campaigns', methods=['GET'])
-def get_campaigns():
-    """Get all campaigns"""
+@app.route('/report-jobs', methods=['GET'])
+def get_report_jobs():
+    """Progress of background report generation"""
+    return jsonify({
+        'success': True,
+        'jobs': report_jobs.stats()
+    })
+
+@app.route('/search', methods=['GET'])
+def search():
+    """Full-text search over campaigns and reports, best match first"""
     try:
-        campaigns = Campaign.query.order_by(Campaign.created_at.desc()).all()
+        try:
+            limit = parse_page_size(request.args.get('limit') or '20')
+            found = search_documents(db.session, request.args.get('q', ''),
+                                     kind=request.args.get('kind') or None, limit=limit)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         return jsonify({
             'success': True,
-            'campaigns': [campaign.to_dict() for campaign in campaigns]
+            'query': request.args.get('q'),
+            **found
         })
     except Exception as e:
-        app.logger.error(f"Error fetching campaigns: {str(e)}")
+        app.logger.error("Error searching: %s", e)
         return jsonify({
             'success': False,
-            'error': f'Failed to fetch campaigns: {str(e)}'
+            'error': f'Failed to search: {str(e)}'
         }), 500
 
-@app.route('/campaigns/<int:campaign_id>', methods=['GET'])
-def get_campaign(campaign_id):
-    """Get a specific campaign with its reports"""
+@app.route('/analytics/summary', methods=['GET'])
+def get_analytics_summary():
+    """Dashboard counts and spend trends, read from the precomputed rollup tables"""
     try:
-        campaign = Campaign.query.get_or_404(campaign_id)
-        campaign_data = campaign.to_dict()
-        campaign_data['reports'] = [report.to_dict() for report in campaign.reports]
-        
+        try:
+            days = int(request.args.get('days', 30))
+            top = int(request.args.get('top', 10))
+            if not 1 <= days <= 366:
+                raise ValueError("'days' must be between 1 and 366")
+            if not 1 <= top <= 100:
+                raise ValueError("'top' must be between 1 and 100")
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         return jsonify({
             'success': True,
-            'campaign': campaign_data
+            **analytics_summary(db.session, *ROLLUP_TABLES, days=days, top=top)
         })
     except Exception as e:
-        app.logger.error(f"Error fetching campaign: {str(e)}")
+        app.logger.error("Error reading analytics: %s", e)
         return jsonify({
             'success': False,
-            'error': f'Failed to fetch campaign: {str(e)}'
+            'error': f'Failed to read analytics: {str(e)}'
         }), 500
 
-@app.route('/reports', methods=['GET'])
-def get_reports():
-    """Get all reports"""
+@app.route('/db/pool', methods=['GET'])
+def get_db_pool_status():
+    """Connection pool occupancy and how long requests waited for a connection"""
     try:
-        reports = Report.query.order_by(Report.generated_at.desc()).all()
         return jsonify({
             'success': True,
-            'reports': [report.to_dict() for report in reports]
+            'pool': pool_status(db.engine),
+            'read_routing': db_router.status()
         })
     except Exception as e:
-        app.logger.error(f"Error fetching reports: {str(e)}")
+        app.logger.error("Error reading pool status: %s", e)
         return jsonify({
             'success': False,
-            'error': f'Failed to fetch reports: {str(e)}'
+            'error': f'Failed to read pool status: {str(e)}'
         }), 500
 
+@app.route('/admission', methods=['GET'])
+def get_admission_status():
+    """Active and queued requests per gated endpoint, with their limits"""
+    return jsonify({
+        'success': True,
+        'admission': admission.status()
+    })
+
 @app.route('/ads/status', methods=['GET'])
 def get_ads_status():
     """Get connection status for all advertising platforms"""
@@ -210,7 +854,7 @@ def get_ads_status():
             'status': status
         })
     except Exception as e:
-        app.logger.error(f"Error getting ads status: {str(e)}")
+        app.logger.error("Error getting ads status: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to get ads status: {str(e)}'
@@ -220,13 +864,13 @@ def get_ads_status():
 def get_ads_campaigns():
     """Get campaigns from all connected advertising platforms"""
     try:
-        campaigns_data = ads_manager.get_all_campaigns()
-        return jsonify({
+        campaigns_data, fingerprint = ads_manager.get_cached_campaigns()
+        return conditional(fingerprint, lambda: jsonify({
             'success': True,
             **campaigns_data
-        })
+        }))
     except Exception as e:
-        app.logger.error(f"Error fetching ads campaigns: {str(e)}")
+        app.logger.error("Error fetching ads campaigns: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to fetch ads campaigns: {str(e)}'
@@ -237,18 +881,14 @@ def get_ads_performance():
     """Get performance data from all connected advertising platforms"""
     try:
         days = int(request.args.get('days', 30))
-        performance_data = ads_manager.get_all_performance_data(days=days)
-        
-        # Generate cross-platform insights
-        insights = ads_manager.generate_cross_platform_insights(performance_data)
-        performance_data['insights'] = insights
-        
-        return jsonify({
+        # Includes the cross-platform insights
+        performance_data, fingerprint = ads_manager.get_cached_performance(days=days)
+        return conditional(fingerprint, lambda: jsonify({
             'success': True,
             **performance_data
-        })
+        }))
     except Exception as e:
-        app.logger.error(f"Error fetching ads performance: {str(e)}")
+        app.logger.error("Error fetching ads performance: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to fetch ads performance: {str(e)}'
@@ -264,129 +904,167 @@ def get_ads_accounts():
             'accounts': accounts
         })
     except Exception as e:
-        app.logger.error(f"Error fetching ads accounts: {str(e)}")
+        app.logger.error("Error fetching ads accounts: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to fetch ads accounts: {str(e)}'
         }), 500
 
-@app.route('/generate-report-with-ads', methods=['POST'])
-def generate_report_with_ads():
-    """Generate marketing report using both form data and real advertising data"""
+def request_list(data, name):
+    """A list field: a JSON array, or form fields (repeated and/or comma or newline separated)"""
+    if request.form:
+        return [value for field in request.form.getlist(name) for value in re.split(r'[,\s]+', field)]
+    value = data.get(name) or []
+    return re.split(r'[,\s]+', value) if isinstance(value, str) else value
+
+# Attempts at the read-merge-write of one audience sketch before giving up
+SKETCH_SAVE_ATTEMPTS = 5
+
+def save_audience_sketch(platform, campaign_ref, sketch, ids_added):
+    """
+    Merge sketch into the stored one for (platform, campaign_ref), or create it
+
+    The row is locked (SELECT ... FOR UPDATE) while it is merged, and the
+    write only applies if the stored registers are still the ones merged,
+    which covers SQLite, where there are no row locks. A concurrent insert
+    of the first sketch, or a concurrent write, makes it start over from the
+    uploaded sketch alone. Returns the record and the merged sketch.
+    """
+    for _ in range(SKETCH_SAVE_ATTEMPTS):
+        try:
+            record = (AudienceSketch.query.filter_by(platform=platform, campaign_ref=campaign_ref)
+                      .with_for_update().first())
+            # Merge into a copy, so a retry never merges the stored sketch twice
+            merged = sketch.copy()
+            if record is None:
+                record = AudienceSketch(platform=platform, campaign_ref=campaign_ref, precision=sketch.precision,
+                                        registers=merged.to_bytes(), ids_added=ids_added)
+                db.session.add(record)
+                db.session.commit()
+                return record, merged
+            previous = record.registers
+            merged.merge(HyperLogLog.from_bytes(previous, record.precision))
+            written = db.session.execute(
+                update(AudienceSketch)
+                .where(AudienceSketch.id == record.id, AudienceSketch.registers == previous)
+                .values(registers=merged.to_bytes(), ids_added=AudienceSketch.ids_added + ids_added,
+                        updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if written:
+                db.session.commit()
+                db.session.refresh(record)
+                return record, merged
+            db.session.rollback()
+        except IntegrityError:
+            db.session.rollback()
+    raise RuntimeError('Audience sketch is being updated concurrently, retry the upload')
+
+@app.route('/audience-sketches', methods=['POST'])
+def upload_audience_sketch():
+    """Build or extend a HyperLogLog audience sketch from user ids or emails"""
     try:
-        # Validate request data
-        data = request.get_json()
-        if not data:
+        data = get_request_data() or {}
+        platform = (data.get('platform') or '').strip()
+        if not platform:
             return jsonify({
                 'success': False,
-                'error': 'No data provided'
-            }), 400
-
-        # Required fields validation
-        required_fields = ['campaign_name', 'target_audience', 'budget', 'duration', 'objectives']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}'
+                'error': 'Platform is required'
             }), 400
+        campaign_ref = str(data.get('campaign_id') or '').strip()
+
+        sketch = HyperLogLog()
+        ids_added = 0
+        ids_file = request.files.get('ids_file')
+        if ids_file and ids_file.filename:
+            fmt = detect_format(ids_file.filename, data.get('ids_format'))
+            for chunk in iter_column_chunks(ids_file.stream, fmt, columns=ID_COLUMNS):
+                ids = [value for value in chunk.get('user_id', []) if value not in (None, '')]
+                ids += [str(value).strip().lower() for value in chunk.get('hashed_email', []) if value]
+                ids += [normalize_email(str(value)) for value in chunk.get('email', []) if value]
+                sketch.add(ids)
+                ids_added += len(ids)
+        else:
+            ids = [str(value) for value in request_list(data, 'ids') if value not in (None, '')]
+            ids += [str(value).strip().lower() for value in request_list(data, 'hashed_emails') if value]
+            ids += [normalize_email(str(value)) for value in request_list(data, 'emails') if value]
+            sketch.add(ids)
+            ids_added = len(ids)
 
-        # Validate budget and duration
-        try:
-            budget = float(data.get('budget', 0))
-            duration = int(data.get('duration', 0))
-            if budget <= 0 or duration <= 0:
-                return jsonify({
-                    'success': False,
-                    'error': 'Budget and duration must be positive numbers'
-                }), 400
-        except (ValueError, TypeError):
+        if not ids_added:
             return jsonify({
                 'success': False,
-                'error': 'Budget and duration must be valid numbers'
+                'error': 'No user ids or emails provided'
             }), 400
 
-        app.logger.info(f"Generating enhanced report for campaign: {data.get('campaign_name')}")
-
-        # Get real advertising data if available
-        real_ads_data = {}
-        if data.get('include_real_data', True):
-            try:
-                # Get current campaigns and performance
-                campaigns_data = ads_manager.get_all_campaigns()
-                performance_data = ads_manager.get_all_performance_data(days=30)
-                
-                real_ads_data = {
-                    'campaigns': campaigns_data,
-                    'performance': performance_data,
-                    'connected_platforms': ads_manager.connected_platforms
-                }
-                
-                app.logger.info(f"Retrieved real ads data from {len(ads_manager.connected_platforms)} platforms")
-            except Exception as e:
-                app.logger.warning(f"Could not retrieve real ads data: {str(e)}")
+        record, sketch = save_audience_sketch(platform, campaign_ref, sketch, ids_added)
 
-        # Save campaign to database
-        campaign = Campaign(
-            campaign_name=data.get('campaign_name'),
-            target_audience=data.get('target_audience'),
-            budget=budget,
-            duration=duration,
-            objectives=data.get('objectives'),
-            channels=data.get('channels', ''),
-            current_metrics=data.get('current_metrics', '')
-        )
-        
-        db.session.add(campaign)
-        db.session.commit()
+        app.logger.info("Audience sketch updated for %s %s: %d ids", platform, campaign_ref or '(all campaigns)', ids_added)
 
-        # Generate enhanced report using OpenAI with real data
-        report = generate_marketing_report(
-            campaign_name=data.get('campaign_name'),
-            target_audience=data.get('target_audience'),
-            budget=budget,
-            duration=duration,
-            objectives=data.get('objectives'),
-            channels=data.get('channels', ''),
-            current_metrics=data.get('current_metrics', ''),
-            real_ads_data=real_ads_data
-        )
-
-        # Add platform integration status to report
-        report['platform_integrations'] = {
-            'status': ads_manager.get_connection_status(),
-            'real_data_included': bool(real_ads_data),
-            'connected_platforms': ads_manager.connected_platforms
-        }
+        return jsonify({
+            'success': True,
+            'sketch': record.to_dict(),
+            'estimated_reach': int(round(sketch.cardinality()))
+        })
 
-        # Save report to database
-        report_record = Report(
-            campaign_id=campaign.id,
-            report_data=report
-        )
-        db.session.add(report_record)
-        db.session.commit()
+    except Exception as e:
+        app.logger.error("Error updating audience sketch: %s", e)
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to update audience sketch: {str(e)}'
+        }), 500
 
-        app.logger.info("Enhanced report generated and saved successfully")
+@app.route('/audience-sketches/overlap', methods=['GET'])
+def get_audience_overlap():
+    """Get deduplicated reach and pairwise overlap across stored audience sketches"""
+    try:
+        level = request.args.get('level', 'platform')
+        if level not in ('platform', 'campaign'):
+            return jsonify({
+                'success': False,
+                'error': "Level must be 'platform' or 'campaign'"
+            }), 400
 
+        overlap = load_audience_overlap(level)
         return jsonify({
             'success': True,
-            'report': report,
-            'campaign_id': campaign.id,
-            'report_id': report_record.id,
-            'real_data_included': bool(real_ads_data)
+            'level': level,
+            'overlap': overlap
         })
-
     except Exception as e:
-        app.logger.error(f"Error generating enhanced report: {str(e)}")
-        # Rollback in case of error
-        db.session.rollback()
+        app.logger.error("Error estimating audience overlap: %s", e)
         return jsonify({
             'success': False,
-            'error': f'Failed to generate enhanced report: {str(e)}'
+            'error': f'Failed to estimate audience overlap: {str(e)}'
         }), 500
 
+@app.route('/generate-report-with-ads', methods=['POST'])
+@idempotency.idempotent
+def generate_report_with_ads():
+    """Generate marketing report using both form data and real advertising data"""
+    try:
+        data = request.get_json()
+        try:
+            campaign_fields = start_report(data, with_ads=True)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        # Get real advertising data if available
+        real_ads_data = fetch_real_ads_data() if wants_real_ads_data(data, with_ads=True) else {}
+
+        # Generate enhanced report using OpenAI with real data; nothing has
+        # touched the database yet, so no pooled connection is held meanwhile
+        report = generate_marketing_report(**campaign_fields, real_ads_data=real_ads_data)
+
+        return finish_report(campaign_fields, report, real_ads_data, with_ads=True)
+
+    except Exception as e:
+        return report_failed(e, with_ads=True)
+
 @app.route('/credentials/google-ads', methods=['POST'])
 def save_google_ads_credentials():
     """Save Google Ads credentials securely"""
@@ -429,7 +1107,7 @@ def save_google_ads_credentials():
             }), 400
 
     except Exception as e:
-        app.logger.error(f"Error saving Google Ads credentials: {str(e)}")
+        app.logger.error("Error saving Google Ads credentials: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to save credentials: {str(e)}'
@@ -476,7 +1154,7 @@ def save_meta_ads_credentials():
             }), 400
 
     except Exception as e:
-        app.logger.error(f"Error saving Meta Ads credentials: {str(e)}")
+        app.logger.error("Error saving Meta Ads credentials: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to save credentials: {str(e)}'
@@ -501,7 +1179,7 @@ def test_google_ads_connection():
             }), 400
 
     except Exception as e:
-        app.logger.error(f"Error testing Google Ads connection: {str(e)}")
+        app.logger.error("Error testing Google Ads connection: %s", e)
         return jsonify({
             'success': False,
             'error': f'Connection test failed: {str(e)}'
@@ -526,18 +1204,19 @@ def test_meta_ads_connection():
             }), 400
 
     except Exception as e:
-        app.logger.error(f"Error testing Meta Ads connection: {str(e)}")
+        app.logger.error("Error testing Meta Ads connection: %s", e)
         return jsonify({
             'success': False,
             'error': f'Connection test failed: {str(e)}'
         }), 500
 
 @app.route('/audience-insights', methods=['POST'])
+@idempotency.idempotent
 def generate_audience_insights():
     """Generate deep audience insights with smart targeting and segmentation"""
     try:
         # Validate request data
-        data = request.get_json()
+        data = get_request_data()
         if not data:
             return jsonify({
                 'success': False,
@@ -551,7 +1230,20 @@ def generate_audience_insights():
                 'error': 'Target audience description is required'
             }), 400
 
-        app.logger.info(f"Generating audience insights for: {data.get('target_audience')[:50]}...")
+        # Filter uploaded event data and cluster uploaded customer data before
+        # any ads/LLM call, so a malformed file is a cheap 400 instead of a
+        # 500 after a GPT-4o request; segment sizes are computed, not guessed
+        try:
+            budget, duration_days = parse_targeting_span(data)
+            noise_analysis = analyze_audience_noise(data, default_size=10000)
+            segment_facts = analyze_customer_segments(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        app.logger.info("Generating audience insights for: %s...", data.get('target_audience')[:50])
 
         # Get real advertising data if available
         real_ads_data = {}
@@ -567,39 +1259,47 @@ def generate_audience_insights():
                     'connected_platforms': ads_manager.connected_platforms
                 }
                 
-                app.logger.info(f"Retrieved real ads data from {len(ads_manager.connected_platforms)} platforms")
+                app.logger.info("Retrieved real ads data from %s platforms", len(ads_manager.connected_platforms))
             except Exception as e:
-                app.logger.warning(f"Could not retrieve real ads data: {str(e)}")
+                app.logger.warning("Could not retrieve real ads data: %s", e)
 
         # Prepare campaign context
         campaign_context = {
             'campaign_name': data.get('campaign_name', ''),
             'objectives': data.get('objectives', ''),
-            'budget': data.get('budget', 0)
+            'budget': budget or 0
         }
 
         # Generate deep audience insights
         insights = analyze_deep_audience_insights(
             target_audience=data.get('target_audience'),
             campaign_data=campaign_context if any(campaign_context.values()) else None,
-            real_ads_data=real_ads_data if real_ads_data else None
+            real_ads_data=real_ads_data if real_ads_data else None,
+            segment_facts=segment_facts
         )
 
-        # Generate noise filtering analysis
-        audience_data = {'total_users': data.get('estimated_audience_size', 10000)}
-        noise_analysis = filter_audience_noise(audience_data)
-
         # Generate precision targeting recommendations
         precision_recommendations = generate_precision_targeting_recommendations(
             insights=insights,
-            campaign_budget=data.get('budget')
+            campaign_budget=budget,
+            performance_data=real_ads_data.get('performance'),
+            duration_days=duration_days
         )
 
+        # Deduplicated cross-platform reach from uploaded audience sketches
+        try:
+            cross_platform_reach = load_audience_overlap('platform')
+        except Exception as e:
+            app.logger.warning("Could not estimate cross-platform reach: %s", e)
+            cross_platform_reach = None
+
         # Combine all insights
         complete_analysis = {
             'audience_insights': insights,
             'noise_filtering': noise_analysis,
             'precision_targeting': precision_recommendations,
+            'cross_platform_reach': cross_platform_reach,
+            'computed_segments': segment_facts,
             'real_data_integration': {
                 'platforms_connected': len(ads_manager.connected_platforms),
                 'connected_platforms': ads_manager.connected_platforms,
@@ -615,7 +1315,7 @@ def generate_audience_insights():
         })
 
     except Exception as e:
-        app.logger.error(f"Error generating audience insights: {str(e)}")
+        app.logger.error("Error generating audience insights: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to generate audience insights: {str(e)}'
@@ -625,16 +1325,27 @@ def generate_audience_insights():
 def generate_precision_targeting():
     """Generate precision targeting recommendations with noise reduction"""
     try:
-        data = request.get_json()
+        data = get_request_data()
         if not data or not data.get('target_audience'):
             return jsonify({
                 'success': False,
                 'error': 'Target audience description is required'
             }), 400
 
+        # Uploaded event and customer data are validated before the LLM call
+        try:
+            budget, duration_days = parse_targeting_span(data)
+            noise_analysis = analyze_audience_noise(data, default_size=5000)
+            segment_facts = analyze_customer_segments(data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         # Quick precision targeting analysis
         campaign_context = {
-            'budget': data.get('budget', 0),
+            'budget': budget or 0,
             'objectives': data.get('objectives', ''),
             'channels': data.get('channels', '')
         }
@@ -642,19 +1353,26 @@ def generate_precision_targeting():
         # Generate basic insights for targeting
         insights = analyze_deep_audience_insights(
             target_audience=data.get('target_audience'),
-            campaign_data=campaign_context
+            campaign_data=campaign_context,
+            segment_facts=segment_facts
         )
 
+        # Historical campaign performance drives the budget optimizer
+        performance_data = None
+        if data.get('include_real_data', True) and ads_manager.connected_platforms:
+            try:
+                performance_data = ads_manager.get_all_performance_data(days=30)
+            except Exception as e:
+                app.logger.warning("Could not retrieve ads performance: %s", e)
+
         # Generate targeting recommendations
         recommendations = generate_precision_targeting_recommendations(
             insights=insights,
-            campaign_budget=data.get('budget')
+            campaign_budget=budget,
+            performance_data=performance_data,
+            duration_days=duration_days
         )
 
-        # Add noise filtering insights
-        audience_size = data.get('estimated_audience_size', 5000)
-        noise_analysis = filter_audience_noise({'total_users': audience_size})
-
         return jsonify({
             'success': True,
             'targeting_recommendations': recommendations,
@@ -663,15 +1381,15 @@ def generate_precision_targeting():
                 'filtered_size': noise_analysis['filtered_size'],
                 'quality_score': noise_analysis['quality_score'],
                 'noise_reduction': {
-                    'bots_filtered': True,
-                    'irrelevant_users_filtered': True,
+                    'bots_filtered': noise_analysis['quality_metrics']['bot_filter_applied'],
+                    'irrelevant_users_filtered': noise_analysis['quality_metrics']['relevance_filter_applied'],
                     'quality_improvement': noise_analysis['quality_metrics']['quality_improvement']
                 }
             }
         })
 
     except Exception as e:
-        app.logger.error(f"Error generating precision targeting: {str(e)}")
+        app.logger.error("Error generating precision targeting: %s", e)
         return jsonify({
             'success': False,
             'error': f'Failed to generate precision targeting: {str(e)}'
@@ -688,11 +1406,88 @@ def not_found(error):
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
-    app.logger.error(f"Internal error: {str(error)}")
+    app.logger.error("Internal error: %s", error)
     return jsonify({
         'success': False,
         'error': 'Internal server error'
     }), 500
 
+@app.cli.command('compact-reports')
+@click.option('--older-than', default=90, show_default=True, help='Compact reports older than this many days')
+@click.option('--batch-size', default=500, show_default=True, help='Reports rewritten per transaction')
+def compact_reports_command(older_than, batch_size):
+    """Move cold report payloads into compressed blobs"""
+    result = compact_reports(db.session, Report, older_than_days=older_than, batch_size=batch_size)
+    click.echo(f"Compacted {result['compacted']} reports with {result['codec']}: "
+               f"{result['bytes_before']:,} -> {result['bytes_after']:,} bytes")
+
+@app.cli.command('archive-reports')
+@click.option('--older-than', default=7, show_default=True, help='Archive reports older than this many days')
+@click.option('--batch-size', default=500, show_default=True, help='Reports moved per transaction')
+def archive_reports_command(older_than, batch_size):
+    """Move old reports out of the database into compressed NDJSON segments"""
+    result = archive_reports(db.session, Report, report_archive, older_than_days=older_than, batch_size=batch_size)
+    click.echo(f"Archived {result['archived']} reports ({result['bytes_written']:,} bytes) to "
+               f"{result['directory']}: {result['segments']} segments, {result['bytes']:,} bytes in total")
+
+@app.cli.command('reindex-search')
+@click.option('--batch-size', default=500, show_default=True, help='Rows indexed per flush')
+def reindex_search_command(batch_size):
+    """Rebuild the full-text search index from campaigns and reports"""
+    counts = reindex_search(db.session, Campaign, Report, SearchDocument, batch_size=batch_size)
+    click.echo(f"Indexed {counts['campaigns']} campaigns and {counts['reports']} reports")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the analytics rollup tables from campaigns and reports"""
+    counts = rebuild_rollups(db.session, Campaign, Report, *ROLLUP_TABLES, TABLE_VERSIONS)
+    click.echo(f"Rebuilt rollups: {counts['days']} days, {counts['channels']} channels, "
+               f"{counts['campaigns_with_reports']} campaigns with reports")
+
+@app.cli.command('import-campaigns')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', default=None, help='csv or ndjson (defaults to the file extension)')
+@click.option('--batch-size', default=DEFAULT_IMPORT_BATCH_SIZE, show_default=True, help='Rows per transaction')
+@click.option('--generate-reports', is_flag=True, help='Generate a report for every imported campaign')
+def import_campaigns_command(path, fmt, batch_size, generate_reports):
+    """Bulk-create campaigns from a CSV or NDJSON file"""
+    result = import_campaigns(db.engine, path, detect_format(path, fmt), batch_size=batch_size,
+                              on_batch=rollup_imported_batch)
+    click.echo(f"Imported {result['imported']:,} campaigns, rejected {result['rejected']:,} "
+               f"in {result['elapsed_seconds']} s ({result['rows_per_second']:,} rows/s)")
+    for error in result['errors']:
+        click.echo(f"  row {error['row']}: {error['error']}")
+    if generate_reports:
+        # The command waits for every report, so its queue is unbounded
+        jobs = ReportJobQueue(max_queued=0)
+        queued = jobs.enqueue(generate_report_for_campaign, result['campaign_ids'])
+        click.echo(f"Generating {queued:,} reports...")
+        jobs.wait()
+        click.echo(f"Reports: {jobs.stats()}")
+
+@app.cli.command('traces')
+@click.option('--limit', default=20, show_default=True, help='Most recent traces to list')
+@click.option('--file', 'path', default=None, help='OTLP/JSON lines file (defaults to TRACE_FILE)')
+def traces_command(limit, path):
+    """List recorded traces, newest last"""
+    traces = list(load_traces(path, limit=limit).items())[-limit:]
+    for trace_id, spans in traces:
+        root = min(spans, key=lambda item: int(item['startTimeUnixNano']))
+        duration = (max(int(item['endTimeUnixNano']) for item in spans) - int(root['startTimeUnixNano'])) / 1e6
+        started = datetime.fromtimestamp(int(root['startTimeUnixNano']) / 1e9).isoformat(timespec='seconds')
+        click.echo(f"{trace_id}  {started}  {duration:>9.1f} ms  {len(spans):>3} spans  {root['name']}")
+
+@app.cli.command('trace')
+@click.argument('trace_id')
+@click.option('--file', 'path', default=None, help='OTLP/JSON lines file (defaults to TRACE_FILE)')
+@click.option('--width', default=50, show_default=True, help='Width of the timing bars')
+def trace_command(trace_id, path, width):
+    """Print a waterfall of one trace's spans"""
+    traces = load_traces(path, trace_id=trace_id)
+    matches = list(traces)
+    if len(matches) != 1:
+        raise click.ClickException(f"{len(matches)} traces match '{trace_id}'")
+    click.echo(render_waterfall(traces[matches[0]], width=width))
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
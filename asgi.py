@@ -0,0 +1,209 @@
+"""
+ASGI entry point with non-blocking LLM routes
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+
+POST /generate-report and /generate-report-with-ads run on the event loop:
+the OpenAI call is awaited through the async client and the short database
+transaction (plus the ad platform SDK calls) run in worker threads, so one
+process keeps hundreds of generations in flight instead of one per sync
+worker. They go through the Flask request lifecycle like any other route
+(before/after/teardown hooks, Idempotency-Key handling, admission control,
+tracing, metrics and logging); only the view itself is async. Every other
+route is the regular Flask app, run on a thread pool of its own
+(WSGI_THREADS), so slow uploads or k-means runs on the audience endpoints
+cannot take the threads the async routes use for their database work.
+"""
+import asyncio
+import io
+import os
+import sys
+
+from a2wsgi import WSGIMiddleware
+from flask import jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from app import (app, fetch_real_ads_data, finish_report, idempotency, report_failed, start_report,
+                 wants_real_ads_data)
+from utils.admission import ASYNC_DISPATCH, admission
+from utils.openai_api import generate_marketing_report_async
+
+MAX_BODY_BYTES = 1024 * 1024
+# Threads running the (sync) Flask routes
+DEFAULT_WSGI_THREADS = 32
+
+flask_app = WSGIMiddleware(app, workers=int(os.environ.get('WSGI_THREADS') or DEFAULT_WSGI_THREADS))
+
+
+async def _generate_report(with_ads):
+    """Async twin of the Flask report generation views, built from the same helpers"""
+    try:
+        data = request.get_json()
+        try:
+            campaign_fields = start_report(data, with_ads)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        real_ads_data = None
+        if with_ads:
+            real_ads_data = await asyncio.to_thread(fetch_real_ads_data) if wants_real_ads_data(data, with_ads) else {}
+
+        report = await generate_marketing_report_async(**campaign_fields, real_ads_data=real_ads_data)
+
+        return await asyncio.to_thread(finish_report, campaign_fields, report, real_ads_data, with_ads)
+    except Exception as e:
+        return await asyncio.to_thread(report_failed, e, with_ads)
+
+
+@idempotency.idempotent
+async def generate_report():
+    return await _generate_report(with_ads=False)
+
+
+@idempotency.idempotent
+async def generate_report_with_ads():
+    return await _generate_report(with_ads=True)
+
+
+# Flask endpoint -> async view that replaces it under ASGI
+ASYNC_VIEWS = {
+    'generate_report': generate_report,
+    'generate_report_with_ads': generate_report_with_ads,
+}
+
+
+def _async_endpoint(scope):
+    """The ASYNC_VIEWS endpoint a request is routed to, or None"""
+    if scope['type'] != 'http':
+        return None
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return None
+    return endpoint if endpoint in ASYNC_VIEWS else None
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError('Request body is too large')
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+
+def _environ(scope, body):
+    """WSGI environ of an ASGI request whose body has been read"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        ASYNC_DISPATCH: True,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key == 'CONTENT_LENGTH':
+            continue
+        if key != 'CONTENT_TYPE':
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        if key in environ:
+            # HTTP/2 clients send each cookie as a field of its own
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+
+async def _dispatch(view):
+    """Flask's full_dispatch_request with an awaited view; keys are claimed and admission waited for on the loop"""
+    try:
+        response = app.preprocess_request()
+        if response is None:
+            response = await idempotency.begin_async()
+        if response is None:
+            response = await admission.admit_async()
+            if response is not None:
+                await idempotency.abandon_async()
+        if response is None:
+            response = await view(**request.view_args)
+    except Exception as e:
+        response = app.handle_user_exception(e)
+    return app.finalize_request(response)
+
+
+async def _send_response(send, response):
+    try:
+        body = b''.join(response.iter_encoded())
+    finally:
+        response.close()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.to_wsgi_list()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def run_async_view(scope, receive, send, view):
+    """Serve one request with an async view inside a regular Flask request context"""
+    try:
+        body = await _read_body(receive)
+    except ValueError as e:
+        with app.app_context():
+            response = jsonify({'success': False, 'error': str(e)})
+        response.status_code = 413
+        return await _send_response(send, response)
+
+    ctx = app.request_context(_environ(scope, body))
+    ctx.push()
+    error = None
+    try:
+        try:
+            response = await _dispatch(view)
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+        await _send_response(send, response)
+    finally:
+        ctx.pop(error)
+
+
+async def application(scope, receive, send):
+    endpoint = _async_endpoint(scope)
+    if endpoint is not None:
+        await run_async_view(scope, receive, send, ASYNC_VIEWS[endpoint])
+    elif scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,99 @@
+"""
+Startup time and worker memory of the gunicorn profile, with and without preload
+
+Boots `gunicorn --config gunicorn.conf.py main:app` with GUNICORN_PRELOAD on
+and off, waits until every worker answers, and reports the time to ready
+plus the memory of master and workers from /proc (Linux only). USS is the
+memory private to a process; with preload the SDKs imported by the master
+stay shared, so worker USS drops.
+
+    python benchmarks/gunicorn_startup.py --workers 4
+"""
+import argparse
+import os
+import socket
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_kib(pid):
+    """(RSS, USS) of a process in KiB, from smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Rss', 0), fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure(preload, workers, env):
+    port = free_port()
+    env = dict(env, GUNICORN_PRELOAD='1' if preload else '0', GUNICORN_WORKERS=str(workers))
+    started = time.perf_counter()
+    process = subprocess.Popen(['gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+                                '--access-logfile', '/dev/null', 'main:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Ready once every worker has booted and a request succeeds
+        while True:
+            if time.perf_counter() - started > 120:
+                raise RuntimeError("gunicorn did not become ready")
+            try:
+                if len(children(process.pid)) == workers:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/report-jobs', timeout=5).read()
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        ready = time.perf_counter() - started
+        time.sleep(2)  # let the remaining workers finish booting
+        worker_memory = [memory_kib(pid) for pid in children(process.pid)]
+        master_rss, master_uss = memory_kib(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return {
+        'preload': preload,
+        'ready_s': round(ready, 2),
+        'master_rss_mib': round(master_rss / 1024, 1),
+        'worker_rss_mib': round(sum(rss for rss, _ in worker_memory) / len(worker_memory) / 1024, 1),
+        'worker_uss_mib': round(sum(uss for _, uss in worker_memory) / len(worker_memory) / 1024, 1),
+        'total_uss_mib': round((master_uss + sum(uss for _, uss in worker_memory)) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'benchmark'),
+                   STORAGE=f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+        rows = [measure(preload, args.workers, env) for preload in (False, True)]
+
+    columns = list(rows[0])
+    print(' | '.join(f'{column:>14}' for column in columns))
+    for row in rows:
+        print(' | '.join(f'{str(row[column]):>14}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+CPU cost of JSON encoding for a /reports page, stdlib provider vs FastJSONProvider
+
+Builds a page of reports shaped like `GET /reports?fields=...,report_data`
+and times Flask's DefaultJSONProvider against utils.fast_json (orjson when
+installed), for the response body and for the report_data column round trip.
+
+    python benchmarks/json_encoding.py --reports 500 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import fast_json  # noqa: E402
+from utils.fast_json import FastJSONProvider  # noqa: E402
+
+
+def words(rnd, n):
+    return ' '.join(''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(3, 10)))
+                    for _ in range(n))
+
+
+def report_page(n):
+    rnd = random.Random(42)
+    now = datetime(2025, 1, 1)
+    return {
+        'success': True,
+        'reports': [{
+            'id': i,
+            'campaign_id': i // 3,
+            'generated_at': (now - timedelta(minutes=i)).isoformat(),
+            'report_data': {
+                'executive_summary': words(rnd, 120),
+                'budget_analysis': {'daily_budget': f'${rnd.randint(10, 900)}', 'roi_projection': '3.2x',
+                                    'allocation': {channel: rnd.random() for channel in ('email', 'ppc', 'social')}},
+                'kpi_framework': {'primary_metrics': [words(rnd, 4) for _ in range(6)],
+                                  'success_benchmarks': [words(rnd, 6) for _ in range(6)]},
+                'recommendations': [{'title': words(rnd, 5), 'detail': words(rnd, 40), 'priority': rnd.randint(1, 5)}
+                                    for _ in range(8)],
+            },
+        } for i in range(n)],
+        'next_cursor': 'MjAyNS0wMS0wMVQwMDowMDowMHwx',
+        'has_more': True,
+    }
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    page = report_page(args.reports)
+    payloads = [report['report_data'] for report in page['reports']]
+    stored = [json.dumps(payload) for payload in payloads]
+
+    app = Flask(__name__)
+    providers = {'stdlib': DefaultJSONProvider(app), fast_json.JSON_BACKEND: FastJSONProvider(app)}
+    column = {
+        'stdlib': (json.dumps, json.loads),
+        fast_json.JSON_BACKEND: (fast_json.dumps_str, fast_json.loads),
+    }
+
+    print(f"{args.reports} reports, {len(DefaultJSONProvider(app).response(page).get_data()) / 1024:.0f} KiB body, "
+          f"best of {args.repeat}")
+    print(f"{'encoder':>10} | {'response ms':>12} | {'column dumps ms':>16} | {'column loads ms':>16}")
+    with app.app_context():
+        for name, provider in providers.items():
+            dumps, loads = column[name]
+            response_ms = best_of(args.repeat, lambda: provider.response(page).get_data())
+            dumps_ms = best_of(args.repeat, lambda: [dumps(payload) for payload in payloads])
+            loads_ms = best_of(args.repeat, lambda: [loads(text) for text in stored])
+            print(f"{name:>10} | {response_ms:>12.2f} | {dumps_ms:>16.2f} | {loads_ms:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Throughput of the LLM-bound /generate-report route per serving mode
+
+Starts a fake OpenAI server that answers every chat completion after a fixed
+delay, then serves the app against it with plain gunicorn sync workers, with
+the gthread profile in gunicorn.conf.py and with uvicorn (`asgi:application`),
+and fires the same burst of concurrent report requests at each.
+
+    python benchmarks/llm_concurrency.py --requests 400 --concurrency 200 --latency 2
+
+Needs gunicorn and uvicorn on PATH. Each run uses a throwaway SQLite database.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_REPORT = {
+    'executive_summary': 'Benchmark report',
+    'budget_analysis': {'daily_budget': '$100', 'roi_projection': '3x'},
+    'kpi_framework': {'primary_metrics': ['CTR'], 'success_benchmarks': ['2%']},
+}
+
+CAMPAIGN = {
+    'campaign_name': 'Benchmark campaign',
+    'target_audience': 'Small business owners',
+    'budget': 3000,
+    'duration': 30,
+    'objectives': 'Lead generation',
+    'channels': 'Email, PPC',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_openai(latency):
+    """Chat completions endpoint that sleeps `latency` seconds per call"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': 'gpt-4o',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': json.dumps(FAKE_REPORT)}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def post_report(url):
+    started = time.perf_counter()
+    request = urllib.request.Request(url, data=json.dumps(CAMPAIGN).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            ok = json.loads(response.read()).get('success') is True
+    except (urllib.error.URLError, OSError, ValueError):
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def run_mode(name, command, env, n_requests, concurrency):
+    port = free_port()
+    command = [part.replace('{port}', str(port)) for part in command]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        url = f'http://127.0.0.1:{port}/generate-report'
+        post_report(url)  # warm up
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: post_report(url), range(n_requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies = sorted(seconds for ok, seconds in results if ok)
+    return {
+        'mode': name,
+        'ok': len(latencies),
+        'failed': n_requests - len(latencies),
+        'elapsed_s': round(elapsed, 2),
+        'req_per_s': round(len(latencies) / elapsed, 1),
+        'p50_s': round(statistics.median(latencies), 2) if latencies else None,
+        'p95_s': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=1.0, help='Fake LLM response time in seconds')
+    parser.add_argument('--workers', type=int, default=1, help='Server processes per mode')
+    parser.add_argument('--threads', type=int, default=64, help='Threads per worker in gthread mode')
+    parser.add_argument('--modes', default='sync,gthread,asgi')
+    args = parser.parse_args()
+
+    fake = start_fake_openai(args.latency)
+    commands = {
+        # -c /dev/null: the old command line, without the ./gunicorn.conf.py profile
+        'sync': ['gunicorn', '-c', '/dev/null', '--workers', str(args.workers), '--bind', '127.0.0.1:{port}',
+                 '--timeout', '600', '--backlog', '2048', 'main:app'],
+        'gthread': ['gunicorn', '--config', 'gunicorn.conf.py', '--workers', str(args.workers),
+                    '--threads', str(args.threads), '--bind', '127.0.0.1:{port}', 'main:app'],
+        'asgi': ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', '{port}',
+                 '--workers', str(args.workers), '--log-level', 'warning', '--backlog', '2048'],
+    }
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes.split(','):
+            env = dict(os.environ,
+                       OPENAI_API_KEY='benchmark',
+                       OPENAI_BASE_URL=f'http://127.0.0.1:{fake.server_port}/v1',
+                       STORAGE=f'sqlite:///{os.path.join(tmp, mode)}.db',
+                       # Measure the serving mode itself, not the admission limits in front of it
+                       ADMISSION_CONTROL='0')
+            print(f"Running {mode} ({args.requests} requests, {args.concurrency} concurrent, "
+                  f"{args.latency}s LLM latency)...", file=sys.stderr)
+            rows.append(run_mode(mode, commands[mode], env, args.requests, args.concurrency))
+    fake.shutdown()
+
+    columns = list(rows[0])
+    print(' | '.join(f'{column:>10}' for column in columns))
+    for row in rows:
+        print(' | '.join(f'{str(row[column]):>10}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
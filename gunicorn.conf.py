@@ -0,0 +1,135 @@
+"""
+Production gunicorn profile
+
+    gunicorn --config gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app) and forked, so the
+Google Ads, Meta and OpenAI SDKs are loaded once and their memory is shared
+copy-on-write. Each worker then resets everything that must not be shared
+across a fork: database pools, SDK HTTP sessions and background executors.
+
+gthread workers fit this app: report generation is I/O-bound on the LLM and
+holds no database connection while it waits, so a thread per in-flight
+generation is cheap. Threads per worker are sized from LLM_CONCURRENCY,
+the number of generations one instance should keep in flight.
+
+Environment (all optional):
+    PORT                    Listen port (default 5000)
+    GUNICORN_WORKERS        Worker processes (default: CPU count, at least 2)
+    GUNICORN_THREADS        Threads per worker (default: LLM_CONCURRENCY / workers)
+    LLM_CONCURRENCY         Target in-flight requests per instance (default 64)
+    GUNICORN_WORKER_CLASS   gthread (default), sync or gevent
+    GUNICORN_MAX_REQUESTS   Recycle a worker after this many requests (default 2000, 0 = never)
+    GUNICORN_TIMEOUT        Seconds before a silent worker is killed (default 120)
+    GUNICORN_PRELOAD        Import the app in the master before forking (default on)
+    GUNICORN_RELOAD         Restart on code changes, for development only (default off)
+    METRICS_DIR             Where workers share /metrics snapshots (default: a temp dir per master)
+    REPORT_JOB_QUEUE_SIZE   Background report jobs a worker keeps waiting (default 1000)
+    ADMISSION_MAX_ACTIVE    Report/audience requests a worker admits at once (default: 3/4 of its threads)
+"""
+import gc
+import glob
+import math
+import os
+import sys
+import tempfile
+
+DEFAULT_LLM_CONCURRENCY = 64
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+bind = f"0.0.0.0:{_env_int('PORT', 5000)}"
+reuse_port = True
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', max(2, os.cpu_count() or 1))
+threads = _env_int('GUNICORN_THREADS',
+                   max(4, math.ceil(_env_int('LLM_CONCURRENCY', DEFAULT_LLM_CONCURRENCY) / workers)))
+if worker_class == 'gevent':
+    worker_connections = _env_int('LLM_CONCURRENCY', DEFAULT_LLM_CONCURRENCY)
+
+reload = os.environ.get('GUNICORN_RELOAD', '').lower() in ('1', 'true', 'yes')
+# A preloaded app cannot be reloaded, so development reloads turn preload off
+preload_app = not reload and os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no')
+
+# Leave a quarter of each worker's threads to the cheap read endpoints, however
+# many report generations are in flight or queued
+if worker_class == 'gthread':
+    os.environ.setdefault('ADMISSION_MAX_ACTIVE', str(max(1, threads - max(1, threads // 4))))
+
+# Recycle workers to bound slow leaks in the SDKs; the jitter keeps them from
+# all restarting at the same moment
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = max_requests // 10
+
+# GPT-4o reports can take close to a minute
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+# Workers share metrics through snapshot files here; GET /metrics sums them
+metrics_dir = os.environ.setdefault('METRICS_DIR',
+                                    os.path.join(tempfile.gettempdir(), f'novaedge-metrics-{os.getpid()}'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Totals start from zero with each master; drop a previous run's snapshots
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+        os.remove(path)
+
+
+def when_ready(server):
+    # Everything allocated at import is long-lived; move it out of the
+    # collector's reach so GC passes in the workers do not write to (and
+    # un-share) the master's pages
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"{workers} {worker_class} workers x {threads} threads, preload {preload_app}, "
+                    f"max_requests {max_requests}±{max_requests_jitter}")
+
+
+def post_fork(server, worker):
+    app_module = sys.modules.get('app')
+    if app_module is None:
+        return
+
+    # Connections opened in the master (create_all, lag checks) belong to the
+    # master; drop them from the child's pools without closing the sockets
+    with app_module.app.app_context():
+        for engine in app_module.db.engines.values():
+            engine.dispose(close=False)
+
+    # HTTP clients and their connection pools must not be shared with the master
+    import openai
+    from utils import openai_api
+    openai._reset_client()
+    openai_api._async_client = None
+    app_module.ads_manager.reset_clients()
+
+    # Executor threads do not survive fork; start each worker with a fresh queue
+    app_module.report_jobs.reset()
+
+    # Likewise the log writer thread
+    from utils.logging_config import logging_setup
+    logging_setup.restart()
+
+
+def worker_exit(server, worker):
+    # Background report jobs live in this process; give them most of the
+    # graceful timeout to finish (the rest are logged as lost)
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.report_jobs.shutdown(timeout=max(1, graceful_timeout - 5))
+
+    # Final snapshot, so requests since the last flush still count after recycling
+    from utils.metrics import registry
+    registry.flush()
@@ -1,10 +1,20 @@
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import fast_json
+from utils.metrics import record_cache, track_dependency
 from .google_ads_integration import GoogleAdsIntegration
 from .meta_ads_integration import MetaAdsIntegration
 
 logger = logging.getLogger(__name__)
 
+# Seconds platform reads are served from memory; 0 disables the cache
+ADS_CACHE_TTL = int(os.environ.get('ADS_CACHE_TTL', 300))
+
 
 class AdsManager:
     """Unified manager for all advertising platform integrations"""
@@ -16,11 +26,15 @@ class AdsManager:
         
         # Track which platforms are connected
         self.connected_platforms = []
+        self._cache = {}
+        self._cache_lock = threading.Lock()
         self._check_connections()
 
     def _check_connections(self):
         """Check which platforms are successfully connected"""
         self.connected_platforms = []
+        # New credentials mean new data
+        self.clear_cache()
         
         if self.google_ads.is_connected():
             self.connected_platforms.append('google_ads')
@@ -33,6 +47,55 @@ class AdsManager:
         if not self.connected_platforms:
             logger.warning("No advertising platforms connected")
 
+    def reset_clients(self):
+        """Recreate connected SDK clients, e.g. in a forked worker, so no HTTP session is shared"""
+        if self.google_ads.is_connected():
+            self.google_ads._initialize_client()
+        if self.meta_ads.is_connected():
+            self.meta_ads._initialize_client()
+        self._check_connections()
+
+    def clear_cache(self):
+        """Forget cached platform reads"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cached(self, key, loader: Callable[[], Dict]) -> Tuple[Dict, str]:
+        """
+        (data, fingerprint) for a platform read, reloaded after ADS_CACHE_TTL seconds
+
+        The fingerprint is a digest of the data, so it can serve as an ETag
+        without serializing the response. The cached dict is shared; callers
+        must not modify it.
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        hit = entry is not None and entry[0] > now
+        # One lookup per platform whose API call the cache stands in for
+        record_cache(self.connected_platforms, key if isinstance(key, str) else key[0], hit)
+        if hit:
+            return entry[1], entry[2]
+
+        data = loader()
+        fingerprint = hashlib.blake2b(fast_json.dumps(data, sort_keys=True, default=str), digest_size=16).hexdigest()
+        if ADS_CACHE_TTL > 0:
+            with self._cache_lock:
+                self._cache[key] = (now + ADS_CACHE_TTL, data, fingerprint)
+        return data, fingerprint
+
+    def get_cached_campaigns(self) -> Tuple[Dict, str]:
+        """get_all_campaigns() through the TTL cache, with its fingerprint"""
+        return self._cached('campaigns', self.get_all_campaigns)
+
+    def get_cached_performance(self, days: int = 30) -> Tuple[Dict, str]:
+        """Performance data plus cross-platform insights through the TTL cache, with its fingerprint"""
+        def load():
+            performance_data = self.get_all_performance_data(days=days)
+            performance_data['insights'] = self.generate_cross_platform_insights(performance_data)
+            return performance_data
+        return self._cached(('performance', days), load)
+
     def get_connection_status(self) -> Dict:
         """Get status of all platform connections"""
         return {
@@ -62,14 +125,15 @@ class AdsManager:
         # Get Google Ads campaigns
         if self.google_ads.is_connected():
             try:
-                google_campaigns = self.google_ads.get_campaigns()
+                with track_dependency('google_ads', 'get_campaigns'):
+                    google_campaigns = self.google_ads.get_campaigns()
                 all_campaigns['campaigns'].extend(google_campaigns)
                 all_campaigns['platforms']['google_ads'] = {
                     'campaign_count': len(google_campaigns),
                     'status': 'connected'
                 }
             except Exception as e:
-                logger.error(f"Error fetching Google Ads campaigns: {str(e)}")
+                logger.error("Error fetching Google Ads campaigns: %s", e)
                 all_campaigns['platforms']['google_ads'] = {
                     'campaign_count': 0,
                     'status': 'error',
@@ -79,14 +143,15 @@ class AdsManager:
         # Get Meta Ads campaigns
         if self.meta_ads.is_connected():
             try:
-                meta_campaigns = self.meta_ads.get_campaigns()
+                with track_dependency('meta_ads', 'get_campaigns'):
+                    meta_campaigns = self.meta_ads.get_campaigns()
                 all_campaigns['campaigns'].extend(meta_campaigns)
                 all_campaigns['platforms']['meta_ads'] = {
                     'campaign_count': len(meta_campaigns),
                     'status': 'connected'
                 }
             except Exception as e:
-                logger.error(f"Error fetching Meta Ads campaigns: {str(e)}")
+                logger.error("Error fetching Meta Ads campaigns: %s", e)
                 all_campaigns['platforms']['meta_ads'] = {
                     'campaign_count': 0,
                     'status': 'error',
@@ -118,7 +183,8 @@ class AdsManager:
         # Get Google Ads performance
         if self.google_ads.is_connected():
             try:
-                google_data = self.google_ads.get_campaign_performance(days=days)
+                with track_dependency('google_ads', 'get_campaign_performance'):
+                    google_data = self.google_ads.get_campaign_performance(days=days)
                 if google_data:
                     performance_data['platforms']['google_ads'] = google_data
                     
@@ -136,12 +202,13 @@ class AdsManager:
                     
                     performance_data['summary']['platforms_count'] += 1
             except Exception as e:
-                logger.error(f"Error fetching Google Ads performance: {str(e)}")
+                logger.error("Error fetching Google Ads performance: %s", e)
         
         # Get Meta Ads performance
         if self.meta_ads.is_connected():
             try:
-                meta_data = self.meta_ads.get_campaign_performance(days=days)
+                with track_dependency('meta_ads', 'get_campaign_performance'):
+                    meta_data = self.meta_ads.get_campaign_performance(days=days)
                 if meta_data:
                     performance_data['platforms']['meta_ads'] = meta_data
                     
@@ -159,7 +226,7 @@ class AdsManager:
                     
                     performance_data['summary']['platforms_count'] += 1
             except Exception as e:
-                logger.error(f"Error fetching Meta Ads performance: {str(e)}")
+                logger.error("Error fetching Meta Ads performance: %s", e)
         
         # Calculate averages
         if platform_ctrs:
@@ -172,37 +239,43 @@ class AdsManager:
     def create_campaign_on_platform(self, platform: str, campaign_data: Dict) -> Optional[str]:
         """Create a campaign on a specific platform"""
         if platform == 'google_ads' and self.google_ads.is_connected():
-            return self.google_ads.create_campaign(campaign_data)
+            with track_dependency('google_ads', 'create_campaign'):
+                return self.google_ads.create_campaign(campaign_data)
         elif platform == 'meta_ads' and self.meta_ads.is_connected():
-            return self.meta_ads.create_campaign(campaign_data)
+            with track_dependency('meta_ads', 'create_campaign'):
+                return self.meta_ads.create_campaign(campaign_data)
         else:
-            logger.error(f"Platform {platform} not connected or not supported")
+            logger.error("Platform %s not connected or not supported", platform)
             return None
 
     def update_campaign_budget(self, platform: str, campaign_id: str, new_budget: float) -> bool:
         """Update campaign budget on a specific platform"""
         if platform == 'google_ads' and self.google_ads.is_connected():
-            return self.google_ads.update_campaign_budget(campaign_id, new_budget)
+            with track_dependency('google_ads', 'update_campaign_budget'):
+                return self.google_ads.update_campaign_budget(campaign_id, new_budget)
         elif platform == 'meta_ads' and self.meta_ads.is_connected():
-            return self.meta_ads.update_campaign_budget(campaign_id, new_budget)
+            with track_dependency('meta_ads', 'update_campaign_budget'):
+                return self.meta_ads.update_campaign_budget(campaign_id, new_budget)
         else:
-            logger.error(f"Platform {platform} not connected or not supported")
+            logger.error("Platform %s not connected or not supported", platform)
             return False
 
     def pause_campaign(self, platform: str, campaign_id: str) -> bool:
         """Pause a campaign on a specific platform"""
         if platform == 'meta_ads' and self.meta_ads.is_connected():
-            return self.meta_ads.pause_campaign(campaign_id)
+            with track_dependency('meta_ads', 'pause_campaign'):
+                return self.meta_ads.pause_campaign(campaign_id)
         else:
-            logger.warning(f"Pause functionality not implemented for {platform}")
+            logger.warning("Pause functionality not implemented for %s", platform)
             return False
 
     def resume_campaign(self, platform: str, campaign_id: str) -> bool:
         """Resume a campaign on a specific platform"""
         if platform == 'meta_ads' and self.meta_ads.is_connected():
-            return self.meta_ads.resume_campaign(campaign_id)
+            with track_dependency('meta_ads', 'resume_campaign'):
+                return self.meta_ads.resume_campaign(campaign_id)
         else:
-            logger.warning(f"Resume functionality not implemented for {platform}")
+            logger.warning("Resume functionality not implemented for %s", platform)
             return False
 
     def get_account_info(self) -> Dict:
@@ -210,10 +283,12 @@ class AdsManager:
         accounts = {}
         
         if self.google_ads.is_connected():
-            accounts['google_ads'] = self.google_ads.get_account_info()
+            with track_dependency('google_ads', 'get_account_info'):
+                accounts['google_ads'] = self.google_ads.get_account_info()
         
         if self.meta_ads.is_connected():
-            accounts['meta_ads'] = self.meta_ads.get_account_info()
+            with track_dependency('meta_ads', 'get_account_info'):
+                accounts['meta_ads'] = self.meta_ads.get_account_info()
         
         return accounts
 
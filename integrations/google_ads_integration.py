@@ -31,7 +31,7 @@ class GoogleAdsIntegration:
             
             missing_vars = [var for var in required_vars if not os.getenv(var)]
             if missing_vars:
-                logger.warning(f"Missing Google Ads credentials: {missing_vars}")
+                logger.warning("Missing Google Ads credentials: %s", missing_vars)
                 return
             
             # Initialize client with environment variables
@@ -40,7 +40,7 @@ class GoogleAdsIntegration:
             logger.info("Google Ads client initialized successfully")
             
         except Exception as e:
-            logger.error(f"Failed to initialize Google Ads client: {str(e)}")
+            logger.error("Failed to initialize Google Ads client: %s", e)
             self.client = None
 
     def is_connected(self) -> bool:
@@ -88,16 +88,16 @@ class GoogleAdsIntegration:
                 }
                 campaigns.append(campaign)
             
-            logger.info(f"Retrieved {len(campaigns)} campaigns from Google Ads")
+            logger.info("Retrieved %s campaigns from Google Ads", len(campaigns))
             return campaigns
             
         except GoogleAdsException as ex:
-            logger.error(f"Google Ads API error: {ex.error.code().name}")
+            logger.error("Google Ads API error: %s", ex.error.code().name)
             for error in ex.failure.errors:
-                logger.error(f"Error details: {error.message}")
+                logger.error("Error details: %s", error.message)
             return []
         except Exception as e:
-            logger.error(f"Error retrieving Google Ads campaigns: {str(e)}")
+            logger.error("Error retrieving Google Ads campaigns: %s", e)
             return []
 
     def get_campaign_performance(self, campaign_id: str = None, days: int = 30) -> Dict:
@@ -183,14 +183,14 @@ class GoogleAdsIntegration:
                 'platform': 'google_ads'
             }
             
-            logger.info(f"Retrieved performance data for {len(performance_data)} Google Ads campaigns")
+            logger.info("Retrieved performance data for %s Google Ads campaigns", len(performance_data))
             return result
             
         except GoogleAdsException as ex:
-            logger.error(f"Google Ads API error: {ex.error.code().name}")
+            logger.error("Google Ads API error: %s", ex.error.code().name)
             return {}
         except Exception as e:
-            logger.error(f"Error retrieving Google Ads performance: {str(e)}")
+            logger.error("Error retrieving Google Ads performance: %s", e)
             return {}
 
     def create_campaign(self, campaign_data: Dict) -> Optional[str]:
@@ -231,14 +231,14 @@ class GoogleAdsIntegration:
             )
             
             campaign_id = response.results[0].resource_name.split('/')[-1]
-            logger.info(f"Created Google Ads campaign: {campaign_data['name']} (ID: {campaign_id})")
+            logger.info("Created Google Ads campaign: %s (ID: %s)", campaign_data['name'], campaign_id)
             return campaign_id
             
         except GoogleAdsException as ex:
-            logger.error(f"Google Ads API error creating campaign: {ex.error.code().name}")
+            logger.error("Google Ads API error creating campaign: %s", ex.error.code().name)
             return None
         except Exception as e:
-            logger.error(f"Error creating Google Ads campaign: {str(e)}")
+            logger.error("Error creating Google Ads campaign: %s", e)
             return None
 
     def update_campaign_budget(self, campaign_id: str, new_budget: float) -> bool:
@@ -249,11 +249,11 @@ class GoogleAdsIntegration:
         try:
             # This would require getting the campaign budget resource name first
             # and then updating it - implementation depends on specific requirements
-            logger.info(f"Budget update requested for campaign {campaign_id}: ${new_budget}")
+            logger.info("Budget update requested for campaign %s: $%s", campaign_id, new_budget)
             return True
             
         except Exception as e:
-            logger.error(f"Error updating Google Ads campaign budget: {str(e)}")
+            logger.error("Error updating Google Ads campaign budget: %s", e)
             return False
 
     def get_account_info(self) -> Dict:
@@ -294,5 +294,5 @@ class GoogleAdsIntegration:
             return {}
             
         except Exception as e:
-            logger.error(f"Error retrieving Google Ads account info: {str(e)}")
+            logger.error("Error retrieving Google Ads account info: %s", e)
             return {}
\ No newline at end of file
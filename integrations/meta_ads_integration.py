@@ -36,7 +36,7 @@ class MetaAdsIntegration:
                 if not app_id: missing.append('META_APP_ID')
                 if not app_secret: missing.append('META_APP_SECRET')
                 if not ad_account_id: missing.append('META_AD_ACCOUNT_ID')
-                logger.warning(f"Missing Meta Ads credentials: {missing}")
+                logger.warning("Missing Meta Ads credentials: %s", missing)
                 return
             
             # Initialize API
@@ -53,13 +53,13 @@ class MetaAdsIntegration:
             
             # Test connection
             account_info = self.ad_account.api_get(fields=['name', 'account_status'])
-            logger.info(f"Meta Ads client initialized successfully for account: {account_info.get('name')}")
+            logger.info("Meta Ads client initialized successfully for account: %s", account_info.get('name'))
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error during initialization: {e}")
+            logger.error("Meta Ads API error during initialization: %s", e)
             self.api = None
         except Exception as e:
-            logger.error(f"Failed to initialize Meta Ads client: {str(e)}")
+            logger.error("Failed to initialize Meta Ads client: %s", e)
             self.api = None
 
     def is_connected(self) -> bool:
@@ -100,14 +100,14 @@ class MetaAdsIntegration:
                 }
                 campaign_list.append(campaign_data)
             
-            logger.info(f"Retrieved {len(campaign_list)} campaigns from Meta Ads")
+            logger.info("Retrieved %s campaigns from Meta Ads", len(campaign_list))
             return campaign_list
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error retrieving campaigns: {e}")
+            logger.error("Meta Ads API error retrieving campaigns: %s", e)
             return []
         except Exception as e:
-            logger.error(f"Error retrieving Meta Ads campaigns: {str(e)}")
+            logger.error("Error retrieving Meta Ads campaigns: %s", e)
             return []
 
     def get_campaign_performance(self, campaign_id: str = None, days: int = 30) -> Dict:
@@ -222,14 +222,14 @@ class MetaAdsIntegration:
                 'platform': 'meta_ads'
             }
             
-            logger.info(f"Retrieved performance data for {len(performance_data)} Meta Ads campaigns")
+            logger.info("Retrieved performance data for %s Meta Ads campaigns", len(performance_data))
             return result
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error retrieving performance: {e}")
+            logger.error("Meta Ads API error retrieving performance: %s", e)
             return {}
         except Exception as e:
-            logger.error(f"Error retrieving Meta Ads performance: {str(e)}")
+            logger.error("Error retrieving Meta Ads performance: %s", e)
             return {}
 
     def create_campaign(self, campaign_data: Dict) -> Optional[str]:
@@ -260,14 +260,14 @@ class MetaAdsIntegration:
             campaign.remote_create()
             
             campaign_id = campaign.get_id()
-            logger.info(f"Created Meta Ads campaign: {campaign_data['name']} (ID: {campaign_id})")
+            logger.info("Created Meta Ads campaign: %s (ID: %s)", campaign_data['name'], campaign_id)
             return campaign_id
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error creating campaign: {e}")
+            logger.error("Meta Ads API error creating campaign: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Error creating Meta Ads campaign: {str(e)}")
+            logger.error("Error creating Meta Ads campaign: %s", e)
             return None
 
     def update_campaign_budget(self, campaign_id: str, new_budget: float, budget_type: str = 'daily') -> bool:
@@ -287,14 +287,14 @@ class MetaAdsIntegration:
                     Campaign.Field.lifetime_budget: int(new_budget * 100)  # Convert to cents
                 })
             
-            logger.info(f"Updated Meta Ads campaign {campaign_id} {budget_type} budget to ${new_budget}")
+            logger.info("Updated Meta Ads campaign %s %s budget to $%s", campaign_id, budget_type, new_budget)
             return True
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error updating budget: {e}")
+            logger.error("Meta Ads API error updating budget: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Error updating Meta Ads campaign budget: {str(e)}")
+            logger.error("Error updating Meta Ads campaign budget: %s", e)
             return False
 
     def pause_campaign(self, campaign_id: str) -> bool:
@@ -308,14 +308,14 @@ class MetaAdsIntegration:
                 Campaign.Field.status: Campaign.Status.paused
             })
             
-            logger.info(f"Paused Meta Ads campaign {campaign_id}")
+            logger.info("Paused Meta Ads campaign %s", campaign_id)
             return True
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error pausing campaign: {e}")
+            logger.error("Meta Ads API error pausing campaign: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Error pausing Meta Ads campaign: {str(e)}")
+            logger.error("Error pausing Meta Ads campaign: %s", e)
             return False
 
     def resume_campaign(self, campaign_id: str) -> bool:
@@ -329,14 +329,14 @@ class MetaAdsIntegration:
                 Campaign.Field.status: Campaign.Status.active
             })
             
-            logger.info(f"Resumed Meta Ads campaign {campaign_id}")
+            logger.info("Resumed Meta Ads campaign %s", campaign_id)
             return True
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error resuming campaign: {e}")
+            logger.error("Meta Ads API error resuming campaign: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Error resuming Meta Ads campaign: {str(e)}")
+            logger.error("Error resuming Meta Ads campaign: %s", e)
             return False
 
     def get_account_info(self) -> Dict:
@@ -367,8 +367,8 @@ class MetaAdsIntegration:
             }
             
         except FacebookRequestError as e:
-            logger.error(f"Meta Ads API error retrieving account info: {e}")
+            logger.error("Meta Ads API error retrieving account info: %s", e)
             return {}
         except Exception as e:
-            logger.error(f"Error retrieving Meta Ads account info: {str(e)}")
+            logger.error("Error retrieving Meta Ads account info: %s", e)
             return {}
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Baseline schema as created by db.create_all()
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00
+
+Tables that already exist (created by db.create_all(), which app.py runs at
+import) are left alone, so `flask db upgrade` works on new and existing
+databases alike.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('campaign'):
+        op.create_table(
+            'campaign',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('campaign_name', sa.String(length=200), nullable=False),
+            sa.Column('target_audience', sa.Text(), nullable=False),
+            sa.Column('budget', sa.Float(), nullable=False),
+            sa.Column('duration', sa.Integer(), nullable=False),
+            sa.Column('objectives', sa.Text(), nullable=False),
+            sa.Column('channels', sa.String(length=500), nullable=True),
+            sa.Column('current_metrics', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('report'):
+        op.create_table(
+            'report',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('campaign_id', sa.Integer(), nullable=False),
+            sa.Column('report_data', sa.JSON(), nullable=False),
+            sa.Column('generated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('audience_sketch'):
+        op.create_table(
+            'audience_sketch',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('platform', sa.String(length=50), nullable=False),
+            sa.Column('campaign_ref', sa.String(length=100), nullable=False),
+            sa.Column('precision', sa.SmallInteger(), nullable=False),
+            sa.Column('registers', sa.LargeBinary(), nullable=False),
+            sa.Column('ids_added', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('platform', 'campaign_ref', name='uq_audience_sketch_platform_campaign')
+        )
+
+
+def downgrade():
+    op.drop_table('audience_sketch')
+    op.drop_table('report')
+    op.drop_table('campaign')
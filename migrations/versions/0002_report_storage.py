@@ -0,0 +1,126 @@
+"""Compressed report storage, report_summary side table and list indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:30:00
+
+Steps already applied by db.create_all() (indexes, the summary table) are
+skipped, and summaries are backfilled for every report that lacks one.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from utils.report_storage import build_report_summary
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_campaign_created_at_id', 'campaign', ['created_at', 'id']),
+    ('ix_report_generated_at_id', 'report', ['generated_at', 'id']),
+    ('ix_report_campaign_id_generated_at_id', 'report', ['campaign_id', 'generated_at', 'id']),
+]
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _backfill_summaries(bind):
+    report = sa.table('report', sa.column('id', sa.Integer), sa.column('campaign_id', sa.Integer),
+                      sa.column('report_data', sa.JSON), sa.column('generated_at', sa.DateTime))
+    campaign = sa.table('campaign', sa.column('id', sa.Integer), sa.column('budget', sa.Float),
+                        sa.column('duration', sa.Integer))
+    summary = sa.table('report_summary', *[sa.column(name) for name in [
+        'report_id', 'campaign_id', 'generated_at', 'executive_summary', 'total_budget',
+        'daily_budget', 'roi_projection', 'primary_metrics', 'success_benchmarks'
+    ]])
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(report.c.id, report.c.campaign_id, report.c.report_data, report.c.generated_at,
+                      campaign.c.budget, campaign.c.duration)
+            .select_from(
+                report.join(campaign, campaign.c.id == report.c.campaign_id)
+                .outerjoin(summary, summary.c.report_id == report.c.id)
+            )
+            .where(report.c.id > last_id, summary.c.report_id.is_(None))
+            .order_by(report.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(summary.insert(), [
+            {'report_id': row.id, 'campaign_id': row.campaign_id, 'generated_at': row.generated_at,
+             **build_report_summary(row.report_data, row.budget, row.duration)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    existing_indexes = {index['name'] for table in ('campaign', 'report') for index in inspector.get_indexes(table)}
+    for name, table, columns in INDEXES:
+        if name not in existing_indexes:
+            op.create_index(name, table, columns)
+
+    report_columns = {column['name'] for column in inspector.get_columns('report')}
+    with op.batch_alter_table('report') as batch_op:
+        if 'payload_blob' not in report_columns:
+            batch_op.add_column(sa.Column('payload_blob', sa.LargeBinary(), nullable=True))
+        if 'payload_codec' not in report_columns:
+            batch_op.add_column(sa.Column('payload_codec', sa.String(length=10), nullable=True))
+        if bind.dialect.name == 'postgresql':
+            batch_op.alter_column('report_data', existing_type=sa.JSON(), type_=postgresql.JSONB(),
+                                  nullable=True, postgresql_using='report_data::jsonb')
+        else:
+            batch_op.alter_column('report_data', existing_type=sa.JSON(), nullable=True)
+
+    if not inspector.has_table('report_summary'):
+        op.create_table(
+            'report_summary',
+            sa.Column('report_id', sa.Integer(), nullable=False),
+            sa.Column('campaign_id', sa.Integer(), nullable=False),
+            sa.Column('generated_at', sa.DateTime(), nullable=True),
+            sa.Column('executive_summary', sa.Text(), nullable=True),
+            sa.Column('total_budget', sa.Float(), nullable=True),
+            sa.Column('daily_budget', sa.Float(), nullable=True),
+            sa.Column('roi_projection', sa.Text(), nullable=True),
+            sa.Column('primary_metrics', sa.Text(), nullable=True),
+            sa.Column('success_benchmarks', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['report_id'], ['report.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('report_id')
+        )
+        op.create_index('ix_report_summary_campaign_id_generated_at', 'report_summary',
+                        ['campaign_id', 'generated_at', 'report_id'])
+    # db.create_all() may have created the table empty, so fill any gaps
+    _backfill_summaries(bind)
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.drop_index('ix_report_summary_campaign_id_generated_at', table_name='report_summary')
+    op.drop_table('report_summary')
+    # Compacted payloads cannot be restored into a NOT NULL JSON column, so
+    # refuse rather than lose them
+    if bind.execute(sa.text('SELECT COUNT(*) FROM report WHERE report_data IS NULL')).scalar():
+        raise RuntimeError("Rehydrate compacted reports before downgrading below 0002")
+    with op.batch_alter_table('report') as batch_op:
+        if bind.dialect.name == 'postgresql':
+            batch_op.alter_column('report_data', existing_type=postgresql.JSONB(), type_=sa.JSON(),
+                                  nullable=False, postgresql_using='report_data::json')
+        else:
+            batch_op.alter_column('report_data', existing_type=sa.JSON(), nullable=False)
+        batch_op.drop_column('payload_codec')
+        batch_op.drop_column('payload_blob')
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
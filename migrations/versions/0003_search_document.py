@@ -0,0 +1,55 @@
+"""Full-text search documents
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:00:00
+
+Populate the index afterwards with `flask reindex-search`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.search import POSTGRES_DDL, SQLITE_DDL, SQLITE_DROP_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('search_document'):
+        op.create_table(
+            'search_document',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('ref_id', sa.Integer(), nullable=False),
+            sa.Column('campaign_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=True),
+            sa.Column('body', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('kind', 'ref_id', name='uq_search_document_kind_ref')
+        )
+        op.create_index('ix_search_document_campaign_id', 'search_document', ['campaign_id'])
+
+    # All statements are IF NOT EXISTS, so this is safe after db.create_all()
+    if bind.dialect.name == 'postgresql':
+        for statement in POSTGRES_DDL:
+            op.execute(statement)
+    elif bind.dialect.name == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_DROP_DDL:
+            op.execute(statement)
+    op.drop_index('ix_search_document_campaign_id', table_name='search_document')
+    op.drop_table('search_document')
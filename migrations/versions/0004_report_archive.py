@@ -0,0 +1,42 @@
+"""Archive pointer columns on report
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 11:00:00
+
+Archived reports keep their row, with the payload columns cleared and these
+columns pointing into the segment files written by `flask archive-reports`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('archive_segment', sa.String(length=40)),
+    ('archive_offset', sa.BigInteger()),
+    ('archive_length', sa.Integer()),
+]
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('report')}
+    with op.batch_alter_table('report') as batch_op:
+        for name, type_ in COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+
+def downgrade():
+    # Without the pointers archived payloads could no longer be found
+    if op.get_bind().execute(sa.text('SELECT COUNT(*) FROM report WHERE archive_segment IS NOT NULL')).scalar():
+        raise RuntimeError("Restore archived reports before downgrading below 0004")
+    with op.batch_alter_table('report') as batch_op:
+        for name, _ in reversed(COLUMNS):
+            batch_op.drop_column(name)
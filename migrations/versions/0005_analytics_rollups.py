@@ -0,0 +1,57 @@
+"""Analytics rollup tables
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 12:00:00
+
+Populate them afterwards with `flask rebuild-rollups`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('analytics_daily'):
+        op.create_table(
+            'analytics_daily',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('campaigns', sa.Integer(), nullable=False),
+            sa.Column('total_budget', sa.Float(), nullable=False),
+            sa.Column('reports', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('day')
+        )
+    if not inspector.has_table('analytics_channel'):
+        op.create_table(
+            'analytics_channel',
+            sa.Column('channel', sa.String(length=100), nullable=False),
+            sa.Column('campaigns', sa.Integer(), nullable=False),
+            sa.Column('total_budget', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('channel')
+        )
+    if not inspector.has_table('analytics_campaign_reports'):
+        op.create_table(
+            'analytics_campaign_reports',
+            sa.Column('campaign_id', sa.Integer(), nullable=False),
+            sa.Column('reports', sa.Integer(), nullable=False),
+            sa.Column('last_report_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['campaign_id'], ['campaign.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('campaign_id')
+        )
+        op.create_index('ix_analytics_campaign_reports_reports', 'analytics_campaign_reports',
+                        ['reports', 'campaign_id'])
+
+
+def downgrade():
+    op.drop_index('ix_analytics_campaign_reports_reports', table_name='analytics_campaign_reports')
+    op.drop_table('analytics_campaign_reports')
+    op.drop_table('analytics_channel')
+    op.drop_table('analytics_daily')
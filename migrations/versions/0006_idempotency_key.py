@@ -0,0 +1,42 @@
+"""Idempotency keys
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 13:00:00
+
+Responses stored for requests that sent an Idempotency-Key, kept for
+IDEMPOTENCY_TTL seconds.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('idempotency_key'):
+        op.create_table(
+            'idempotency_key',
+            sa.Column('scope', sa.String(length=100), nullable=False),
+            sa.Column('key', sa.String(length=255), nullable=False),
+            sa.Column('fingerprint', sa.String(length=32), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('response_status', sa.SmallInteger(), nullable=True),
+            sa.Column('response_body', sa.LargeBinary(), nullable=True),
+            sa.Column('content_type', sa.String(length=100), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('scope', 'key')
+        )
+        op.create_index('ix_idempotency_key_expires_at', 'idempotency_key', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_idempotency_key_expires_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
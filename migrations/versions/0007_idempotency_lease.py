@@ -0,0 +1,32 @@
+"""Lease on idempotency key claims
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00
+
+An in-progress key records until when its claim holds, so a retry can take
+over a key whose worker died mid-request instead of getting 409s until the
+key expires.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('idempotency_key')}
+    if 'locked_until' not in existing:
+        with op.batch_alter_table('idempotency_key') as batch_op:
+            batch_op.add_column(sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('idempotency_key') as batch_op:
+        batch_op.drop_column('locked_until')
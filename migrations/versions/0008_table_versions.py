@@ -0,0 +1,42 @@
+"""Row count and write version per table
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00
+
+List ETags read these instead of counting campaign and report on every
+request. The rows are seeded from the current table sizes; `flask
+rebuild-rollups` recounts them at any time.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('analytics_table_version'):
+        op.create_table(
+            'analytics_table_version',
+            sa.Column('table_name', sa.String(length=50), nullable=False),
+            sa.Column('row_count', sa.BigInteger(), nullable=False),
+            sa.Column('version', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('table_name')
+        )
+    for table_name in ('campaign', 'report'):
+        bind.execute(sa.text(
+            f"INSERT INTO analytics_table_version (table_name, row_count, version) "
+            f"SELECT '{table_name}', COUNT(*), 1 FROM {table_name} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM analytics_table_version WHERE table_name = '{table_name}')"
+        ))
+
+
+def downgrade():
+    op.drop_table('analytics_table_version')
@@ -1,10 +1,21 @@
 from datetime import datetime
 from sqlalchemy import JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from app import db
+from utils.report_storage import resolve_payload
+from utils.search import install_search_ddl
+
+# JSONB on Postgres (binary, compact, indexable), plain JSON elsewhere.
+# none_as_null stores SQL NULL, not JSON 'null', once a payload is compacted.
+JSONPayload = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
 
 
 class Campaign(db.Model):
     __tablename__ = 'campaign'
+    __table_args__ = (
+        # Keyset pagination of /campaigns walks this index newest first
+        db.Index('ix_campaign_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_name = db.Column(db.String(200), nullable=False)
@@ -35,16 +46,180 @@ class Campaign(db.Model):
 
 class Report(db.Model):
     __tablename__ = 'report'
+    __table_args__ = (
+        # Keyset pagination of /reports, unfiltered and per campaign
+        db.Index('ix_report_generated_at_id', 'generated_at', 'id'),
+        db.Index('ix_report_campaign_id_generated_at_id', 'campaign_id', 'generated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
-    report_data = db.Column(JSON, nullable=False)
+    # Hot payload; cleared when the report is compacted into payload_blob
+    report_data = db.Column(JSONPayload)
+    # Cold payload: compressed JSON (see utils/report_storage.py)
+    payload_blob = db.Column(db.LargeBinary)
+    payload_codec = db.Column(db.String(10))
+    # Archived payload: location in the segment files (see utils/report_archive.py)
+    archive_segment = db.Column(db.String(40))
+    archive_offset = db.Column(db.BigInteger)
+    archive_length = db.Column(db.Integer)
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    summary = db.relationship('ReportSummary', uselist=False, backref='report', cascade='all, delete-orphan')
+
+    @property
+    def payload(self):
+        return resolve_payload(self.report_data, self.payload_blob, self.payload_codec,
+                               (self.archive_segment, self.archive_offset, self.archive_length))
     
     def to_dict(self):
         return {
             'id': self.id,
             'campaign_id': self.campaign_id,
-            'report_data': self.report_data,
+            'report_data': self.payload,
             'generated_at': self.generated_at.isoformat() if self.generated_at else None
-        }
\ No newline at end of file
+        }
+
+
+class ReportSummary(db.Model):
+    """Small denormalized copy of each report's headline numbers for list views"""
+    __tablename__ = 'report_summary'
+    __table_args__ = (
+        db.Index('ix_report_summary_campaign_id_generated_at', 'campaign_id', 'generated_at', 'report_id'),
+    )
+
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id', ondelete='CASCADE'), primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id', ondelete='CASCADE'), nullable=False)
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    executive_summary = db.Column(db.Text)
+    total_budget = db.Column(db.Float)
+    daily_budget = db.Column(db.Float)
+    roi_projection = db.Column(db.Text)
+    primary_metrics = db.Column(db.Text)
+    success_benchmarks = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'report_id': self.report_id,
+            'campaign_id': self.campaign_id,
+            'generated_at': self.generated_at.isoformat() if self.generated_at else None,
+            'executive_summary': self.executive_summary,
+            'total_budget': self.total_budget,
+            'daily_budget': self.daily_budget,
+            'roi_projection': self.roi_projection,
+            'primary_metrics': self.primary_metrics,
+            'success_benchmarks': self.success_benchmarks
+        }
+
+class AudienceSketch(db.Model):
+    __tablename__ = 'audience_sketch'
+    __table_args__ = (
+        db.UniqueConstraint('platform', 'campaign_ref', name='uq_audience_sketch_platform_campaign'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(50), nullable=False)
+    # Ad platform campaign id; empty string for platform-wide audience lists
+    campaign_ref = db.Column(db.String(100), nullable=False, default='')
+    precision = db.Column(db.SmallInteger, nullable=False)
+    # zlib-compressed HyperLogLog registers (at most 16 KiB at precision 14)
+    registers = db.Column(db.LargeBinary, nullable=False)
+    ids_added = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'platform': self.platform,
+            'campaign_id': self.campaign_ref or None,
+            'precision': self.precision,
+            'ids_added': self.ids_added,
+            'sketch_bytes': len(self.registers) if self.registers else 0,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class SearchDocument(db.Model):
+    """
+    Searchable text of a campaign or report
+
+    The full-text index itself is dialect specific and created alongside the
+    table: a generated tsvector column with a GIN index on Postgres, an FTS5
+    table kept in sync by triggers on SQLite (see utils/search.py).
+    """
+    __tablename__ = 'search_document'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'ref_id', name='uq_search_document_kind_ref'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    # Campaign id or report id, depending on kind
+    ref_id = db.Column(db.Integer, nullable=False)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id', ondelete='CASCADE'), nullable=False, index=True)
+    title = db.Column(db.String(200))
+    body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+install_search_ddl(SearchDocument.__table__)
+
+
+class AnalyticsDaily(db.Model):
+    """Campaigns, budget and reports per UTC day, maintained incrementally (see utils/rollups.py)"""
+    __tablename__ = 'analytics_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    campaigns = db.Column(db.Integer, nullable=False, default=0)
+    total_budget = db.Column(db.Float, nullable=False, default=0.0)
+    reports = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AnalyticsChannel(db.Model):
+    """Campaign count and budget per marketing channel"""
+    __tablename__ = 'analytics_channel'
+
+    channel = db.Column(db.String(100), primary_key=True)
+    campaigns = db.Column(db.Integer, nullable=False, default=0)
+    total_budget = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class AnalyticsCampaignReports(db.Model):
+    """Report count per campaign"""
+    __tablename__ = 'analytics_campaign_reports'
+    __table_args__ = (
+        # Most-reported campaigns without scanning the table
+        db.Index('ix_analytics_campaign_reports_reports', 'reports', 'campaign_id'),
+    )
+
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id', ondelete='CASCADE'), primary_key=True)
+    reports = db.Column(db.Integer, nullable=False, default=0)
+    last_report_at = db.Column(db.DateTime)
+
+
+class AnalyticsTableVersion(db.Model):
+    """Row count and write version of campaign and report, for cheap list ETags"""
+    __tablename__ = 'analytics_table_version'
+
+    table_name = db.Column(db.String(50), primary_key=True)
+    row_count = db.Column(db.BigInteger, nullable=False, default=0)
+    # Bumped by every transaction that inserts or deletes rows
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+    """A POST request's Idempotency-Key and, once it finished, its response (see utils/idempotency.py)"""
+    __tablename__ = 'idempotency_key'
+
+    # Endpoint name; the same key may be used on different endpoints
+    scope = db.Column(db.String(100), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    response_status = db.Column(db.SmallInteger)
+    response_body = db.Column(db.LargeBinary)
+    content_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # End of the running request's claim; a retry may take the key over after it
+    locked_until = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
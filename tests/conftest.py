@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ['STORAGE'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='novaedge-tests-'), 'test.db')
+os.environ['ADMISSION_CONTROL'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected, AsyncGate
+
+
+def make_gate(concurrency=1, queue_size=4, timeout=1.0):
+    return AsyncGate('generate_report', concurrency, queue_size, timeout)
+
+
+def make_controller():
+    controller = AdmissionController(limits='generate_report=1/0', async_limits='generate_report=1/1',
+                                     rate_per_minute=0, max_active=2)
+    # conftest turns admission control off for the app
+    controller.enabled = True
+    return controller
+
+
+async def settle():
+    """Let every task that is ready run until it blocks again"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def scenario():
+        gate = make_gate()
+        await gate.acquire_async()
+        first = asyncio.ensure_future(gate.acquire_async())
+        second = asyncio.ensure_future(gate.acquire_async())
+        await settle()
+        assert gate.waiting == 2
+
+        gate.release(0.1)
+        await settle()
+
+        assert first.done() and not second.done()
+        assert gate.active == 1 and gate.waiting == 1
+        gate.release(0.1)
+        await second
+        assert gate.active == 1 and gate.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiter_times_out_without_leaking_a_slot():
+    async def scenario():
+        gate = make_gate(timeout=0.05)
+        await gate.acquire_async()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire_async()
+
+        assert rejected.value.reason == 'timeout' and rejected.value.status == 503
+        assert gate.active == 1 and gate.waiting == 0 and not gate._waiters
+        # The slot still goes straight back to the gate
+        gate.release(0.1)
+        assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        gate = make_gate()
+        await gate.acquire_async()
+        cancelled = asyncio.ensure_future(gate.acquire_async())
+        waiter = asyncio.ensure_future(gate.acquire_async())
+        await settle()
+
+        cancelled.cancel()
+        await settle()
+        assert gate.waiting == 1
+        gate.release(0.1)
+        await waiter
+
+        assert cancelled.cancelled()
+        assert gate.active == 1 and gate.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def scenario():
+        gate = make_gate()
+        await gate.acquire_async()
+        cancelled = asyncio.ensure_future(gate.acquire_async())
+        waiter = asyncio.ensure_future(gate.acquire_async())
+        await settle()
+
+        # Hand the slot over, then cancel before the waiter resumes to take it
+        gate.release(0.1)
+        cancelled.cancel()
+        await settle()
+
+        # The cancelled waiter passes the slot on; before Python 3.12,
+        # asyncio.wait_for keeps the result and the waiter holds it instead
+        assert gate.active == 1
+        if cancelled.cancelled():
+            assert waiter.done()
+        else:
+            waiter.cancel()
+            await settle()
+            gate.release(0.1)
+            assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_refused_at_once():
+    async def scenario():
+        gate = make_gate(queue_size=1)
+        await gate.acquire_async()
+        waiter = asyncio.ensure_future(gate.acquire_async())
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire_async()
+
+        assert rejected.value.reason == 'queue_full'
+        gate.release(0.1)
+        await waiter
+
+    asyncio.run(scenario())
+
+
+def test_sync_admissions_are_counted_and_released():
+    controller = make_controller()
+
+    gate = controller.acquire('generate_report', 'client')
+    assert controller._admitted == 1
+    # Concurrency 1 and no queue: refused, and the count is given back
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('generate_report', 'client')
+    assert rejected.value.reason == 'queue_full'
+    assert controller._admitted == 1
+
+    controller.release(gate, 0.1)
+    assert controller._admitted == 0 and gate.active == 0
+
+
+def test_async_admissions_do_not_count_towards_max_active():
+    controller = make_controller()
+
+    async def scenario():
+        gate = await controller.acquire_async('generate_report', 'client')
+        assert isinstance(gate, AsyncGate)
+        assert controller._admitted == 0 and gate.active == 1
+        controller.release(gate, 0.1)
+        assert controller._admitted == 0 and gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_ungated_endpoints_are_admitted_without_a_gate():
+    controller = make_controller()
+
+    assert controller.acquire('get_campaigns', 'client') is None
+    assert asyncio.run(controller.acquire_async('get_campaigns', 'client')) is None
+    assert controller._admitted == 0
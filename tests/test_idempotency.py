@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from flask import g
+from sqlalchemy import update
+
+from app import IdempotencyKey, db
+from utils.admission import admission
+from utils.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyError, IdempotencyStore
+
+CAMPAIGN = {'campaign_name': 'Spring Sale', 'target_audience': 'Students', 'budget': 1000,
+            'duration': 14, 'objectives': 'Conversions'}
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Replace the LLM call; the list collects the campaign of every call"""
+    calls = []
+
+    def fake_report(**campaign_fields):
+        calls.append(campaign_fields['campaign_name'])
+        return {'executive_summary': 'Generated'}
+
+    monkeypatch.setattr('app.generate_marketing_report', fake_report)
+    return calls
+
+
+@pytest.fixture
+def store(app):
+    """A store of its own with short waits, on the app's database"""
+    with app.app_context():
+        yield IdempotencyStore(db, IdempotencyKey, wait=0.1, lease=60)
+
+
+def post_report(client, key, payload=CAMPAIGN):
+    return client.post('/generate-report', json=payload, headers={IDEMPOTENCY_HEADER: key})
+
+
+def expire_lease(store, scope, key):
+    with db.engine.begin() as connection:
+        connection.execute(update(store.table).where(store.table.c.key == key).values(
+            locked_until=datetime.utcnow() - timedelta(seconds=1)))
+    with db.engine.connect() as connection:
+        return store._load(connection, scope, key)
+
+
+def test_retry_replays_the_stored_response(client, generations):
+    first = post_report(client, 'replay-1')
+    retry = post_report(client, 'replay-1')
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert generations == ['Spring Sale']
+
+
+def test_key_reused_with_another_payload_is_422(client, generations):
+    post_report(client, 'reuse-1')
+
+    response = post_report(client, 'reuse-1', {**CAMPAIGN, 'budget': 2000})
+
+    assert response.status_code == 422
+    assert response.get_json()['success'] is False
+    assert len(generations) == 1
+
+
+def test_retry_while_running_is_409(store):
+    assert store.claim('generate_report', 'running-1', 'fingerprint') is None
+
+    with pytest.raises(IdempotencyError) as error:
+        store.claim('generate_report', 'running-1', 'fingerprint')
+
+    assert error.value.status == 409
+    assert error.value.retry_after >= 1
+
+
+def test_expired_lease_is_taken_over_once(store):
+    store.claim('generate_report', 'lease-1', 'fingerprint')
+    stale = expire_lease(store, 'generate_report', 'lease-1')
+
+    # Both retries saw the same expired lease; only the first one wins it
+    assert store._take_over('generate_report', 'lease-1', stale) is True
+    assert store._take_over('generate_report', 'lease-1', stale) is False
+
+
+def test_claim_takes_over_an_expired_lease(store):
+    store.claim('generate_report', 'lease-2', 'fingerprint')
+    expire_lease(store, 'generate_report', 'lease-2')
+
+    assert store.claim('generate_report', 'lease-2', 'fingerprint') is None
+    # The new lease holds off the next retry
+    with pytest.raises(IdempotencyError):
+        store.claim('generate_report', 'lease-2', 'fingerprint')
+
+
+def test_abandon_async_releases_the_claim(app, store):
+    with app.test_request_context('/generate-report', method='POST'):
+        assert asyncio.run(store.claim_async('generate_report', 'abandon-1', 'fingerprint')) is None
+        g.idempotency = ('generate_report', 'abandon-1')
+
+        asyncio.run(store.abandon_async())
+
+        assert 'idempotency' not in g
+    with db.engine.connect() as connection:
+        assert store._load(connection, 'generate_report', 'abandon-1') is None
+    assert store.claim('generate_report', 'abandon-1', 'fingerprint') is None
+
+
+def test_admission_rejection_releases_the_claim(app, client, generations, monkeypatch):
+    gate = admission.gates['generate_report']
+    monkeypatch.setattr(admission, 'enabled', True)
+    monkeypatch.setattr(admission, 'buckets', None)
+    monkeypatch.setattr(gate, 'active', gate.concurrency)
+    monkeypatch.setattr(gate, 'queue_size', 0)
+
+    response = post_report(client, 'rejected-1')
+
+    assert response.status_code == 503
+    assert generations == []
+    with app.app_context(), db.engine.connect() as connection:
+        assert connection.execute(IdempotencyKey.__table__.select().where(
+            IdempotencyKey.key == 'rejected-1')).first() is None
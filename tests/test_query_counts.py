@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import Campaign, Report, ReportSummary, db
+from utils.query_counter import QueryCounter
+from utils.report_storage import build_report_summary
+
+REPORT_COUNT = 5
+
+
+@pytest.fixture(scope='module')
+def campaign_id(app):
+    """A campaign with REPORT_COUNT reports, one day apart, each with its summary row"""
+    with app.app_context():
+        campaign = Campaign(campaign_name='Launch Promo', target_audience='Runners', budget=5000,
+                            duration=30, objectives='Awareness')
+        db.session.add(campaign)
+        db.session.flush()
+        for i in range(REPORT_COUNT):
+            report_data = {'executive_summary': f'Report {i}'}
+            report = Report(campaign_id=campaign.id, report_data=report_data,
+                            generated_at=datetime(2026, 1, 1) + timedelta(days=i))
+            db.session.add(report)
+            db.session.flush()
+            db.session.add(ReportSummary(report_id=report.id, campaign_id=campaign.id,
+                                         generated_at=report.generated_at,
+                                         **build_report_summary(report_data, campaign.budget, campaign.duration)))
+        db.session.commit()
+        return campaign.id
+
+
+def get_counted(app, client, url):
+    """GET url, asserting it ran exactly one SQL statement"""
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        response = client.get(url)
+    assert counter.count == 1, counter.statements
+    assert response.headers['X-Query-Count'] == '1'
+    return response
+
+
+@pytest.mark.parametrize('query, reports', [
+    ('', REPORT_COUNT),
+    ('?reports=summary', REPORT_COUNT),
+    ('?reports_limit=1', 1),
+])
+def test_campaign_with_reports_is_one_query(app, client, campaign_id, query, reports):
+    response = get_counted(app, client, f'/campaigns/{campaign_id}{query}')
+
+    assert response.status_code == 200
+    campaign = response.get_json()['campaign']
+    assert campaign['id'] == campaign_id
+    assert len(campaign['reports']) == reports
+    # Newest first
+    assert campaign['reports'][0]['generated_at'].startswith(f'2026-01-0{REPORT_COUNT}')
+
+
+def test_summary_reports_come_from_the_summary_table(app, client, campaign_id):
+    response = get_counted(app, client, f'/campaigns/{campaign_id}?reports=summary')
+
+    reports = response.get_json()['campaign']['reports']
+    assert reports[0]['executive_summary'] == f'Report {REPORT_COUNT - 1}'
+    assert 'report_data' not in reports[0]
+
+
+def test_campaign_without_reports_is_one_query(app, client, campaign_id):
+    response = get_counted(app, client, f'/campaigns/{campaign_id}?reports=none')
+
+    assert response.status_code == 200
+    assert 'reports' not in response.get_json()['campaign']
+
+
+def test_next_reports_page_is_one_query(app, client, campaign_id):
+    first = client.get(f'/campaigns/{campaign_id}?reports_limit=2').get_json()['campaign']
+
+    response = get_counted(app, client, f"/campaigns/{campaign_id}?reports_limit=2"
+                                        f"&reports_cursor={first['reports_next_cursor']}")
+
+    reports = response.get_json()['campaign']['reports']
+    assert [report['generated_at'][:10] for report in reports] == ['2026-01-03', '2026-01-02']
+
+
+def test_missing_campaign_is_one_query(app, client, campaign_id):
+    response = get_counted(app, client, f'/campaigns/{campaign_id + 1000}')
+
+    assert response.status_code == 404
@@ -0,0 +1,378 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, g, jsonify, request
+
+from utils.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTIONS
+
+# Flask endpoint -> (concurrent requests, waiting requests) per worker process.
+# LLM calls are I/O-bound and take seconds; the audience endpoints parse
+# uploads and run k-means in-process, so fewer of them run at once
+DEFAULT_LIMITS = {
+    'generate_report': (8, 16),
+    'generate_report_with_ads': (8, 16),
+    'generate_audience_insights': (4, 8),
+    'generate_precision_targeting': (4, 8),
+}
+# The same for the async report views under asgi.py: a waiting request is a
+# parked coroutine, not a thread, so far more of them can run and queue
+DEFAULT_ASYNC_LIMITS = {
+    'generate_report': (256, 512),
+    'generate_report_with_ads': (256, 512),
+}
+DEFAULT_QUEUE_TIMEOUT = 10.0
+DEFAULT_RATE_PER_MINUTE = 30.0
+DEFAULT_BURST = 10
+# Clients tracked for rate limiting; the least recently seen are forgotten first
+MAX_CLIENTS = 10_000
+# Weight of the newest request in the moving average of service time
+SERVICE_TIME_ALPHA = 0.2
+# WSGI environ flag of requests dispatched to an async view by asgi.py, which
+# admits them with admit_async() rather than blocking the loop in before_request
+ASYNC_DISPATCH = 'novaedge.async_dispatch'
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before any work was done; status is 429 or 503"""
+
+    def __init__(self, message: str, status: int, retry_after: float, reason: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[int, int]]:
+    """'generate_report=8/16,generate_audience_insights=2/4' -> {'generate_report': (8, 16), ...}"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        concurrency, _, queue_size = value.partition('/')
+        try:
+            limits[name.strip()] = (int(concurrency), int(queue_size or 0))
+        except ValueError:
+            raise ValueError(f"Invalid admission limit '{item.strip()}' (expected endpoint=concurrency/queue)")
+        if not name.strip() or limits[name.strip()][0] < 1 or limits[name.strip()][1] < 0:
+            raise ValueError(f"Invalid admission limit '{item.strip()}' (expected endpoint=concurrency/queue)")
+    return limits
+
+
+class Gate:
+    """
+    Concurrency limit with a bounded wait queue
+
+    Up to `concurrency` requests run at once and up to `queue_size` more wait,
+    each for at most `timeout` seconds. A request is refused at once, rather
+    than queued, when the queue is full or the expected wait (from a moving
+    average of service time) already exceeds the timeout.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.0
+        self._condition = threading.Condition()
+
+    def _expected_wait(self) -> float:
+        # Requests ahead of this one drain `concurrency` at a time
+        return self.service_time * math.ceil((self.waiting + 1) / self.concurrency)
+
+    def acquire(self, deadline: Optional[float] = None):
+        """Take a slot, waiting until the queue timeout (or an earlier monotonic deadline)"""
+        with self._condition:
+            if self.active < self.concurrency and not self.waiting:
+                self.active += 1
+                return
+            expected = self._expected_wait()
+            if self.waiting >= self.queue_size:
+                raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503, expected, 'queue_full')
+            started = time.monotonic()
+            deadline = min(deadline or math.inf, started + self.timeout)
+            if started + expected > deadline:
+                raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503, expected, 'shed')
+            self.waiting += 1
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503,
+                                                self._expected_wait(), 'timeout')
+                    self._condition.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                ADMISSION_QUEUE_WAIT.observe(time.monotonic() - started, endpoint=self.name)
+
+    def release(self, elapsed: float):
+        with self._condition:
+            self.active -= 1
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._condition.notify()
+
+    def status(self) -> Dict:
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'mean_service_seconds': round(self.service_time, 3),
+        }
+
+
+class AsyncGate(Gate):
+    """
+    Gate for coroutines on one event loop
+
+    Waiting requests park on futures instead of threads; release() hands the
+    freed slot straight to the oldest waiter. Only use it from the loop thread.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float):
+        super().__init__(name, concurrency, queue_size, timeout)
+        self._waiters: deque = deque()
+
+    async def acquire_async(self):
+        if self.active < self.concurrency and not self.waiting:
+            self.active += 1
+            return
+        expected = self._expected_wait()
+        if self.waiting >= self.queue_size:
+            raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503, expected, 'queue_full')
+        if expected > self.timeout:
+            raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503, expected, 'shed')
+        started = time.monotonic()
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(slot, self.timeout)
+        except asyncio.TimeoutError:
+            # Unless the slot was handed over just as the wait ended
+            if not self._handed_over(slot):
+                raise AdmissionRejected(f'{self.name} is at capacity, retry later', 503,
+                                        self._expected_wait(), 'timeout')
+        except BaseException:
+            # Cancelled, e.g. the client went away: pass on a slot handed over meanwhile
+            if self._handed_over(slot):
+                self.active -= 1
+                self._wake_next()
+            raise
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_WAIT.observe(time.monotonic() - started, endpoint=self.name)
+
+    def _handed_over(self, slot) -> bool:
+        if slot.done() and not slot.cancelled():
+            return True
+        if slot in self._waiters:
+            self._waiters.remove(slot)
+        return False
+
+    def _wake_next(self):
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                self.active += 1
+                slot.set_result(None)
+                return
+
+    def release(self, elapsed: float):
+        self.active -= 1
+        self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+        self._wake_next()
+
+
+class TokenBuckets:
+    """Per-client token buckets: `rate` requests a second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """0 when a token was taken, else the seconds until the next one"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionController:
+    """
+    Admission control for the expensive endpoints
+
+    Each gated endpoint has its own Gate, and all of them share one cap on
+    active plus waiting requests (ADMISSION_MAX_ACTIVE), so a burst of
+    report generations can never occupy every worker thread and the cheap
+    read endpoints, which are not gated, keep being served. Each client
+    (remote address, or ADMISSION_CLIENT_HEADER) also has a token bucket
+    across the gated endpoints. Refusals are immediate 429s (rate limit) or
+    503s (capacity) with Retry-After. Limits apply per worker process.
+
+    The async report views of asgi.py have AsyncGates of their own
+    (ADMISSION_ASYNC_LIMITS, much higher), which queue on the event loop and
+    do not count towards ADMISSION_MAX_ACTIVE, since they hold no thread.
+    """
+
+    def __init__(self, limits: Optional[str] = None, queue_timeout: Optional[float] = None,
+                 rate_per_minute: Optional[float] = None, burst: Optional[int] = None,
+                 max_active: Optional[int] = None, client_header: Optional[str] = None,
+                 async_limits: Optional[str] = None):
+        timeout = float(queue_timeout if queue_timeout is not None
+                        else os.environ.get('ADMISSION_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT))
+        configured = {**DEFAULT_LIMITS, **parse_limits(limits or os.environ.get('ADMISSION_LIMITS'))}
+        self.gates = {name: Gate(name, concurrency, queue_size, timeout)
+                      for name, (concurrency, queue_size) in configured.items()}
+        configured = {**DEFAULT_ASYNC_LIMITS,
+                      **parse_limits(async_limits or os.environ.get('ADMISSION_ASYNC_LIMITS'))}
+        self.async_gates = {name: AsyncGate(name, concurrency, queue_size, timeout)
+                            for name, (concurrency, queue_size) in configured.items()}
+        rate = float(rate_per_minute if rate_per_minute is not None
+                     else os.environ.get('ADMISSION_RATE_PER_MINUTE', DEFAULT_RATE_PER_MINUTE))
+        self.buckets = TokenBuckets(rate / 60, int(burst or os.environ.get('ADMISSION_BURST', DEFAULT_BURST))) \
+            if rate > 0 else None
+        self.max_active = int(max_active or os.environ.get('ADMISSION_MAX_ACTIVE') or 0) or None
+        self.client_header = client_header or os.environ.get('ADMISSION_CLIENT_HEADER')
+        self.enabled = os.environ.get('ADMISSION_CONTROL', '1').lower() not in ('0', 'false', 'no')
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    def client_key(self) -> str:
+        if self.client_header:
+            value = request.headers.get(self.client_header, '')
+            # First hop of X-Forwarded-For style lists
+            value = value.split(',')[0].strip()
+            if value:
+                return value
+        return request.remote_addr or 'unknown'
+
+    def acquire(self, endpoint: str, client: str, deadline: Optional[float] = None) -> Optional[Gate]:
+        """Admit one request to endpoint or raise AdmissionRejected; release() the returned gate afterwards"""
+        gate = self.gates.get(endpoint)
+        if gate is None or not self.enabled:
+            return None
+        try:
+            self._take_token(client)
+            with self._lock:
+                if self.max_active is not None and self._admitted >= self.max_active:
+                    raise AdmissionRejected(f'{endpoint} is at capacity, retry later', 503,
+                                            gate.service_time, 'saturated')
+                self._admitted += 1
+            try:
+                gate.acquire(deadline)
+            except AdmissionRejected:
+                with self._lock:
+                    self._admitted -= 1
+                raise
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(endpoint=endpoint, reason=e.reason)
+            raise
+        return gate
+
+    async def acquire_async(self, endpoint: str, client: str) -> Optional[AsyncGate]:
+        """acquire() for async views: waits on the event loop, never blocks a thread"""
+        gate = self.async_gates.get(endpoint)
+        if gate is None or not self.enabled:
+            return None
+        try:
+            self._take_token(client)
+            await gate.acquire_async()
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(endpoint=endpoint, reason=e.reason)
+            raise
+        return gate
+
+    def _take_token(self, client: str):
+        if self.buckets is not None:
+            wait = self.buckets.take(client)
+            if wait:
+                raise AdmissionRejected('Rate limit exceeded, retry later', 429, wait, 'rate_limited')
+
+    def release(self, gate: Gate, elapsed: float):
+        gate.release(elapsed)
+        if isinstance(gate, AsyncGate):
+            return
+        with self._lock:
+            self._admitted -= 1
+
+    def status(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'max_active': self.max_active,
+            'admitted': self._admitted,
+            'rate_per_minute': round(self.buckets.rate * 60, 3) if self.buckets else None,
+            'burst': self.buckets.burst if self.buckets else None,
+            'endpoints': {name: gate.status() for name, gate in self.gates.items()},
+            'async_endpoints': {name: gate.status() for name, gate in self.async_gates.items()},
+        }
+
+    @staticmethod
+    def _rejected(error: AdmissionRejected):
+        response = jsonify({'success': False, 'error': str(error)})
+        response.status_code = error.status
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    def admit(self):
+        """
+        Admit the current request to its endpoint's gate, or return the 429/503
+        response; the gate is released when the request is torn down
+        """
+        try:
+            gate = self.acquire(request.endpoint, self.client_key())
+        except AdmissionRejected as e:
+            return self._rejected(e)
+        if gate is not None:
+            g.admission = (gate, time.perf_counter())
+        return None
+
+    async def admit_async(self):
+        """admit() for a request dispatched to an async view, on its async gate"""
+        try:
+            gate = await self.acquire_async(request.endpoint, self.client_key())
+        except AdmissionRejected as e:
+            return self._rejected(e)
+        if gate is not None:
+            g.admission = (gate, time.perf_counter())
+        return None
+
+    def init_app(self, app: Flask):
+        """Check every request against its endpoint's gate before the view (or body parsing) runs"""
+
+        @app.before_request
+        def admit_request():
+            if not request.environ.get(ASYNC_DISPATCH):
+                return self.admit()
+
+        @app.teardown_request
+        def release_request(exc):
+            admitted = g.pop('admission', None)
+            if admitted is not None:
+                gate, started = admitted
+                self.release(gate, time.perf_counter() - started)
+
+
+admission = AdmissionController()
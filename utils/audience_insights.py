@@ -4,6 +4,9 @@ import openai
 from dotenv import load_dotenv
 import logging
 from typing import Dict, List, Optional
+from utils import fast_json
+from utils.metrics import track_dependency
+from utils.budget_optimizer import optimize_campaign_budget
 
 # Load environment variables from .env file if present
 load_dotenv()
@@ -16,7 +19,8 @@ if not OPENAI_API_KEY:
 
 openai.api_key = OPENAI_API_KEY
 
-def analyze_deep_audience_insights(target_audience: str, campaign_data: Dict = None, real_ads_data: Dict = None) -> Dict:
+def analyze_deep_audience_insights(target_audience: str, campaign_data: Dict = None, real_ads_data: Dict = None,
+                                   segment_facts: Dict = None) -> Dict:
     """
     Generate deep audience insights with smart targeting and segmentation
     
@@ -24,6 +28,7 @@ def analyze_deep_audience_insights(target_audience: str, campaign_data: Dict = N
         target_audience (str): Description of target audience
         campaign_data (dict): Campaign information for context
         real_ads_data (dict): Real advertising data for enhanced analysis
+        segment_facts (dict): Computed segments from utils.segmentation.segment_customers
     
     Returns:
         dict: Comprehensive audience insights with segmentation
@@ -61,12 +66,27 @@ REAL ADVERTISING DATA AVAILABLE:
 - Current CTR: {avg_ctr:.2%}
 """
         
+        # Add locally computed segments as facts; the model only describes them
+        segment_context = ""
+        size_field = ',\n                    "estimated_size": "Percentage of total audience"'
+        if segment_facts and segment_facts.get('segments'):
+            segment_context = f"""
+
+COMPUTED CUSTOMER SEGMENTS (clustered from {segment_facts['total_customers']:,} first-party customer records, treat as facts):
+"""
+            for label, segment in segment_facts['segments'].items():
+                centroid = ', '.join(f"{name}={value:,.2f}" for name, value in segment['centroid'].items())
+                segment_context += f"- {label}: {segment['size']:,} customers ({segment['share']:.1%}), typical profile: {centroid}\n"
+            # Sizes are filled in from the computed segments after the call
+            size_field = ""
+
         # Construct the AI prompt for deep audience insights
         prompt = f"""
         As a leading marketing strategist specializing in audience analysis and behavioral segmentation, provide comprehensive deep audience insights based on the following information.
 
         {audience_context}
         {real_data_context}
+        {segment_context}
 
         Generate a detailed audience analysis that includes smart targeting, noise reduction, and data-driven segmentation. Focus on practical, actionable insights that will improve campaign performance.
 
@@ -82,20 +102,17 @@ REAL ADVERTISING DATA AVAILABLE:
                 "high_value_segment": {{
                     "description": "Most valuable audience segment",
                     "behaviors": ["Key behavioral indicators"],
-                    "targeting_strategy": "How to reach this segment effectively",
-                    "estimated_size": "Percentage of total audience"
+                    "targeting_strategy": "How to reach this segment effectively"{size_field}
                 }},
                 "growth_segment": {{
                     "description": "Audience with growth potential",
                     "behaviors": ["Behavioral patterns to target"],
-                    "targeting_strategy": "Approach for this segment",
-                    "estimated_size": "Percentage of total audience"
+                    "targeting_strategy": "Approach for this segment"{size_field}
                 }},
                 "nurturing_segment": {{
                     "description": "Audience requiring relationship building",
                     "behaviors": ["Current engagement patterns"],
-                    "targeting_strategy": "Long-term engagement strategy",
-                    "estimated_size": "Percentage of total audience"
+                    "targeting_strategy": "Long-term engagement strategy"{size_field}
                 }}
             }},
             "smart_targeting": {{
@@ -144,51 +161,65 @@ REAL ADVERTISING DATA AVAILABLE:
         # Generate insights using OpenAI GPT-4o
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert marketing strategist specializing in audience analysis, behavioral segmentation, and precision targeting. Provide detailed, actionable insights based on data-driven analysis."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
+        with track_dependency('openai', 'chat.completions'):
+            response = openai.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert marketing strategist specializing in audience analysis, behavioral segmentation, and precision targeting. Provide detailed, actionable insights based on data-driven analysis."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.7
+            )
 
         # Parse the response
         insights_json = response.choices[0].message.content
         if not insights_json:
             raise ValueError("Empty response from OpenAI")
 
-        insights = json.loads(insights_json)
+        insights = fast_json.loads(insights_json)
+
+        # Segment sizes come from the clustering, never from the model
+        if segment_facts and segment_facts.get('segments'):
+            behavioral_segments = insights.setdefault('behavioral_segmentation', {})
+            for label, segment in segment_facts['segments'].items():
+                section = behavioral_segments.setdefault(label, {})
+                section['estimated_size'] = f"{segment['share']:.1%}"
+                section['computed_size'] = segment['size']
+                section['centroid'] = segment['centroid']
         
         # Add metadata about the analysis
         insights['analysis_metadata'] = {
             'real_data_included': bool(real_ads_data and real_ads_data.get('connected_platforms')),
             'connected_platforms': real_ads_data.get('connected_platforms', []) if real_ads_data else [],
             'analysis_timestamp': None,  # You might want to add timestamp here
-            'confidence_score': 'High' if real_ads_data else 'Medium'
+            'confidence_score': 'High' if real_ads_data or segment_facts else 'Medium',
+            'computed_segments': bool(segment_facts and segment_facts.get('segments'))
         }
 
         logger.info("Deep audience insights generated successfully")
         return insights
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON parsing error in audience insights: {str(e)}")
+        logger.error("JSON parsing error in audience insights: %s", e)
         raise ValueError(f"Failed to parse audience insights: {str(e)}")
     except Exception as e:
-        logger.error(f"Error generating audience insights: {str(e)}")
+        logger.error("Error generating audience insights: %s", e)
         raise Exception(f"Failed to generate audience insights: {str(e)}")
 
 
 def filter_audience_noise(audience_data: Dict, quality_threshold: float = 0.7) -> Dict:
     """
     Apply noise reduction filters to audience data
+
+    This is a size-based estimate for when no raw data is available; use
+    utils.noise_filter.filter_event_noise to filter uploaded event logs.
     
     Args:
         audience_data (dict): Raw audience data
@@ -245,17 +276,20 @@ def filter_audience_noise(audience_data: Dict, quality_threshold: float = 0.7) -
         return filtered_data
 
     except Exception as e:
-        logger.error(f"Error filtering audience noise: {str(e)}")
+        logger.error("Error filtering audience noise: %s", e)
         raise Exception(f"Failed to filter audience data: {str(e)}")
 
 
-def generate_precision_targeting_recommendations(insights: Dict, campaign_budget: float = None) -> Dict:
+def generate_precision_targeting_recommendations(insights: Dict, campaign_budget: float = None,
+                                                 performance_data: Dict = None, duration_days: int = 30) -> Dict:
     """
     Generate precision targeting recommendations based on audience insights
     
     Args:
         insights (dict): Deep audience insights
         campaign_budget (float): Campaign budget for budget allocation recommendations
+        performance_data (dict): Ads performance used to fit per-campaign response curves
+        duration_days (int): Planning period for the budget allocation
     
     Returns:
         dict: Precision targeting recommendations
@@ -286,8 +320,21 @@ def generate_precision_targeting_recommendations(insights: Dict, campaign_budget
                 'success_metrics': ['Engagement rate', 'Conversion quality', 'Customer lifetime value']
             }
 
-        # Generate budget allocation if budget is provided
-        if campaign_budget and behavioral_segments:
+        # Optimize budget allocation from historical campaign response curves
+        optimization = None
+        if campaign_budget and performance_data:
+            optimization = optimize_campaign_budget(performance_data, float(campaign_budget), duration_days)
+        if optimization:
+            recommendations['budget_allocation'] = optimization['campaigns']
+            recommendations['budget_optimization'] = {
+                'method': optimization['method'],
+                **optimization['summary']
+            }
+
+        # Fall back to a fixed segment split without campaign history
+        elif campaign_budget and behavioral_segments:
+            campaign_budget = float(campaign_budget)
+            recommendations['budget_optimization'] = {'method': 'default_split'}
             recommendations['budget_allocation'] = {
                 'high_value_segment': {
                     'percentage': 60,
@@ -337,5 +384,5 @@ def generate_precision_targeting_recommendations(insights: Dict, campaign_budget
         return recommendations
 
     except Exception as e:
-        logger.error(f"Error generating precision targeting recommendations: {str(e)}")
+        logger.error("Error generating precision targeting recommendations: %s", e)
         raise Exception(f"Failed to generate targeting recommendations: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,235 @@
+import csv
+import io
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from utils.data_loading import iter_column_chunks
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['campaign_name', 'target_audience', 'budget', 'duration', 'objectives']
+OPTIONAL_COLUMNS = ['channels', 'current_metrics']
+IMPORT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+# Column length limits from the Campaign model
+MAX_LENGTHS = {'campaign_name': 200, 'channels': 500}
+
+DEFAULT_IMPORT_BATCH_SIZE = 10_000
+MAX_REPORTED_ERRORS = 100
+
+SEARCH_COLUMNS = ['kind', 'ref_id', 'campaign_id', 'title', 'body', 'created_at']
+
+
+def _to_float(values: list) -> np.ndarray:
+    """Parse a column as float64, NaN for anything that is not a number"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                column[i] = np.nan
+        return column
+
+
+def _to_text(values: list) -> np.ndarray:
+    """
+    Column as a numpy array of str objects with missing values as ''
+
+    Not a fixed-width unicode array: that sizes every cell to the longest
+    value, so one long target_audience (a Text column) would make the whole
+    chunk take rows x longest x 4 bytes.
+    """
+    column = np.empty(len(values), dtype=object)
+    column[:] = ['' if value is None else str(value) for value in values]
+    return column
+
+
+def _str_len(column: np.ndarray) -> np.ndarray:
+    return np.fromiter(map(len, column), dtype=np.int64, count=len(column))
+
+
+def validate_campaign_chunk(chunk: Dict[str, list], first_row: int = 1) -> Tuple[Dict[str, np.ndarray], List[Dict]]:
+    """
+    Validate a column-oriented chunk of campaign records with array operations
+
+    Args:
+        chunk (dict): Column name -> raw values, as yielded by iter_column_chunks
+        first_row (int): 1-based data row number of the first row, for errors
+
+    Returns:
+        tuple: (valid columns as arrays, [{'row', 'error'}] for rejected rows)
+    """
+    n_rows = len(next(iter(chunk.values()))) if chunk else 0
+    columns = {name: _to_text(chunk[name] if name in chunk else [''] * n_rows)
+               for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if name not in ('budget', 'duration')}
+    for name in ('campaign_name', 'target_audience', 'objectives'):
+        columns[name] = _to_text([value.strip() for value in columns[name]])
+    budget = _to_float(chunk.get('budget', [None] * n_rows))
+    duration = _to_float(chunk.get('duration', [None] * n_rows))
+
+    # Every rule yields a boolean "bad row" mask over the whole chunk
+    rules = [
+        (_str_len(columns['campaign_name']) == 0, 'campaign_name is required'),
+        (_str_len(columns['target_audience']) == 0, 'target_audience is required'),
+        (_str_len(columns['objectives']) == 0, 'objectives is required'),
+        (~np.isfinite(budget) | (budget <= 0), 'budget must be a positive number'),
+        (~np.isfinite(duration) | (duration <= 0) | (duration != np.floor(duration)),
+         'duration must be a positive whole number of days'),
+    ]
+    for name, limit in MAX_LENGTHS.items():
+        rules.append((_str_len(columns[name]) > limit, f'{name} is longer than {limit} characters'))
+
+    invalid = np.zeros(n_rows, dtype=bool)
+    errors = []
+    for mask, message in rules:
+        for index in np.flatnonzero(mask & ~invalid)[:MAX_REPORTED_ERRORS]:
+            errors.append({'row': first_row + int(index), 'error': message})
+        invalid |= mask
+    errors.sort(key=lambda error: error['row'])
+
+    keep = ~invalid
+    valid = {name: values[keep] for name, values in columns.items()}
+    valid['budget'] = budget[keep]
+    valid['duration'] = duration[keep].astype(np.int64)
+    return valid, errors
+
+
+def _campaign_rows(columns: Dict[str, np.ndarray], created_at: str) -> List[tuple]:
+    return list(zip(
+        columns['campaign_name'].tolist(), columns['target_audience'].tolist(),
+        columns['budget'].tolist(), columns['duration'].tolist(), columns['objectives'].tolist(),
+        columns['channels'].tolist(), columns['current_metrics'].tolist(),
+        [created_at] * len(columns['budget'])
+    ))
+
+
+def _search_rows(columns: Dict[str, np.ndarray], ids: List[int], created_at: str) -> List[tuple]:
+    bodies = (columns['target_audience'] + '\n' + columns['objectives']).tolist()
+    return [('campaign', campaign_id, campaign_id, name, body, created_at)
+            for campaign_id, name, body in zip(ids, columns['campaign_name'].tolist(), bodies)]
+
+
+def _copy(cursor, table: str, column_names: List[str], rows: List[tuple]):
+    """Stream rows into a table with Postgres COPY ... FROM STDIN (CSV)"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(column_names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _insert_postgres(connection, columns: Dict[str, np.ndarray], created_at: str) -> List[int]:
+    n_rows = len(columns['budget'])
+    # Reserve ids up front: COPY cannot return generated keys
+    ids = connection.execute(
+        text("SELECT nextval(pg_get_serial_sequence('campaign', 'id')) FROM generate_series(1, :n)"),
+        {'n': n_rows}
+    ).scalars().all()
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        _copy(cursor, 'campaign', ['id', 'campaign_name', 'target_audience', 'budget', 'duration',
+                                   'objectives', 'channels', 'current_metrics', 'created_at'],
+              [(campaign_id, *row) for campaign_id, row in zip(ids, _campaign_rows(columns, created_at))])
+        _copy(cursor, 'search_document', SEARCH_COLUMNS, _search_rows(columns, ids, created_at))
+    finally:
+        cursor.close()
+    return ids
+
+
+def _insert_executemany(connection, columns: Dict[str, np.ndarray], created_at: str) -> List[int]:
+    n_rows = len(columns['budget'])
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.executemany(
+            "INSERT INTO campaign (campaign_name, target_audience, budget, duration, objectives, "
+            "channels, current_metrics, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            _campaign_rows(columns, created_at)
+        )
+        # The transaction holds SQLite's write lock, so the new rowids are contiguous
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        ids = list(range(last_id - n_rows + 1, last_id + 1))
+        cursor.executemany(
+            f"INSERT INTO search_document ({', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            _search_rows(columns, ids, created_at)
+        )
+    finally:
+        cursor.close()
+    return ids
+
+
+def import_campaigns(engine, source, fmt: str, batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+                     on_batch: Optional[Callable] = None) -> Dict:
+    """
+    Bulk-load campaign records from a CSV or NDJSON source
+
+    The source is read and validated one batch at a time. Each batch of valid
+    rows is written in its own transaction with COPY on Postgres or a single
+    executemany on SQLite, together with the rows' search documents, so
+    memory stays bounded and a bad row never aborts the import.
+
+    Args:
+        engine: SQLAlchemy engine
+        source: File path or binary file object
+        fmt (str): 'csv' or 'ndjson' (or 'parquet' when pyarrow is installed)
+        batch_size (int): Rows validated and inserted per transaction
+        on_batch (callable): Called as on_batch(connection, columns, ids, created_at)
+            inside each batch's transaction, for derived tables
+
+    Returns:
+        dict: Imported and rejected counts, row errors, new campaign ids and timing
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be a positive number")
+    if engine.dialect.name not in ('postgresql', 'sqlite'):
+        raise ValueError(f"Bulk import is not supported on {engine.dialect.name}")
+
+    started = time.perf_counter()
+    imported = rejected = batches = 0
+    errors: List[Dict] = []
+    ids: List[int] = []
+    next_row = 1
+
+    for chunk in iter_column_chunks(source, fmt, chunk_size=batch_size, columns=IMPORT_COLUMNS, infer_types=False):
+        n_rows = len(next(iter(chunk.values()))) if chunk else 0
+        if batches == 0:
+            missing = [name for name in REQUIRED_COLUMNS if name not in chunk]
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+        columns, chunk_errors = validate_campaign_chunk(chunk, first_row=next_row)
+        next_row += n_rows
+        rejected += n_rows - len(columns['budget'])
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        batches += 1
+        if not len(columns['budget']):
+            continue
+
+        # Text form is accepted by COPY and by SQLAlchemy's SQLite DateTime
+        created_at = datetime.utcnow().isoformat(sep=' ')
+        with engine.begin() as connection:
+            if engine.dialect.name == 'postgresql':
+                ids.extend(_insert_postgres(connection, columns, created_at))
+            else:
+                ids.extend(_insert_executemany(connection, columns, created_at))
+            if on_batch:
+                on_batch(connection, columns, ids[-len(columns['budget']):], created_at)
+        imported += len(columns['budget'])
+
+    elapsed = time.perf_counter() - started
+    logger.info("Imported %d campaigns (%d rejected) in %.2f s", imported, rejected, elapsed)
+
+    return {
+        'imported': imported,
+        'rejected': rejected,
+        'errors': errors,
+        'campaign_ids': ids,
+        'batches': batches,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed) if elapsed > 0 else 0
+    }
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from utils.metrics import DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30
+
+# Bucket upper bounds (seconds) for the pool wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolWaitStats:
+    """Thread-safe totals of how long requests waited for a pooled connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def record(self, wait: float, timed_out: bool = False):
+        DB_POOL_WAIT.observe(wait)
+        if timed_out:
+            DB_POOL_TIMEOUTS.inc()
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if wait <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels = [f'le_{bound}s' for bound in WAIT_BUCKETS] + ['inf']
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'total_wait_seconds': round(self.total_wait, 6),
+                'mean_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'wait_histogram': dict(zip(labels, self.buckets))
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_wait_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def pool_engine_options(database_uri: Optional[str]) -> Dict:
+    """
+    Pool settings for SQLALCHEMY_ENGINE_OPTIONS from the environment
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW and DB_POOL_TIMEOUT (seconds) size the
+    connection pool. In-memory SQLite keeps its single-connection pool.
+    """
+    if not database_uri or database_uri.rstrip('/') == 'sqlite:' or ':memory:' in database_uri:
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)),
+    }
+
+
+def pool_status(engine) -> Dict:
+    """Current pool occupancy plus the cumulative wait statistics"""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'timeout_seconds': pool.timeout(),
+        })
+    status['wait'] = pool_wait_stats.snapshot()
+    return status
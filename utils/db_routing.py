@@ -0,0 +1,182 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Flask, g, has_request_context, request
+from werkzeug.http import dump_cookie
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, TextClause, event, text
+
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+DEFAULT_STICKY_SECONDS = 5
+DEFAULT_MAX_REPLICA_LAG = 10
+DEFAULT_LAG_CHECK_INTERVAL = 5
+
+# Seconds of replay lag; zero when the replica has replayed everything it received
+POSTGRES_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def replica_binds(replica_uris: Optional[str]) -> Dict[str, str]:
+    """SQLALCHEMY_BINDS entries for a comma-separated STORAGE_REPLICAS value"""
+    uris = [uri.strip() for uri in (replica_uris or '').split(',') if uri.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{i}': uri for i, uri in enumerate(uris)}
+
+
+def _is_read(clause) -> bool:
+    if isinstance(clause, Select):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip()[:6].upper() == 'SELECT'
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica chosen for the current request
+
+    Flushes, DML and anything that is not a plain SELECT always go to the
+    primary, as does all work outside a request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica and _is_read(clause):
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        with span('db.commit'):
+            super().commit()
+
+
+class ReplicaRouter:
+    """
+    Chooses a read replica per request
+
+    GET/HEAD requests read from a replica, round robin over those whose
+    replication lag is within max_lag seconds. After a write the client
+    gets a short-lived cookie that pins its reads to the primary, so it
+    always reads its own writes. When every replica is lagging or down,
+    reads fall back to the primary.
+    """
+
+    def __init__(self, db, max_lag: float = None, lag_check_interval: float = None,
+                 sticky_seconds: float = None):
+        self.db = db
+        self.max_lag = float(max_lag if max_lag is not None
+                             else os.environ.get('DB_REPLICA_MAX_LAG', DEFAULT_MAX_REPLICA_LAG))
+        self.lag_check_interval = float(lag_check_interval if lag_check_interval is not None
+                                        else os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', DEFAULT_LAG_CHECK_INTERVAL))
+        self.sticky_seconds = float(sticky_seconds if sticky_seconds is not None
+                                    else os.environ.get('DB_STICKY_SECONDS', DEFAULT_STICKY_SECONDS))
+        self.replicas = []
+        self._lag: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._round_robin = None
+
+    def init_app(self, app: Flask):
+        self.replicas = sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {})
+                               if key.startswith(REPLICA_BIND_PREFIX))
+        if not self.replicas:
+            return
+        self._round_robin = itertools.cycle(self.replicas)
+
+        with app.app_context():
+            primary = self.db.engine
+
+        # Any transaction committed on the primary, through the session or a
+        # raw connection, counts as a write
+        @event.listens_for(primary, 'commit')
+        def mark_write(connection):
+            if has_request_context():
+                g.db_wrote = True
+
+        @app.before_request
+        def route_reads():
+            g.db_replica = None
+            if request.method in READ_METHODS and not self._pinned_to_primary():
+                g.db_replica = self.choose_replica()
+
+        @app.after_request
+        def stick_after_write(response):
+            if g.get('db_wrote'):
+                response.headers.add('Set-Cookie', self.sticky_cookie())
+            response.headers['X-DB-Route'] = g.get('db_replica') or 'primary'
+            return response
+
+    def sticky_cookie(self) -> str:
+        """Set-Cookie value pinning the client's reads to the primary for sticky_seconds"""
+        return dump_cookie(STICKY_COOKIE, f'{time.time() + self.sticky_seconds:.3f}',
+                           max_age=int(self.sticky_seconds) + 1, httponly=True, samesite='Lax')
+
+    def _pinned_to_primary(self) -> bool:
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def replica_lag(self, key: str) -> float:
+        """Replication lag in seconds (inf when unreachable), cached for lag_check_interval"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._lag.get(key)
+            if cached and now - cached[1] < self.lag_check_interval:
+                return cached[0]
+            # Claim the refresh so concurrent requests keep using the old value
+            self._lag[key] = (cached[0] if cached else 0.0, now)
+
+        engine = self.db.engines[key]
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'postgresql':
+                    lag = float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+                else:
+                    connection.execute(text('SELECT 1'))
+                    lag = 0.0
+        except Exception as e:
+            logger.warning("Read replica %s is unreachable: %s", key, e)
+            lag = float('inf')
+
+        with self._lock:
+            self._lag[key] = (lag, time.monotonic())
+        return lag
+
+    def choose_replica(self) -> Optional[str]:
+        """Next replica within the lag budget, or None to read from the primary"""
+        for _ in range(len(self.replicas)):
+            key = next(self._round_robin)
+            if self.replica_lag(key) <= self.max_lag:
+                return key
+        return None
+
+    def read_engine(self):
+        """Engine for raw-connection reads (exports) in the current request"""
+        replica = g.get('db_replica') if has_request_context() else None
+        return self.db.engines[replica] if replica else self.db.engine
+
+    def status(self) -> Dict:
+        with self._lock:
+            lags = {key: self._lag.get(key, (None, None))[0] for key in self.replicas}
+        return {
+            'replicas': [{
+                'bind': key,
+                'lag_seconds': None if lag is None or lag == float('inf') else round(lag, 3),
+                'healthy': lag is not None and lag <= self.max_lag
+            } for key, lag in lags.items()],
+            'max_lag_seconds': self.max_lag,
+            'sticky_seconds': self.sticky_seconds
+        }
@@ -0,0 +1,125 @@
+import dataclasses
+import json
+import os
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Optional
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib json module is the fallback
+    orjson = None
+
+# JSON_BACKEND=json forces the stdlib encoder even when orjson is installed
+JSON_BACKEND = os.environ.get('JSON_BACKEND') or ('orjson' if orjson is not None else 'json')
+if JSON_BACKEND not in ('orjson', 'json'):
+    raise ValueError(f"Unknown JSON_BACKEND: {JSON_BACKEND} (expected orjson or json)")
+if JSON_BACKEND == 'orjson' and orjson is None:
+    raise ValueError("JSON_BACKEND is orjson but the orjson package is not installed")
+
+# orjson parse errors subclass this, so callers can keep catching it
+JSONDecodeError = json.JSONDecodeError
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def encode_default(value):
+    """
+    Encode the types both backends must agree on
+
+    Datetimes are ISO 8601, as everywhere else in the API (orjson does this
+    natively); Decimals become strings so no precision is lost, as with
+    Flask's default provider.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj, sort_keys: bool, default: Callable) -> bytes:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, sort_keys=sort_keys,
+                      default=default).encode('utf-8')
+
+
+def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+    """Compact UTF-8 JSON bytes; `default` replaces encode_default for unknown types"""
+    default = default or encode_default
+    if JSON_BACKEND == 'orjson':
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=_ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0))
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, mixed key types under sort_keys, ...
+            pass
+    return _stdlib_dumps(obj, sort_keys, default)
+
+
+def dumps_str(obj: Any) -> str:
+    """dumps() as text, for APIs that need a str (SQLAlchemy's json_serializer)"""
+    return dumps(obj).decode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def engine_options():
+    """json_serializer/json_deserializer for SQLALCHEMY_ENGINE_OPTIONS (JSON columns)"""
+    return {'json_serializer': dumps_str, 'json_deserializer': loads}
+
+
+def _register_psycopg2_json(dbapi_connection, connection_record):
+    # psycopg2 decodes json/jsonb columns itself, bypassing json_deserializer
+    if type(dbapi_connection).__module__.startswith('psycopg2'):
+        import psycopg2.extras
+        psycopg2.extras.register_default_json(dbapi_connection, loads=loads)
+        psycopg2.extras.register_default_jsonb(dbapi_connection, loads=loads)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider on orjson, falling back to the stdlib encoder
+
+    Keeps DefaultJSONProvider's sorted keys and compact output; non-ASCII
+    text is sent as UTF-8 rather than \\u escapes.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs.keys() - {'separators'}:
+            # indent (debug mode) or other json.dumps options
+            kwargs.setdefault('default', encode_default)
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, sort_keys=self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        # Encode straight to bytes instead of str -> bytes
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, sort_keys=self.sort_keys) + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Serve JSON through FastJSONProvider and decode Postgres JSON columns with it"""
+    app.json = FastJSONProvider(app)
+    if not event.contains(Engine, 'connect', _register_psycopg2_json):
+        event.listen(Engine, 'connect', _register_psycopg2_json)
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+from typing import Callable, Optional
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Smaller bodies are not worth the CPU or the extra headers
+DEFAULT_MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                      'application/javascript', 'text/javascript', 'image/svg+xml')
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value (unquoted) from anything that identifies a representation"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def _matching_tag(etag: str) -> Optional[str]:
+    """The If-None-Match tag matching etag, with or without an encoding suffix"""
+    for tag in request.if_none_match.as_set():
+        # Compressed variants are tagged "<etag>-gzip" / "<etag>-br"
+        if tag.split('-', 1)[0] == etag:
+            return tag
+    if request.if_none_match.star_tag:
+        return etag
+    return None
+
+
+def conditional(etag: str, build: Callable[[], Response]) -> Response:
+    """
+    304 Not Modified when the client already has `etag`, else build() tagged with it
+
+    The fingerprint is computed before the body, so a match skips the main
+    query and the JSON serialization entirely.
+    """
+    tag = _matching_tag(etag)
+    if tag is not None:
+        response = Response(status=304)
+        response.set_etag(tag)
+    else:
+        response = build()
+        if isinstance(response, tuple) or response.status_code != 200:
+            return response
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _negotiate() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_compression(app: Flask, min_size: int = DEFAULT_MIN_COMPRESS_SIZE):
+    """
+    Compress responses with brotli or gzip, as negotiated by Accept-Encoding
+
+    Streaming and file responses are left alone (exports compress
+    themselves). A strong ETag gets the encoding appended, since each encoding
+    is a different representation.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            # Caches must key the 304 the same way as the 200 it revalidates
+            response.vary.add('Accept-Encoding')
+            return response
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+                or response.status_code in (204, 206) or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        data = response.get_data()
+        encoding = _negotiate()
+        if encoding is None or len(data) < min_size:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
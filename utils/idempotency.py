@@ -0,0 +1,354 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional
+
+from flask import Flask, g, jsonify, make_response, request
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from utils.admission import ASYNC_DISPATCH
+from utils.metrics import record_cache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 24 * 3600
+# Long enough to outlast a GPT-4o generation already in flight
+DEFAULT_WAIT = 60.0
+# Seconds a claim holds the key; above GUNICORN_TIMEOUT (120), after which a
+# worker stuck in the request is killed and its claim can only be stale
+DEFAULT_LEASE = 180
+POLL_INTERVAL = 0.25
+# Seconds between sweeps of expired keys, per process
+PURGE_INTERVAL = 300
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    body: bytes
+    content_type: str
+
+
+class IdempotencyError(Exception):
+    """The key cannot be used for this request: 400 (invalid), 409 (still running) or 422 (other payload)"""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def request_fingerprint() -> str:
+    """Hash of the current request's method, path, query and payload (JSON body or form fields and files)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{request.method} {request.path}?{request.query_string.decode("latin-1")}\n'.encode())
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f'{name}={value}\n'.encode())
+        for name, upload in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f'{name}:{upload.filename}\n'.encode())
+            # Uploads can be large; hash them in chunks and rewind for the view
+            for chunk in iter(lambda: upload.stream.read(1 << 20), b''):
+                digest.update(chunk)
+            upload.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key handling for POST endpoints, backed by a database table
+
+    The first request with a key claims it by inserting a row, runs, and
+    stores its response for IDEMPOTENCY_TTL seconds (default a day). A retry
+    with the same key and payload gets the stored response back without
+    running again; while the first request is still running, the retry
+    waits for it (up to IDEMPOTENCY_WAIT seconds, then 409). Reusing a key
+    with a different payload is a 422. Server errors are not stored, so
+    they can be retried. Keys are scoped per endpoint.
+
+    A claim is a lease of IDEMPOTENCY_LEASE seconds, longer than a worker may
+    run a request: if its worker died without finishing, the next retry
+    takes the key over once the lease has expired. Keys are claimed in a
+    before_request hook that runs ahead of admission control, so replays
+    and waiting retries never take an admission slot.
+    """
+
+    def __init__(self, db, model, ttl: Optional[int] = None, wait: Optional[float] = None,
+                 lease: Optional[int] = None):
+        self.db = db
+        self.table = model.__table__
+        self.ttl = int(ttl if ttl is not None else os.environ.get('IDEMPOTENCY_TTL', DEFAULT_TTL))
+        self.wait = float(wait if wait is not None else os.environ.get('IDEMPOTENCY_WAIT', DEFAULT_WAIT))
+        self.lease = int(lease if lease is not None else os.environ.get('IDEMPOTENCY_LEASE', DEFAULT_LEASE))
+        # Requests this process is running, so local retries wake as soon as they finish
+        self._running: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _load(self, connection, scope: str, key: str):
+        return connection.execute(select(self.table).where(
+            self.table.c.scope == scope, self.table.c.key == key)).first()
+
+    def _insert(self, scope: str, key: str, fingerprint: str) -> Optional[object]:
+        """Claim the key; None when claimed, else the existing row"""
+        now = datetime.utcnow()
+        with self.db.engine.begin() as connection:
+            existing = self._load(connection, scope, key)
+            if existing is not None and existing.expires_at <= now:
+                connection.execute(delete(self.table).where(
+                    self.table.c.scope == scope, self.table.c.key == key))
+                existing = None
+            if existing is not None:
+                return existing
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(insert(self.table).values(
+                    scope=scope, key=key, fingerprint=fingerprint, status=IN_PROGRESS, created_at=now,
+                    locked_until=now + timedelta(seconds=self.lease),
+                    expires_at=now + timedelta(seconds=self.ttl)))
+            return None
+        except IntegrityError:
+            # Another request claimed it in between
+            with self.db.engine.connect() as connection:
+                return self._load(connection, scope, key)
+
+    def _take_over(self, scope: str, key: str, row) -> bool:
+        """Claim a key whose owner's lease ran out; False when another retry got it first"""
+        now = datetime.utcnow()
+        # Rows claimed before leases existed have none; their claim time stands in
+        locked_until = row.locked_until or (row.created_at or now) + timedelta(seconds=self.lease)
+        if locked_until > now:
+            return False
+        lease = self.table.c.locked_until
+        with self.db.engine.begin() as connection:
+            result = connection.execute(update(self.table).where(
+                self.table.c.scope == scope, self.table.c.key == key, self.table.c.status == IN_PROGRESS,
+                lease.is_(None) if row.locked_until is None else lease == row.locked_until).values(
+                locked_until=now + timedelta(seconds=self.lease)))
+        return result.rowcount == 1
+
+    def _try_claim(self, scope: str, key: str, fingerprint: str):
+        """
+        One claim attempt: None when this request now owns the key, the stored
+        response for a replay, or IN_PROGRESS while another request runs it
+        """
+        row = self._insert(scope, key, fingerprint)
+        if row is not None and row.fingerprint != fingerprint:
+            raise IdempotencyError(f'{IDEMPOTENCY_HEADER} was already used with a different request', 422)
+        if row is not None and row.status == COMPLETED:
+            record_cache(['openai'], 'idempotency', True)
+            return StoredResponse(row.response_status, row.response_body, row.content_type)
+        if row is not None and not self._take_over(scope, key, row):
+            return IN_PROGRESS
+        with self._lock:
+            self._running[(scope, key)] = threading.Event()
+        record_cache(['openai'], 'idempotency', False)
+        return None
+
+    def _still_running(self) -> IdempotencyError:
+        return IdempotencyError(f'A request with this {IDEMPOTENCY_HEADER} is still in progress', 409,
+                                retry_after=max(1, int(self.wait // 4)))
+
+    def _check_key(self, key: str):
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f'{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters', 400)
+
+    def claim(self, scope: str, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        None when this request owns the key and must run (then complete() or
+        release() it), the stored response for a replay, or IdempotencyError
+        """
+        self._check_key(key)
+        self._purge_expired()
+        deadline = time.monotonic() + self.wait
+        while True:
+            result = self._try_claim(scope, key, fingerprint)
+            if result is not IN_PROGRESS:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._still_running()
+            # Attach to the running request: woken directly when it runs in
+            # this process, otherwise poll the row
+            with self._lock:
+                running = self._running.get((scope, key))
+            if running is not None:
+                running.wait(remaining)
+            else:
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+    async def claim_async(self, scope: str, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """claim() for the event loop: the database work runs on worker threads and the wait is polled"""
+        self._check_key(key)
+        await asyncio.to_thread(self._purge_expired)
+        deadline = time.monotonic() + self.wait
+        while True:
+            result = await asyncio.to_thread(self._try_claim, scope, key, fingerprint)
+            if result is not IN_PROGRESS:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._still_running()
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+    def complete(self, scope: str, key: str, response: StoredResponse):
+        with self.db.engine.begin() as connection:
+            connection.execute(update(self.table).where(
+                self.table.c.scope == scope, self.table.c.key == key).values(
+                status=COMPLETED, response_status=response.status, response_body=response.body,
+                content_type=response.content_type))
+        self._finished(scope, key)
+
+    def release(self, scope: str, key: str):
+        """Give the key up after a failure, so a retry runs again"""
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(delete(self.table).where(
+                    self.table.c.scope == scope, self.table.c.key == key))
+        finally:
+            self._finished(scope, key)
+
+    def _finished(self, scope: str, key: str):
+        with self._lock:
+            running = self._running.pop((scope, key), None)
+        if running is not None:
+            running.set()
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self.db.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.expires_at <= datetime.utcnow()))
+
+    @staticmethod
+    def _early_response(claimed):
+        """The response to return instead of running the view: a replay or an error"""
+        if isinstance(claimed, IdempotencyError):
+            response = jsonify({'success': False, 'error': str(claimed)})
+            response.status_code = claimed.status
+            if claimed.retry_after:
+                response.headers['Retry-After'] = str(claimed.retry_after)
+            return response
+        response = make_response(claimed.body, claimed.status)
+        response.content_type = claimed.content_type
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+    def begin(self):
+        """
+        Claim the current request's key, replay its stored response or wait for
+        the request running it; None when the view must run (the claim is in g)
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return None
+        try:
+            stored = self.claim(request.endpoint, key, request_fingerprint())
+        except IdempotencyError as e:
+            return self._early_response(e)
+        if stored is not None:
+            return self._early_response(stored)
+        g.idempotency = (request.endpoint, key)
+        return None
+
+    async def begin_async(self):
+        """begin() for requests dispatched to an async view"""
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return None
+        try:
+            stored = await self.claim_async(request.endpoint, key, request_fingerprint())
+        except IdempotencyError as e:
+            return self._early_response(e)
+        if stored is not None:
+            return self._early_response(stored)
+        g.idempotency = (request.endpoint, key)
+        return None
+
+    async def abandon_async(self):
+        """Give up a claim whose view will not run (e.g. refused by admission control)"""
+        claimed = g.pop('idempotency', None)
+        if claimed is not None:
+            await asyncio.to_thread(self.release, *claimed)
+
+    def _finish(self, scope: str, key: str, response):
+        """Store the view's response for replays, or give the key up after a server error"""
+        if response.status_code >= 500 or response.is_streamed:
+            self.release(scope, key)
+        else:
+            self.complete(scope, key, StoredResponse(response.status_code, response.get_data(),
+                                                     response.content_type))
+
+    def idempotent(self, view: Callable) -> Callable:
+        """
+        Mark a Flask view as taking Idempotency-Key; the key is claimed before it
+        runs (see init_app) and its response stored afterwards. Async views
+        (the ASGI routes) store it from a worker thread
+        """
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                claimed = g.pop('idempotency', None)
+                if claimed is None:
+                    return await view(*args, **kwargs)
+                try:
+                    response = make_response(await view(*args, **kwargs))
+                except BaseException:
+                    await asyncio.to_thread(self.release, *claimed)
+                    raise
+                await asyncio.to_thread(self._finish, *claimed, response)
+                return response
+
+            async_wrapper.idempotent = True
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            claimed = g.pop('idempotency', None)
+            if claimed is None:
+                return view(*args, **kwargs)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                self.release(*claimed)
+                raise
+            self._finish(*claimed, response)
+            return response
+
+        wrapper.idempotent = True
+        return wrapper
+
+    def init_app(self, app: Flask):
+        """
+        Claim keys before the view's other before_request hooks run; call it
+        before admission.init_app(), so retries are resolved ahead of admission
+        """
+
+        @app.before_request
+        def claim_idempotency_key():
+            # asgi.py claims keys of its async views itself, without blocking the loop
+            if request.environ.get(ASYNC_DISPATCH):
+                return None
+            if getattr(app.view_functions.get(request.endpoint), 'idempotent', False):
+                return self.begin()
+            return None
+
+        @app.teardown_request
+        def release_idempotency_key(exc):
+            # Claimed, but the view never ran (a later hook answered instead)
+            claimed = g.pop('idempotency', None)
+            if claimed is not None:
+                self.release(*claimed)
@@ -0,0 +1,283 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from flask import Flask, g, has_request_context, request
+
+from utils import fast_json
+
+DEFAULT_LOG_LEVEL = 'INFO'
+# The ad platform SDKs and HTTP clients log every request and payload at
+# DEBUG/INFO; keep them quiet unless asked for
+DEFAULT_LOGGER_LEVELS = {
+    'google.ads.googleads': 'WARNING',
+    'google.auth': 'WARNING',
+    'googleapiclient': 'WARNING',
+    'facebook_business': 'WARNING',
+    'urllib3': 'WARNING',
+    'httpx': 'WARNING',
+    'httpcore': 'WARNING',
+    'openai': 'WARNING',
+    'grpc': 'WARNING',
+    'sqlalchemy.engine': 'WARNING',
+    'werkzeug': 'WARNING',
+}
+DEFAULT_QUEUE_SIZE = 10_000
+
+access_logger = logging.getLogger('app.access')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Accept a caller's id only if it is short and plain
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def parse_levels(spec: Optional[str]) -> Dict[str, str]:
+    """'googleads=INFO,utils.search=DEBUG' -> {'googleads': 'INFO', 'utils.search': 'DEBUG'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        level = level.strip().upper()
+        if not name.strip() or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Invalid logger level '{item.strip()}' (expected name=LEVEL)")
+        levels[name.strip()] = level
+    return levels
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """'werkzeug=0.01,utils.search=0.1' -> {'werkzeug': 0.01, 'utils.search': 0.1}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        try:
+            rates[name.strip()] = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid sample rate '{item.strip()}' (expected name=0.0-1.0)")
+        if not name.strip() or not 0 <= rates[name.strip()] <= 1:
+            raise ValueError(f"Invalid sample rate '{item.strip()}' (expected name=0.0-1.0)")
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the id of the request that logged it"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of high-volume records
+
+    Rates come per logger (and its children) from LOG_SAMPLING, or per call
+    with `extra={'sample_rate': 0.01}`. Warnings and errors are never
+    dropped. Kept records carry their sample_rate so counts can be scaled
+    back up downstream.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates or {}
+        self._cache: Dict[str, float] = {}
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None:
+            rate = self._rate_for(record.name)
+            if rate >= 1:
+                return True
+            record.sample_rate = rate
+        return random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return fast_json.dumps(entry, default=str).decode('utf-8')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message in the caller (its args may change later), but
+        # leave the JSON/text formatting to the writer thread
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing when the queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+
+class LoggingSetup:
+    """
+    Logging through a bounded queue, written to stderr by a background thread
+
+    Request threads only filter the record and append it to the queue; the
+    formatting and the blocking stderr write happen in the listener thread.
+    """
+
+    def __init__(self):
+        self.queue_handler: Optional[DroppingQueueHandler] = None
+        self.listener: Optional[_QueueListener] = None
+        self.levels: Dict[str, str] = {}
+        self.sample_rates: Dict[str, float] = {}
+        self.format = 'json'
+
+    def configure(self, level: Optional[str] = None, levels: Optional[str] = None,
+                  sampling: Optional[str] = None, fmt: Optional[str] = None,
+                  queue_size: Optional[int] = None):
+        """Install the queue handler on the root logger; arguments default to the LOG_* env vars"""
+        level = (level or os.environ.get('LOG_LEVEL') or DEFAULT_LOG_LEVEL).upper()
+        self.levels = {**DEFAULT_LOGGER_LEVELS, **parse_levels(levels or os.environ.get('LOG_LEVELS'))}
+        self.sample_rates = parse_sample_rates(sampling or os.environ.get('LOG_SAMPLING'))
+        self.format = (fmt or os.environ.get('LOG_FORMAT') or 'json').lower()
+        if self.format not in ('json', 'text'):
+            raise ValueError(f"Unknown LOG_FORMAT: {self.format} (expected json or text)")
+        queue_size = queue_size or int(os.environ.get('LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+
+        self.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(level)
+        for name, logger_level in self.levels.items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        stream = logging.StreamHandler(sys.stderr)
+        if self.format == 'json':
+            stream.setFormatter(JSONFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'))
+
+        self.queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.queue_handler.addFilter(SamplingFilter(self.sample_rates))
+        self.queue_handler.addFilter(RequestIdFilter())
+        root.addHandler(self.queue_handler)
+        self.listener = _QueueListener(self.queue_handler.queue, stream)
+        self.listener.start()
+
+    def stop(self):
+        """Flush the queue and stop the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    @property
+    def dropped(self) -> int:
+        """Records dropped by this process because the queue was full"""
+        return self.queue_handler.dropped if self.queue_handler is not None else 0
+
+    def restart(self):
+        """New queue and writer thread, e.g. in a forked worker (threads and held locks do not survive fork)"""
+        if self.listener is None:
+            return
+        self.queue_handler.queue = queue.Queue(self.queue_handler.queue.maxsize)
+        # The parent's drops are the parent's; do not count them again per worker
+        self.queue_handler.dropped = 0
+        self.listener = _QueueListener(self.queue_handler.queue, *self.listener.handlers)
+        self.listener.start()
+
+
+logging_setup = LoggingSetup()
+atexit.register(logging_setup.stop)
+
+
+def configure_logging(**kwargs):
+    logging_setup.configure(**kwargs)
+
+
+def init_request_logging(app: Flask):
+    """
+    Give every request an id (the caller's X-Request-ID when valid)
+
+    The id is echoed in the response and attached to every record logged
+    while handling the request. One `app.access` record per request carries
+    method, path, status and duration; sample it with LOG_SAMPLING.
+    """
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'request_id' not in g:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+            })
+        return response
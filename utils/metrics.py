@@ -0,0 +1,423 @@
+import atexit
+import fcntl
+import glob
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, g, request
+
+from utils import fast_json
+from utils.logging_config import logging_setup
+from utils.tracing import span
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans cached reads through multi-minute LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+_SNAPSHOT_PATTERN = 'metrics-*.json'
+_ARCHIVE_FILE = 'metrics-archive.json'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict) -> Tuple:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def zero(self):
+        return 0.0
+
+    def merge(self, total, value):
+        return total + value
+
+    def render(self, samples: Dict[Tuple, object]) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key in sorted(samples):
+            lines.append(f'{self.name}{self._labels(key)} {_format_value(samples[key])}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        self.registry._update(self, self._key(labels), lambda value: (value or 0.0) + amount)
+
+
+class FunctionCounter(Metric):
+    """Unlabelled counter kept by other code, read through `function` when collected"""
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, function: Callable[[], float]):
+        super().__init__(registry, name, documentation)
+        self.function = function
+
+
+class Gauge(Metric):
+    """Per-process gauge; across processes the live values are summed"""
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1.0, **labels):
+        self.registry._update(self, self._key(labels), lambda value: (value or 0.0) + amount)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        def update(counts):
+            # Per-bucket (not cumulative) counts, then +Inf, then the sum
+            counts = counts or self.zero()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+            return counts
+        self.registry._update(self, self._key(labels), update)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def zero(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def render(self, samples):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key in sorted(samples):
+            counts = samples[key]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{self._labels(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(key)} {_format_value(counts[-1])}')
+            lines.append(f'{self.name}_count{self._labels(key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, optionally shared across worker processes via files
+
+    With METRICS_DIR set (gunicorn.conf.py sets it), every process writes a
+    snapshot of its values to METRICS_DIR/metrics-<pid>.json every
+    METRICS_FLUSH_INTERVAL seconds and at exit. A scrape, served by any one
+    worker, sums the snapshots. Counters and histograms of workers that have
+    exited are folded into metrics-archive.json so totals never go
+    backwards when gunicorn recycles workers; their gauges are dropped.
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: Optional[float] = None):
+        self.directory = directory if directory is not None else os.environ.get('METRICS_DIR') or None
+        self.flush_interval = flush_interval or float(os.environ.get('METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+        self.metrics: Dict[str, Metric] = {}
+        self._values: Dict[str, Dict[Tuple, object]] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid: Optional[int] = None
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        self._values[metric.name] = {}
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def function_counter(self, name, documentation, function) -> FunctionCounter:
+        return self._register(FunctionCounter(self, name, documentation, function))
+
+    def _update(self, metric: Metric, key: Tuple, update):
+        with self._lock:
+            values = self._values[metric.name]
+            values[key] = update(values.get(key))
+        if self.directory and self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def reset(self):
+        """Forget this process's values, e.g. the master's copy inherited by a forked worker"""
+        # A new lock: another thread may have held the old one at fork time
+        self._lock = threading.Lock()
+        for values in self._values.values():
+            values.clear()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def snapshot(self) -> Dict[str, List]:
+        with self._lock:
+            # Copy histogram lists; they are updated in place
+            snapshot = {name: [[list(key), value[:] if isinstance(value, list) else value]
+                               for key, value in values.items()]
+                        for name, values in self._values.items() if values}
+        for name, metric in self.metrics.items():
+            if isinstance(metric, FunctionCounter):
+                value = metric.function()
+                if value:
+                    snapshot[name] = [[[], value]]
+        return snapshot
+
+    # Multi-process aggregation
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        """Write this process's snapshot (atomically) for other workers' scrapes"""
+        if not self.directory or self._flusher_pid != os.getpid():
+            return
+        path = self._snapshot_path(os.getpid())
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(fast_json.dumps(self.snapshot()))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _merge_into(self, totals: Dict[str, Dict[Tuple, object]], snapshot: Dict, include_gauges: bool = True):
+        for name, samples in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not include_gauges):
+                continue
+            values = totals.setdefault(name, {})
+            for key, value in samples:
+                key = tuple(key)
+                values[key] = metric.merge(values[key], value) if key in values else value
+
+    @staticmethod
+    def _read(path: str) -> Dict:
+        try:
+            with open(path, 'rb') as f:
+                return fast_json.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    def collect(self) -> Dict[str, Dict[Tuple, object]]:
+        """Values summed over this process and, with METRICS_DIR, every other worker"""
+        if not self.directory:
+            totals: Dict[str, Dict[Tuple, object]] = {}
+            self._merge_into(totals, self.snapshot())
+            return totals
+
+        self._start_flusher()
+        self.flush()
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, _ARCHIVE_FILE)
+            archived: Dict[str, Dict[Tuple, object]] = {}
+            self._merge_into(archived, self._read(archive_path), include_gauges=False)
+
+            live = []
+            retired = False
+            for path in glob.glob(os.path.join(self.directory, _SNAPSHOT_PATTERN)):
+                name = os.path.basename(path)
+                if name == _ARCHIVE_FILE:
+                    continue
+                pid = int(name[len('metrics-'):-len('.json')])
+                if self._alive(pid):
+                    live.append(path)
+                else:
+                    self._merge_into(archived, self._read(path), include_gauges=False)
+                    os.remove(path)
+                    retired = True
+            if retired:
+                tmp = f'{archive_path}.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(fast_json.dumps({name: [[list(key), value] for key, value in values.items()]
+                                             for name, values in archived.items()}))
+                os.replace(tmp, archive_path)
+
+        totals = archived
+        for path in live:
+            self._merge_into(totals, self._read(path))
+        return totals
+
+    def render(self) -> str:
+        totals = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            samples = totals.get(name)
+            if not samples and not metric.labelnames:
+                # Unlabelled series exist from the start, at zero
+                samples = {(): metric.zero()}
+            lines.extend(metric.render(samples or {}))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter('http_requests_total', 'HTTP requests by route and status',
+                                 ('method', 'route', 'status'))
+HTTP_LATENCY = registry.histogram('http_request_duration_seconds', 'HTTP request latency by route',
+                                  ('method', 'route'))
+HTTP_IN_FLIGHT = registry.gauge('http_requests_in_flight', 'HTTP requests being served')
+DB_POOL_WAIT = registry.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled database connection',
+                                  buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+DB_POOL_TIMEOUTS = registry.counter('db_pool_timeouts_total', 'Connection checkouts that hit the pool timeout')
+DEPENDENCY_LATENCY = registry.histogram('dependency_request_duration_seconds',
+                                        'Calls to external services (openai, google_ads, meta_ads)',
+                                        ('dependency', 'operation'))
+DEPENDENCY_ERRORS = registry.counter('dependency_errors_total', 'Failed calls to external services',
+                                     ('dependency', 'operation'))
+CACHE_REQUESTS = registry.counter('dependency_cache_requests_total',
+                                  'Cache lookups in front of external services; hit ratio = hit / (hit + miss)',
+                                  ('dependency', 'cache', 'result'))
+ADMISSION_REJECTIONS = registry.counter('admission_rejections_total',
+                                        'Requests refused by admission control (rate_limited, queue_full, shed, '
+                                        'timeout, saturated)', ('endpoint', 'reason'))
+ADMISSION_QUEUE_WAIT = registry.histogram('admission_queue_wait_seconds',
+                                          'Time queued requests waited for a slot', ('endpoint',),
+                                          buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+LOG_RECORDS_DROPPED = registry.function_counter('log_records_dropped_total',
+                                               'Log records dropped because the log queue was full',
+                                               lambda: logging_setup.dropped)
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str):
+    """Time a call to an external service, counting it as an error if it raises; traced as a span"""
+    started = time.perf_counter()
+    try:
+        with span(f'{dependency}.{operation}', dependency=dependency):
+            yield
+    except BaseException:
+        DEPENDENCY_ERRORS.inc(dependency=dependency, operation=operation)
+        raise
+    finally:
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - started, dependency=dependency, operation=operation)
+
+
+def record_cache(dependencies: Iterable[str], cache: str, hit: bool):
+    """Count one cache lookup for each dependency whose call it stood in for"""
+    for dependency in dependencies:
+        CACHE_REQUESTS.inc(dependency=dependency, cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    HTTP_REQUESTS.inc(method=method, route=route, status=status)
+    HTTP_LATENCY.observe(seconds, method=method, route=route)
+
+
+def init_metrics(app: Flask, endpoint: str = '/metrics'):
+    """Per-route latency, status counts and in-flight requests, plus the Prometheus endpoint"""
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.dec()
+        # The URL rule, not the path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = g.pop('metrics_status', 500)
+        observe_request(request.method, route, status, time.perf_counter() - started)
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.route(endpoint, methods=['GET'])
+    def metrics():
+        """Prometheus text exposition of every metric, summed across workers"""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+os.register_at_fork(after_in_child=registry.reset)
+atexit.register(registry.flush)
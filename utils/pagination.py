@@ -0,0 +1,86 @@
+import base64
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp: Optional[datetime], row_id: int) -> str:
+    """Opaque cursor for the (timestamp, id) position of the last row on a page"""
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_size(value: Optional[str]) -> int:
+    """Validate the `limit` query parameter"""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('Limit must be a whole number')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'Limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+
+def parse_timestamp(value: Optional[str], name: str) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD or ISO-8601 query parameter"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO date, e.g. 2025-07-01")
+
+
+def parse_fields(value: Optional[str], allowed: Sequence[str], default: Sequence[str]) -> List[str]:
+    """Validate a comma-separated `fields` projection against the allowed columns"""
+    if not value:
+        return list(default)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return fields
+
+
+def keyset_page(statement, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Apply newest-first keyset pagination to a select() statement
+
+    Rows are ordered by (timestamp, id) descending and the cursor continues
+    strictly after the last row of the previous page. With a composite index
+    on (timestamp, id) every page is an index range scan, so latency does not
+    depend on how deep the client has paged or how large the table is.
+
+    One extra row is fetched to know whether another page exists.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    return statement.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def serialize_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def project_rows(rows: Iterable, fields: Sequence[str]) -> List[Dict]:
+    """Turn column rows into dicts holding only the requested fields"""
+    return [{field: serialize_value(row._mapping[field]) for field in fields} for row in rows]
@@ -0,0 +1,242 @@
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from flask import Flask, abort, g, jsonify, request, send_from_directory
+
+from utils import fast_json
+
+PROFILE_HEADER = 'X-Profile'
+DEFAULT_PROFILE_DIR = 'profiles'
+DEFAULT_KEEP = 50
+# Seconds between stack samples
+DEFAULT_INTERVAL = 0.005
+# Frames kept per stack by tracemalloc
+TRACEMALLOC_FRAMES = 10
+TOP_ENTRIES = 25
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9._-]+')
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    # ';' separates frames in the collapsed format
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack at a fixed interval
+
+    The result is a Counter of collapsed stacks ('outer;...;inner' ->
+    samples), the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class RequestProfiler:
+    """
+    Opt-in CPU and memory profiles of single requests
+
+    A request is profiled when it sends `X-Profile: <PROFILE_TOKEN>`, or at
+    random with probability PROFILE_SAMPLE_RATE. Its thread's stack is
+    sampled every PROFILE_INTERVAL seconds and tracemalloc tracks its
+    allocations. Each profile is written to PROFILE_DIR as a collapsed-stack
+    file (flamegraph.pl / speedscope input) plus a JSON summary; only the
+    newest PROFILE_KEEP are kept. One request is profiled at a time per
+    process, since tracemalloc is process wide. With neither a token nor a
+    sample rate set, no hooks are installed at all.
+    """
+
+    def __init__(self, directory: Optional[str] = None, token: Optional[str] = None,
+                 sample_rate: Optional[float] = None, keep: Optional[int] = None,
+                 interval: Optional[float] = None):
+        self.directory = directory or os.environ.get('PROFILE_DIR') or DEFAULT_PROFILE_DIR
+        self.token = token or os.environ.get('PROFILE_TOKEN') or None
+        self.sample_rate = float(sample_rate if sample_rate is not None
+                                 else os.environ.get('PROFILE_SAMPLE_RATE', 0))
+        self.keep = int(keep or os.environ.get('PROFILE_KEEP', DEFAULT_KEEP))
+        self.interval = float(interval or os.environ.get('PROFILE_INTERVAL', DEFAULT_INTERVAL))
+        self._active = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def authorized(self) -> bool:
+        supplied = request.headers.get(PROFILE_HEADER)
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def _wanted(self) -> bool:
+        if request.endpoint in ('list_profiles', 'get_profile'):
+            # Reading profiles sends the admin header too; do not profile that
+            return False
+        return self.authorized() or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self):
+        if not self._wanted() or not self._active.acquire(blocking=False):
+            return
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started_at = datetime.now(timezone.utc)
+        g.profile = {
+            'name': _UNSAFE_NAME.sub('_', f'{started_at:%Y%m%dT%H%M%S%f}-{request.method}-{request.path}').strip('_'),
+            'sampler': sampler,
+            'started': time.perf_counter(),
+            'cpu_started': time.thread_time(),
+            'started_at': started_at,
+        }
+        sampler.start()
+
+    def finish(self, status: Optional[int]):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        try:
+            stacks = profile['sampler'].stop()
+            duration = time.perf_counter() - profile['started']
+            cpu = time.thread_time() - profile['cpu_started']
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            self._active.release()
+        self._write(profile['name'], profile['started_at'], stacks, snapshot, {
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'status': status,
+            'request_id': g.get('request_id'),
+            'duration_ms': round(duration * 1000, 2),
+            'cpu_ms': round(cpu * 1000, 2),
+            'memory_allocated_bytes': current,
+            'memory_peak_bytes': peak,
+        })
+
+    def _write(self, name: str, started_at: datetime, stacks: Counter, snapshot, summary: Dict):
+        self_samples = Counter()
+        for stack, count in stacks.items():
+            self_samples[stack.rpartition(';')[2]] += count
+        statistics = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]).statistics('lineno')
+
+        summary.update({
+            'name': name,
+            'started_at': started_at.isoformat(timespec='milliseconds'),
+            'samples': sum(stacks.values()),
+            'sample_interval_ms': self.interval * 1000,
+            'top_functions': [{'frame': frame, 'samples': count} for frame, count in self_samples.most_common(TOP_ENTRIES)],
+            'top_allocations': [{'line': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                                 'bytes': stat.size, 'blocks': stat.count}
+                                for stat in statistics[:TOP_ENTRIES]],
+        })
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f'{name}.collapsed'), 'w') as f:
+            for stack, count in stacks.items():
+                f.write(f'{stack} {count}\n')
+        with open(os.path.join(self.directory, f'{name}.json'), 'wb') as f:
+            f.write(fast_json.dumps(summary))
+        self._rotate()
+
+    def _rotate(self):
+        summaries = sorted(path for path in os.listdir(self.directory) if path.endswith('.json'))
+        for path in summaries[:-self.keep]:
+            stem = path[:-len('.json')]
+            for suffix in ('.json', '.collapsed'):
+                try:
+                    os.remove(os.path.join(self.directory, stem + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit: int = 20) -> List[Dict]:
+        """Summaries of the newest profiles, newest first, without the top-N tables"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for path in sorted((p for p in os.listdir(self.directory) if p.endswith('.json')), reverse=True)[:limit]:
+            try:
+                with open(os.path.join(self.directory, path), 'rb') as f:
+                    summary = fast_json.loads(f.read())
+            except (OSError, ValueError):
+                continue
+            summary.pop('top_functions', None)
+            summary.pop('top_allocations', None)
+            profiles.append(summary)
+        return profiles
+
+    def init_app(self, app: Flask):
+        """Install the profiling hooks and the GET /profiles endpoints (both need PROFILE_TOKEN)"""
+
+        @app.route('/profiles', methods=['GET'])
+        def list_profiles():
+            """Newest request profiles; requires the X-Profile admin header"""
+            if not self.authorized():
+                abort(404)
+            limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+            return jsonify({'success': True, 'directory': self.directory, 'profiles': self.list(limit)})
+
+        @app.route('/profiles/<name>', methods=['GET'])
+        def get_profile(name):
+            """One profile: the JSON summary, or the collapsed stacks with ?format=collapsed"""
+            if not self.authorized() or _UNSAFE_NAME.search(name):
+                abort(404)
+            suffix = '.collapsed' if request.args.get('format') == 'collapsed' else '.json'
+            return send_from_directory(os.path.abspath(self.directory), name + suffix,
+                                       mimetype='text/plain' if suffix == '.collapsed' else 'application/json')
+
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def start_profile():
+            self.start()
+
+        @app.after_request
+        def remember_profile_status(response):
+            if 'profile' in g:
+                g.profile['status'] = response.status_code
+                response.headers['X-Profile-Id'] = g.profile['name']
+            return response
+
+        @app.teardown_request
+        def finish_profile(exc):
+            if 'profile' in g:
+                self.finish(g.profile.get('status', 500))
+
+
+profiler = RequestProfiler()
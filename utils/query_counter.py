@@ -0,0 +1,53 @@
+from typing import Optional
+
+from flask import Flask, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """
+    Count SQL statements executed on an engine inside a `with` block
+
+        with QueryCounter(db.engine) as counter:
+            client.get('/campaigns/1')
+        assert counter.count == 1
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self) -> 'QueryCounter':
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+def _count_request_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def init_query_counter(app: Flask, header: Optional[str] = 'X-Query-Count'):
+    """
+    Track the number of SQL statements per request
+
+    The count is kept in `g.query_count` and, when `header` is set, returned
+    as a response header so N+1 regressions are visible from any client.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _count_request_query):
+        event.listen(Engine, 'before_cursor_execute', _count_request_query)
+
+    if header:
+        @app.after_request
+        def add_query_count_header(response):
+            response.headers[header] = str(g.get('query_count', 0))
+            return response
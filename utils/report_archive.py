@@ -0,0 +1,214 @@
+import logging
+import os
+import re
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+# payload_codec of a report whose payload lives in an archive segment
+CODEC_ARCHIVE = 'archive'
+
+DEFAULT_ARCHIVE_DIR = os.path.join('archive', 'reports')
+DEFAULT_ARCHIVE_AFTER_DAYS = 7
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+SEGMENT_PATTERN = re.compile(r'^reports-(\d{6})\.ndjson\.gz$')
+# gzip container, so a whole segment also reads as one .ndjson.gz stream
+GZIP_WBITS = 31
+GZIP_LEVEL = 9
+
+
+def _segment_name(number: int) -> str:
+    return f'reports-{number:06d}.ndjson.gz'
+
+
+def _gzip_member(raw: bytes) -> bytes:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(raw) + compressor.flush()
+
+
+class ReportArchive:
+    """
+    Append-only, compressed NDJSON segment files for cold report payloads
+
+    Every report is one JSON line stored as its own gzip member, so any
+    record can be read back with a single positioned read of (offset,
+    length), while a whole segment still decompresses with `zcat` as plain
+    NDJSON. The database is the index: each archived report row keeps its
+    (segment, offset, length), so reads need no state of their own and any
+    instance that can see the directory can serve them. Segments roll over
+    at `segment_bytes`.
+
+    Reads are safe from any thread or process. Appends are meant for a
+    single archiving process at a time (the `archive-reports` command).
+    """
+
+    def __init__(self, directory: str = None, segment_bytes: int = None):
+        self.directory = directory or os.environ.get('REPORT_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+        self.segment_bytes = int(segment_bytes or os.environ.get('REPORT_ARCHIVE_SEGMENT_BYTES',
+                                                                 DEFAULT_SEGMENT_BYTES))
+        self._files: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if SEGMENT_PATTERN.match(name))
+
+    def _fd(self, segment: str) -> int:
+        fd = self._files.get(segment)
+        if fd is None:
+            with self._lock:
+                fd = self._files.get(segment)
+                if fd is None:
+                    fd = os.open(self._path(segment), os.O_RDONLY)
+                    self._files[segment] = fd
+        return fd
+
+    def read_record(self, segment: str, offset: int, length: int) -> Dict:
+        """Decode the archived record at a known location"""
+        if not SEGMENT_PATTERN.match(segment or ''):
+            raise ValueError(f"Invalid archive segment name: {segment!r}")
+        try:
+            member = os.pread(self._fd(segment), length, offset)
+        except FileNotFoundError:
+            raise ValueError(f"Archive segment {segment} is missing from {self.directory}")
+        if len(member) != length:
+            raise ValueError(f"Archive segment {segment} is truncated at offset {offset}")
+        return fast_json.loads(zlib.decompress(member, GZIP_WBITS))
+
+    def read(self, segment: str, offset: int, length: int) -> Dict:
+        """Payload of the archived report at (segment, offset, length), as stored on its row"""
+        return self.read_record(segment, offset, length)['report_data']
+
+    def _open_segment(self):
+        segments = self.segments()
+        if segments:
+            current = segments[-1]
+            if os.path.getsize(self._path(current)) < self.segment_bytes:
+                return current
+            number = int(SEGMENT_PATTERN.match(current).group(1)) + 1
+        else:
+            number = 1
+        return _segment_name(number)
+
+    def append(self, records) -> Dict[int, Tuple[str, int, int]]:
+        """
+        Append report records and fsync them before returning their locations
+
+        Args:
+            records: Iterable of dicts with 'id', 'campaign_id', 'generated_at'
+                and 'report_data'
+
+        Returns:
+            dict: report id -> (segment, offset, length)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        segment = self._open_segment()
+        locations = {}
+        data = open(self._path(segment), 'ab')
+        try:
+            offset = data.tell()
+            for record in records:
+                if offset >= self.segment_bytes:
+                    self._sync_close(data)
+                    segment = _segment_name(int(SEGMENT_PATTERN.match(segment).group(1)) + 1)
+                    data = open(self._path(segment), 'ab')
+                    offset = data.tell()
+                member = _gzip_member(fast_json.dumps(record, default=str) + b'\n')
+                data.write(member)
+                locations[record['id']] = (segment, offset, len(member))
+                offset += len(member)
+        finally:
+            self._sync_close(data)
+        return locations
+
+    @staticmethod
+    def _sync_close(data):
+        # Durable before the rows point at it
+        data.flush()
+        os.fsync(data.fileno())
+        data.close()
+
+    def stats(self) -> Dict:
+        segments = self.segments()
+        return {
+            'directory': self.directory,
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(self._path(name)) for name in segments)
+        }
+
+
+report_archive = ReportArchive()
+
+
+def archive_reports(session, report_model, archive: ReportArchive = None,
+                    older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS, batch_size: int = 500) -> Dict:
+    """
+    Move reports older than the cutoff out of the database into archive segments
+
+    Each batch is appended and fsynced to the archive before its rows are
+    rewritten, in one short transaction, as pointer rows: the payload
+    columns are cleared and archive_segment/offset/length record where the
+    payload went. Hot and compacted reports are both archived.
+
+    Args:
+        session: SQLAlchemy session
+        report_model: The Report model
+        archive (ReportArchive): Target archive (defaults to report_archive)
+        older_than_days (int): Age after which a report is archived
+        batch_size (int): Reports moved per transaction
+
+    Returns:
+        dict: Number of reports archived, payload bytes written and archive stats
+    """
+    # Imported here: report_storage resolves archived payloads through this module
+    from utils.report_storage import resolve_payload
+
+    archive = archive or report_archive
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = bytes_written = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(report_model.id, report_model.campaign_id, report_model.generated_at,
+                   report_model.report_data, report_model.payload_blob, report_model.payload_codec)
+            .where(report_model.generated_at < cutoff,
+                   report_model.archive_segment.is_(None),
+                   report_model.id > last_id)
+            .order_by(report_model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        locations = archive.append({
+            'id': row.id,
+            'campaign_id': row.campaign_id,
+            'generated_at': row.generated_at.isoformat() if row.generated_at else None,
+            'report_data': resolve_payload(row.report_data, row.payload_blob, row.payload_codec)
+        } for row in rows)
+        for report_id, (segment, offset, length) in locations.items():
+            session.execute(
+                update(report_model)
+                .where(report_model.id == report_id)
+                .values(report_data=None, payload_blob=None, payload_codec=CODEC_ARCHIVE,
+                        archive_segment=segment, archive_offset=offset, archive_length=length)
+            )
+            bytes_written += length
+        session.commit()
+        archived += len(rows)
+        last_id = rows[-1].id
+
+    logger.info("Archived %d reports (%d compressed bytes) to %s", archived, bytes_written, archive.directory)
+    return {'archived': archived, 'bytes_written': bytes_written, **archive.stats()}
@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+from utils.tracing import propagate, span
+
+logger = logging.getLogger(__name__)
+
+# LLM calls are slow and rate limited, so a few workers go a long way
+DEFAULT_REPORT_WORKERS = 2
+# Jobs waiting for a worker, per process; each one is a GPT-4o call, so a
+# thousand is already several hours of work at the default concurrency
+DEFAULT_REPORT_QUEUE_SIZE = 1000
+
+
+class ReportJobQueue:
+    """
+    In-process background queue for report generation
+
+    Jobs run on a small thread pool so bulk imports can request reports
+    without waiting for the LLM. At most REPORT_JOB_QUEUE_SIZE jobs wait at
+    once (0 for no limit); enqueue() takes only as many as fit. Jobs live in
+    memory only: shutdown() lets them finish for a while, and whatever is
+    left when the process exits is lost and logged. Counters are kept for
+    the status endpoint.
+    """
+
+    def __init__(self, workers: int = None, max_queued: Optional[int] = None):
+        self.workers = workers or int(os.environ.get('REPORT_JOB_WORKERS', DEFAULT_REPORT_WORKERS))
+        self.max_queued = int(max_queued if max_queued is not None
+                              else os.environ.get('REPORT_JOB_QUEUE_SIZE', DEFAULT_REPORT_QUEUE_SIZE))
+        self.reset()
+
+    def _run(self, job: Callable, campaign_id: int):
+        with self._lock:
+            self.counts['queued'] -= 1
+            self.counts['running'] += 1
+        try:
+            with span('report_job', campaign_id=campaign_id):
+                job(campaign_id)
+            outcome = 'succeeded'
+        except Exception as e:
+            logger.error("Report generation failed for campaign %s: %s", campaign_id, e)
+            outcome = 'failed'
+        with self._lock:
+            self.counts['running'] -= 1
+            self.counts[outcome] += 1
+
+    def available(self) -> Optional[int]:
+        """Jobs that can be queued right now (None when unbounded)"""
+        with self._lock:
+            if self._closed:
+                return 0
+            return max(0, self.max_queued - self.counts['queued']) if self.max_queued else None
+
+    def enqueue(self, job: Callable[[int], None], campaign_ids: Iterable[int]) -> int:
+        """Queue job(campaign_id) for every id that fits in the queue; returns the number queued"""
+        with self._lock:
+            if self._closed:
+                return 0
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+            queued = 0
+            for campaign_id in campaign_ids:
+                if self.max_queued and self.counts['queued'] + queued >= self.max_queued:
+                    break
+                # Jobs continue the enqueuing request's trace, if it has one
+                future = self._executor.submit(propagate(self._run), job, campaign_id)
+                self._futures[future] = campaign_id
+                future.add_done_callback(self._forget)
+                queued += 1
+            self.counts['queued'] += queued
+        return queued
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.pop(future, None)
+
+    def wait(self):
+        """Block until every queued job has finished"""
+        with self._lock:
+            pending = list(self._futures)
+        wait(pending)
+
+    def shutdown(self, timeout: float) -> List[int]:
+        """
+        Stop taking jobs and give queued and running ones up to timeout
+        seconds to finish; returns the campaign ids whose reports were not
+        generated (queued jobs are cancelled, running ones die with the process)
+        """
+        with self._lock:
+            self._closed = True
+            pending = dict(self._futures)
+        _, unfinished = wait(pending, timeout=timeout)
+        lost = sorted(pending[future] for future in unfinished)
+        for future in unfinished:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if lost:
+            logger.warning("Report jobs lost at shutdown for %s campaigns: %s", len(lost), lost)
+        return lost
+
+    def reset(self):
+        """Forget the executor and pending jobs, e.g. in a freshly forked worker"""
+        self._executor = None
+        self._futures: Dict = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counts = {'queued': 0, 'running': 0, 'succeeded': 0, 'failed': 0}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'workers': self.workers, 'queue_size': self.max_queued or None, **self.counts}
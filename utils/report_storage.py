@@ -0,0 +1,171 @@
+import json
+import logging
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from utils import fast_json
+from utils.report_archive import CODEC_ARCHIVE, report_archive
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib keeps compaction working without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+# Reports older than this are compacted by default
+DEFAULT_COLD_AFTER_DAYS = 90
+
+
+def compress_payload(report_data: Dict) -> Tuple[bytes, str]:
+    """Serialize and compress a report payload, preferring zstd over zlib"""
+    raw = fast_json.dumps(report_data)
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw), CODEC_ZSTD
+    return zlib.compress(raw, ZLIB_LEVEL), CODEC_ZLIB
+
+
+def decompress_payload(blob: bytes, codec: str) -> Dict:
+    """Inverse of compress_payload"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Report payload is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(blob)
+    else:
+        raise ValueError(f"Unknown report payload codec: {codec}")
+    return fast_json.loads(raw)
+
+
+def resolve_payload(report_data: Optional[Dict], blob: Optional[bytes], codec: Optional[str],
+                    archive_location: Optional[Tuple[str, int, int]] = None) -> Optional[Dict]:
+    """
+    Report payload from the hot (JSON) or cold (blob) column, or the archive
+    segments at the row's (archive_segment, archive_offset, archive_length)
+    """
+    if report_data is not None:
+        return report_data
+    if codec == CODEC_ARCHIVE:
+        if not archive_location or None in archive_location:
+            raise ValueError("Archived report has no archive location")
+        return report_archive.read(*archive_location)
+    if blob is not None:
+        return decompress_payload(blob, codec)
+    return None
+
+
+def parse_amount(value) -> Optional[float]:
+    """First number in an LLM answer such as '$1,650 per day', or None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', value)
+    return float(match.group().replace(',', '')) if match else None
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def build_report_summary(report_data: Dict, budget: Optional[float] = None,
+                         duration: Optional[int] = None) -> Dict:
+    """
+    Denormalized list-view fields of a generated report
+
+    Args:
+        report_data (dict): Report JSON returned by the LLM
+        budget (float): Campaign budget
+        duration (int): Campaign duration in days
+
+    Returns:
+        dict: Column values for ReportSummary
+    """
+    report_data = report_data if isinstance(report_data, dict) else {}
+    budget_analysis = report_data.get('budget_analysis') or {}
+    kpi_framework = report_data.get('kpi_framework') or {}
+    if not isinstance(budget_analysis, dict):
+        budget_analysis = {}
+    if not isinstance(kpi_framework, dict):
+        kpi_framework = {}
+
+    daily_budget = parse_amount(budget_analysis.get('daily_budget'))
+    if daily_budget is None and budget and duration:
+        daily_budget = round(budget / duration, 2)
+
+    return {
+        'executive_summary': _text(report_data.get('executive_summary')),
+        'total_budget': budget,
+        'daily_budget': daily_budget,
+        'roi_projection': _text(budget_analysis.get('roi_projection')),
+        'primary_metrics': _text(kpi_framework.get('primary_metrics')),
+        'success_benchmarks': _text(kpi_framework.get('success_benchmarks'))
+    }
+
+
+def compact_reports(session, report_model, older_than_days: int = DEFAULT_COLD_AFTER_DAYS,
+                    batch_size: int = 500) -> Dict:
+    """
+    Move cold report payloads from the JSON column into compressed blobs
+
+    Reports generated before the cutoff are rewritten in batches, each in its
+    own short transaction, so compaction can run against a live database.
+
+    Args:
+        session: SQLAlchemy session
+        report_model: The Report model
+        older_than_days (int): Age after which a report counts as cold
+        batch_size (int): Reports rewritten per transaction
+
+    Returns:
+        dict: Number of reports compacted and payload bytes before/after
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    compacted = bytes_before = bytes_after = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(report_model.id, report_model.report_data)
+            .where(report_model.generated_at < cutoff,
+                   report_model.report_data.isnot(None),
+                   report_model.id > last_id)
+            .order_by(report_model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        for report_id, report_data in rows:
+            blob, codec = compress_payload(report_data)
+            bytes_before += len(fast_json.dumps(report_data))
+            bytes_after += len(blob)
+            session.execute(
+                update(report_model)
+                .where(report_model.id == report_id)
+                .values(report_data=None, payload_blob=blob, payload_codec=codec)
+            )
+        session.commit()
+        compacted += len(rows)
+        last_id = rows[-1][0]
+
+    logger.info("Compacted %d reports: %d -> %d payload bytes", compacted, bytes_before, bytes_after)
+    return {
+        'compacted': compacted,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'codec': CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    }
@@ -0,0 +1,237 @@
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+logger = logging.getLogger(__name__)
+
+UNSPECIFIED_CHANNEL = 'unspecified'
+MAX_CHANNEL_LENGTH = 100
+DEFAULT_ANALYTICS_DAYS = 30
+DEFAULT_TOP_CAMPAIGNS = 10
+REBUILD_BATCH_SIZE = 5000
+
+ROLLUP_TABLES = ['analytics_daily', 'analytics_channel', 'analytics_campaign_reports', 'analytics_table_version']
+
+
+def split_channels(channels: Optional[str]) -> List[str]:
+    """Normalized channel names of a campaign's comma-separated channels field"""
+    names = []
+    for name in (channels or '').split(','):
+        name = re.sub(r'\s+', ' ', name).strip().lower()[:MAX_CHANNEL_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names or [UNSPECIFIED_CHANNEL]
+
+
+def _day(value) -> date:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value or datetime.utcnow().date()
+
+
+class RollupDelta:
+    """
+    Increments for the rollup tables, accumulated in memory and applied at once
+
+    A campaign's budget is split evenly across its channels, so channel
+    totals add up to the overall budget.
+    """
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: {'campaigns': 0, 'total_budget': 0.0, 'reports': 0})
+        self.channels = defaultdict(lambda: {'campaigns': 0, 'total_budget': 0.0})
+        self.campaign_reports = {}
+        # Table name -> rows added
+        self.rows = defaultdict(int)
+
+    def add_campaign(self, budget: float, channels: Optional[str], created_at):
+        self.rows['campaign'] += 1
+        day = self.daily[_day(created_at)]
+        day['campaigns'] += 1
+        day['total_budget'] += budget or 0.0
+        names = split_channels(channels)
+        for name in names:
+            self.channels[name]['campaigns'] += 1
+            self.channels[name]['total_budget'] += (budget or 0.0) / len(names)
+
+    def add_report(self, campaign_id: int, generated_at):
+        generated_at = generated_at or datetime.utcnow()
+        self.rows['report'] += 1
+        self.daily[_day(generated_at)]['reports'] += 1
+        reports, last = self.campaign_reports.get(campaign_id, (0, generated_at))
+        self.campaign_reports[campaign_id] = (reports + 1, max(last, generated_at))
+
+    def __bool__(self):
+        return bool(self.daily or self.channels or self.campaign_reports or self.rows)
+
+
+def _upsert(connection, table, keys: List[str], rows: List[Dict], additive: List[str], latest: List[str] = (),
+            replaced: List[str] = ()):
+    """INSERT ... ON CONFLICT DO UPDATE that adds to the existing counters"""
+    if not rows:
+        return
+    insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(table)
+    updates = {name: table.c[name] + statement.excluded[name] for name in additive}
+    for name in replaced:
+        updates[name] = statement.excluded[name]
+    for name in latest:
+        updates[name] = func.coalesce(
+            func.max(table.c[name], statement.excluded[name]) if connection.dialect.name == 'sqlite'
+            else func.greatest(table.c[name], statement.excluded[name]),
+            statement.excluded[name]
+        )
+    connection.execute(statement.on_conflict_do_update(index_elements=keys, set_=updates), rows)
+
+
+def apply_rollups(connection, delta: RollupDelta, daily_table, channel_table, campaign_reports_table,
+                  versions_table):
+    """
+    Add a delta to the rollup tables inside the caller's transaction
+
+    Args:
+        connection: Connection of the transaction that wrote the rows
+        delta (RollupDelta): Increments to apply
+        daily_table, channel_table, campaign_reports_table, versions_table: The rollup tables
+    """
+    if not delta:
+        return
+    _upsert(connection, daily_table, ['day'],
+            [{'day': day, **values} for day, values in sorted(delta.daily.items())],
+            ['campaigns', 'total_budget', 'reports'])
+    _upsert(connection, channel_table, ['channel'],
+            [{'channel': name, **values} for name, values in sorted(delta.channels.items())],
+            ['campaigns', 'total_budget'])
+    _upsert(connection, campaign_reports_table, ['campaign_id'],
+            [{'campaign_id': campaign_id, 'reports': reports, 'last_report_at': last}
+             for campaign_id, (reports, last) in sorted(delta.campaign_reports.items())],
+            ['reports'], latest=['last_report_at'])
+    _upsert(connection, versions_table, ['table_name'],
+            [{'table_name': name, 'row_count': added, 'version': 1} for name, added in sorted(delta.rows.items())],
+            ['row_count', 'version'])
+
+
+def record_deletes(connection, versions_table, table_name: str, count: int = 1):
+    """Count rows deleted from campaign or report into their table version, in the caller's transaction"""
+    _upsert(connection, versions_table, ['table_name'],
+            [{'table_name': table_name, 'row_count': -count, 'version': 1}], ['row_count', 'version'])
+
+
+def table_version(session, versions_table, table_name: str) -> Optional[tuple]:
+    """(rows, version) of campaign or report: one primary key lookup, whatever the table size"""
+    row = session.execute(select(versions_table.c.row_count, versions_table.c.version)
+                          .where(versions_table.c.table_name == table_name)).first()
+    return tuple(row) if row is not None else None
+
+
+def rebuild_rollups(session, campaign_model, report_model, daily_table, channel_table,
+                    campaign_reports_table, versions_table, batch_size: int = REBUILD_BATCH_SIZE) -> Dict:
+    """
+    Recompute every rollup table from campaign and report in one transaction
+
+    On Postgres the rollup tables are locked first, so concurrent writers wait
+    for the rebuild to commit and then apply their increments on top of it.
+    Row counts are replaced; table versions only ever go up, so an ETag
+    issued before the rebuild can never match a list after it.
+
+    Returns:
+        dict: Rows written per rollup table
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f"LOCK TABLE {', '.join(ROLLUP_TABLES)} IN EXCLUSIVE MODE"))
+    for table in (daily_table, channel_table, campaign_reports_table):
+        connection.execute(delete(table))
+
+    delta = RollupDelta()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(campaign_model.id, campaign_model.budget, campaign_model.channels, campaign_model.created_at)
+            .where(campaign_model.id > last_id).order_by(campaign_model.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            delta.add_campaign(row.budget, row.channels, row.created_at)
+        last_id = rows[-1].id
+
+    # Reports are aggregated by the database; only per-day counts come back
+    day = func.date(report_model.generated_at)
+    for report_day, count in connection.execute(
+        select(day, func.count()).group_by(day)
+    ).all():
+        delta.daily[_day(report_day)]['reports'] += count
+        delta.rows['report'] += count
+    row_counts, delta.rows = delta.rows, defaultdict(int)
+    apply_rollups(connection, delta, daily_table, channel_table, campaign_reports_table, versions_table)
+    _upsert(connection, versions_table, ['table_name'],
+            [{'table_name': name, 'row_count': row_counts.get(name, 0), 'version': 1}
+             for name in ('campaign', 'report')],
+            ['version'], replaced=['row_count'])
+    connection.execute(campaign_reports_table.insert().from_select(
+        ['campaign_id', 'reports', 'last_report_at'],
+        select(report_model.campaign_id, func.count(), func.max(report_model.generated_at))
+        .group_by(report_model.campaign_id)
+    ))
+    session.commit()
+
+    counts = {'days': len(delta.daily), 'channels': len(delta.channels)}
+    counts['campaigns_with_reports'] = session.execute(
+        select(func.count()).select_from(campaign_reports_table)
+    ).scalar()
+    logger.info("Rebuilt analytics rollups: %s", counts)
+    return counts
+
+
+def analytics_summary(session, daily_table, channel_table, campaign_reports_table,
+                      days: int = DEFAULT_ANALYTICS_DAYS, top: int = DEFAULT_TOP_CAMPAIGNS) -> Dict:
+    """
+    Dashboard numbers read from the rollup tables only
+
+    The queries touch one row per day (totals), the channel rows and `top`
+    campaign rows (via an index on the report count), whatever the size of
+    campaign and report.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    totals = session.execute(select(
+        func.coalesce(func.sum(daily_table.c.campaigns), 0),
+        func.coalesce(func.sum(daily_table.c.total_budget), 0.0),
+        func.coalesce(func.sum(daily_table.c.reports), 0)
+    )).one()
+    daily = session.execute(
+        select(daily_table).where(daily_table.c.day >= since).order_by(daily_table.c.day)
+    ).mappings().all()
+    channels = session.execute(
+        select(channel_table).order_by(channel_table.c.total_budget.desc(), channel_table.c.channel)
+    ).mappings().all()
+    top_campaigns = session.execute(
+        select(campaign_reports_table)
+        .order_by(campaign_reports_table.c.reports.desc(), campaign_reports_table.c.campaign_id.desc())
+        .limit(top)
+    ).mappings().all()
+
+    return {
+        'totals': {'campaigns': int(totals[0]), 'total_budget': round(float(totals[1]), 2),
+                   'reports': int(totals[2])},
+        'campaigns_per_day': [{
+            'day': row['day'].isoformat(), 'campaigns': row['campaigns'],
+            'total_budget': round(row['total_budget'], 2), 'reports': row['reports']
+        } for row in daily],
+        'budget_by_channel': [{
+            'channel': row['channel'], 'campaigns': row['campaigns'],
+            'total_budget': round(row['total_budget'], 2)
+        } for row in channels],
+        'reports_per_campaign': [{
+            'campaign_id': row['campaign_id'], 'reports': row['reports'],
+            'last_report_at': row['last_report_at'].isoformat() if row['last_report_at'] else None
+        } for row in top_campaigns]
+    }
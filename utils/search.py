@@ -0,0 +1,268 @@
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import DDL, event, text
+
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = ['campaign', 'report']
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+SEARCH_LANGUAGE = 'english'
+
+# Postgres: a weighted tsvector kept up to date by the database itself, with
+# titles (campaign names) ranked above body text, and a GIN index on it
+POSTGRES_DDL = [
+    f"""ALTER TABLE search_document ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(body, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_search_vector ON search_document USING GIN (search_vector)",
+]
+
+# SQLite: an external-content FTS5 index over search_document, synced by
+# triggers. kind is indexed too so the kind filter is part of the MATCH.
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5(
+        title, body, kind, content='search_document', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN
+        INSERT INTO search_document_fts(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN
+        INSERT INTO search_document_fts(search_document_fts, rowid, title, body, kind)
+        VALUES ('delete', old.id, old.title, old.body, old.kind);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN
+        INSERT INTO search_document_fts(search_document_fts, rowid, title, body, kind)
+        VALUES ('delete', old.id, old.title, old.body, old.kind);
+        INSERT INTO search_document_fts(rowid, title, body, kind) VALUES (new.id, new.title, new.body, new.kind);
+    END""",
+]
+
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS search_document_au",
+    "DROP TRIGGER IF EXISTS search_document_ad",
+    "DROP TRIGGER IF EXISTS search_document_ai",
+    "DROP TABLE IF EXISTS search_document_fts",
+]
+
+
+def install_search_ddl(table):
+    """Create the dialect's full-text index whenever the search_document table is created"""
+    for statement in POSTGRES_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in SQLITE_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def extract_text(value) -> str:
+    """All string leaves of a JSON document, one per line"""
+    parts = []
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, dict):
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, (list, tuple)):
+            stack.extend(reversed(item))
+    return '\n'.join(parts)
+
+
+def campaign_document(campaign) -> Dict:
+    """search_document values for a campaign"""
+    return {
+        'kind': 'campaign',
+        'ref_id': campaign.id,
+        'campaign_id': campaign.id,
+        'title': campaign.campaign_name,
+        'body': '\n'.join(filter(None, [campaign.target_audience, campaign.objectives])),
+        'created_at': campaign.created_at
+    }
+
+
+def report_document(report, campaign) -> Dict:
+    """search_document values for a generated report"""
+    return {
+        'kind': 'report',
+        'ref_id': report.id,
+        'campaign_id': campaign.id,
+        'title': campaign.campaign_name,
+        'body': extract_text(report.payload),
+        'created_at': report.generated_at
+    }
+
+
+def _fts5_query(query: str) -> str:
+    """
+    Translate a web-style query into a safe FTS5 expression
+
+    Words and "quoted phrases" must all match, OR between terms is kept, and a
+    trailing * keeps prefix matching. Everything else is quoted, so user input
+    can never be a syntax error.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if word.upper() == 'OR' and terms and terms[-1] != 'OR':
+            terms.append('OR')
+            continue
+        token = phrase if phrase else word
+        prefix = not phrase and token.endswith('*')
+        token = token.rstrip('*').replace('"', '')
+        if token.strip():
+            terms.append(f'"{token}"' + ('*' if prefix else ''))
+    if terms and terms[-1] == 'OR':
+        terms.pop()
+    return ' '.join(terms)
+
+
+def search_documents(session, query: str, kind: Optional[str] = None, limit: int = 20) -> Dict:
+    """
+    Ranked full-text search over campaigns and reports
+
+    Uses the Postgres tsvector/GIN index (websearch syntax, ts_rank and
+    ts_headline) or the SQLite FTS5 index (bm25 and snippet). Highlights
+    are computed only for the returned page, not for every match.
+
+    Args:
+        session: SQLAlchemy session
+        query (str): Search text
+        kind (str): Restrict to 'campaign' or 'report'
+        limit (int): Maximum results
+
+    Returns:
+        dict: Results (kind, id, campaign_id, title, rank, highlight) and timing
+    """
+    if not query or not query.strip():
+        raise ValueError("Search query 'q' is required")
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise ValueError(f"'kind' must be one of: {', '.join(SEARCH_KINDS)}")
+
+    started = time.perf_counter()
+    dialect = session.get_bind().dialect.name
+    params = {'limit': limit, 'kind': kind}
+
+    if dialect == 'postgresql':
+        params['query'] = query
+        statement = text(f"""
+            SELECT page.kind, page.ref_id, page.campaign_id, page.title, page.rank,
+                   ts_headline('{SEARCH_LANGUAGE}', page.body, page.tsquery,
+                               'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2, MaxWords=25, MinWords=8')
+                       AS highlight
+            FROM (
+                SELECT d.kind, d.ref_id, d.campaign_id, d.title, d.body, q.tsquery,
+                       ts_rank(d.search_vector, q.tsquery) AS rank
+                FROM search_document d,
+                     websearch_to_tsquery('{SEARCH_LANGUAGE}', :query) AS q(tsquery)
+                WHERE d.search_vector @@ q.tsquery {'AND d.kind = :kind' if kind else ''}
+                ORDER BY rank DESC, d.created_at DESC
+                LIMIT :limit
+            ) AS page
+            ORDER BY page.rank DESC
+        """)
+    elif dialect == 'sqlite':
+        terms = _fts5_query(query)
+        if not terms:
+            raise ValueError("Search query has no searchable terms")
+        params['query'] = f'{{title body}} : ({terms})' + (f' AND kind : "{kind}"' if kind else '')
+        # Rank every match but build snippets only for the top page; bm25 is
+        # lower-is-better, so it is negated to keep rank higher-is-better
+        statement = text(f"""
+            SELECT d.kind, d.ref_id, d.campaign_id, d.title, -page.bm25 AS rank,
+                   snippet(search_document_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) AS highlight
+            FROM search_document_fts
+            JOIN (
+                SELECT rowid AS id, bm25(search_document_fts, 10.0, 1.0, 0.0) AS bm25
+                FROM search_document_fts
+                WHERE search_document_fts MATCH :query
+                ORDER BY bm25, rowid DESC
+                LIMIT :limit
+            ) AS page ON page.id = search_document_fts.rowid
+            JOIN search_document d ON d.id = search_document_fts.rowid
+            WHERE search_document_fts MATCH :query
+            ORDER BY page.bm25, d.id DESC
+        """)
+    else:
+        raise ValueError(f"Full-text search is not supported on {dialect}")
+
+    rows = session.execute(statement, params).all()
+    results: List[Dict] = [{
+        'kind': row.kind,
+        'id': row.ref_id,
+        'campaign_id': row.campaign_id,
+        'title': row.title,
+        'rank': round(float(row.rank), 6),
+        'highlight': row.highlight
+    } for row in rows]
+    took_ms = (time.perf_counter() - started) * 1000
+    logger.debug("Search for %r returned %s results in %.1f ms", query, len(results), took_ms)
+
+    return {'results': results, 'took_ms': round(took_ms, 2)}
+
+
+def reindex_search(session, campaign_model, report_model, document_model, batch_size: int = 500) -> Dict:
+    """
+    Rebuild search_document from campaigns and reports
+
+    The whole rebuild is one transaction: searches keep seeing the old
+    index until the new one is committed, and a failure part way through
+    rolls back to the old index instead of leaving it empty or partial.
+    Rows are flushed and expunged in batches, so memory stays bounded.
+
+    Args:
+        session: SQLAlchemy session
+        campaign_model: The Campaign model
+        report_model: The Report model
+        document_model: The SearchDocument model
+        batch_size (int): Rows indexed per flush
+
+    Returns:
+        dict: Number of campaigns and reports indexed
+    """
+    try:
+        counts = _rebuild_documents(session, campaign_model, report_model, document_model, batch_size)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    logger.info("Indexed %s campaigns and %s reports for search", counts['campaigns'], counts['reports'])
+    return counts
+
+
+def _rebuild_documents(session, campaign_model, report_model, document_model, batch_size: int) -> Dict:
+    session.query(document_model).delete()
+
+    counts = {'campaigns': 0, 'reports': 0}
+    last_id = 0
+    while True:
+        campaigns = (session.query(campaign_model).filter(campaign_model.id > last_id)
+                     .order_by(campaign_model.id).limit(batch_size).all())
+        if not campaigns:
+            break
+        last_id = campaigns[-1].id
+        session.add_all(document_model(**campaign_document(campaign)) for campaign in campaigns)
+        session.flush()
+        counts['campaigns'] += len(campaigns)
+        session.expunge_all()
+
+    last_id = 0
+    while True:
+        rows = (session.query(report_model, campaign_model)
+                .join(campaign_model, campaign_model.id == report_model.campaign_id)
+                .filter(report_model.id > last_id)
+                .order_by(report_model.id).limit(batch_size).all())
+        if not rows:
+            break
+        last_id = rows[-1][0].id
+        session.add_all(document_model(**report_document(report, campaign)) for report, campaign in rows)
+        session.flush()
+        counts['reports'] += len(rows)
+        session.expunge_all()
+
+    return counts
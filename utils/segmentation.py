@@ -0,0 +1,256 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.data_loading import DEFAULT_CHUNK_SIZE, iter_column_chunks
+
+logger = logging.getLogger(__name__)
+
+# Segment names used by the behavioral_segmentation section of the insights
+# prompt, assigned in descending order of the value column.
+SEGMENT_LABELS = ['high_value_segment', 'growth_segment', 'nurturing_segment']
+
+IDENTIFIER_COLUMNS = {'id', 'user_id', 'customer_id', 'email', 'hashed_email', 'device_id'}
+
+# Rows kept in the reservoir sample used for k-means++ seeding
+SEED_SAMPLE_SIZE = 20_000
+# k-means costs O(rows * segments) per pass and runs inside the request
+MAX_SEGMENTS = 20
+
+
+def _to_matrix(chunk: Dict[str, list], features: List[str]) -> np.ndarray:
+    """Stack the feature columns of a chunk into a float64 matrix (NaN for junk)"""
+    columns = []
+    for name in features:
+        values = chunk.get(name)
+        if values is None:
+            columns.append(np.full(len(next(iter(chunk.values()))), np.nan))
+            continue
+        try:
+            columns.append(np.asarray(values, dtype=np.float64))
+        except (TypeError, ValueError):
+            column = np.empty(len(values), dtype=np.float64)
+            for i, value in enumerate(values):
+                try:
+                    column[i] = float(value)
+                except (TypeError, ValueError):
+                    column[i] = np.nan
+            columns.append(column)
+    return np.column_stack(columns)
+
+
+def _detect_features(chunk: Dict[str, list]) -> List[str]:
+    """Numeric, non-identifier columns of the first chunk"""
+    features = []
+    for name in chunk:
+        if name.lower() in IDENTIFIER_COLUMNS:
+            continue
+        column = _to_matrix(chunk, [name])[:, 0]
+        if len(column) and np.isfinite(column).mean() >= 0.5:
+            features.append(name)
+    return features
+
+
+def _standardize(matrix: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Scale features to unit variance and impute missing values with the mean"""
+    scaled = (matrix - mean) / scale
+    scaled[~np.isfinite(scaled)] = 0.0
+    return scaled
+
+
+def _squared_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Pairwise squared Euclidean distances via one BLAS matrix product"""
+    distances = (
+        np.einsum('ij,ij->i', points, points)[:, None]
+        - 2.0 * points @ centers.T
+        + np.einsum('ij,ij->i', centers, centers)[None, :]
+    )
+    return np.maximum(distances, 0.0)
+
+
+def _kmeans_plus_plus(sample: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    centers = [sample[rng.integers(len(sample))]]
+    closest = _squared_distances(sample, np.array(centers))[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            index = rng.integers(len(sample))
+        else:
+            index = rng.choice(len(sample), p=closest / total)
+        centers.append(sample[index])
+        closest = np.minimum(closest, _squared_distances(sample, sample[index:index + 1])[:, 0])
+    return np.array(centers)
+
+
+def _assign_chunk(chunk: Dict[str, list], features: List[str], mean: np.ndarray,
+                  scale: np.ndarray, centers: np.ndarray) -> tuple:
+    """Final assignment pass for one chunk: sizes, raw feature sums and inertia"""
+    matrix = _to_matrix(chunk, features)
+    points = _standardize(matrix, mean, scale)
+    distances = _squared_distances(points, centers)
+    labels = distances.argmin(axis=1)
+    k = len(centers)
+    counts = np.bincount(labels, minlength=k)
+    raw = np.where(np.isfinite(matrix), matrix, mean)
+    sums = np.zeros((k, len(features)))
+    np.add.at(sums, labels, raw)
+    inertia = float(distances[np.arange(len(labels)), labels].sum())
+    return counts, sums, inertia
+
+
+def segment_customers(source, fmt: str, n_segments: int = 3, feature_columns: Optional[List[str]] = None,
+                      value_column: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      batch_size: int = 4096, seed: int = 0, workers: Optional[int] = None) -> Dict:
+    """
+    Cluster a customer feature table with streaming mini-batch k-means
+
+    The source is read three times, one chunk at a time: once for feature
+    scaling statistics and a seeding sample, once for the mini-batch centroid
+    updates and once, in parallel across chunks, for the final assignment.
+    Memory therefore stays bounded by the chunk size.
+
+    Args:
+        source: Seekable file path or binary file object
+        fmt (str): 'csv', 'ndjson' or 'parquet'
+        n_segments (int): Number of segments (k)
+        feature_columns (list): Numeric columns to cluster on (auto-detected if omitted)
+        value_column (str): Feature column used to rank segments (defaults to the first feature)
+        chunk_size (int): Rows read per chunk
+        batch_size (int): Rows per mini-batch update
+        seed (int): Random seed for reproducible segments
+        workers (int): Threads for the assignment pass (defaults to all cores)
+
+    Returns:
+        dict: Segment sizes, shares and centroids keyed by segment label
+    """
+    try:
+        if not 2 <= n_segments <= MAX_SEGMENTS:
+            raise ValueError(f"segment_count must be between 2 and {MAX_SEGMENTS}")
+        rng = np.random.default_rng(seed)
+
+        def chunks(columns=None):
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return iter_column_chunks(source, fmt, chunk_size=chunk_size, columns=columns)
+
+        # Pass 1: running mean/variance (Chan et al. merge) and a reservoir
+        # sample of rows with the smallest random keys for seeding
+        features = list(feature_columns) if feature_columns else None
+        count = 0
+        mean = m2 = None
+        sample = sample_keys = None
+        for chunk in chunks(features):
+            if features is None:
+                features = _detect_features(chunk)
+                if not features:
+                    raise ValueError("No numeric feature columns found in the customer data")
+            matrix = _to_matrix(chunk, features)
+            finite = np.isfinite(matrix)
+            chunk_count = finite.sum(axis=0)
+            chunk_mean = np.where(chunk_count > 0, np.nansum(matrix, axis=0) / np.maximum(chunk_count, 1), 0.0)
+            chunk_m2 = np.nansum((matrix - chunk_mean) ** 2, axis=0)
+            if mean is None:
+                count_vec, mean, m2 = chunk_count, chunk_mean, chunk_m2
+            else:
+                total = count_vec + chunk_count
+                delta = chunk_mean - mean
+                safe_total = np.maximum(total, 1)
+                mean = mean + delta * chunk_count / safe_total
+                m2 = m2 + chunk_m2 + delta ** 2 * count_vec * chunk_count / safe_total
+                count_vec = total
+            count += len(matrix)
+
+            keys = rng.random(len(matrix))
+            if sample is None:
+                sample, sample_keys = matrix, keys
+            else:
+                sample = np.vstack([sample, matrix])
+                sample_keys = np.concatenate([sample_keys, keys])
+            if len(sample) > SEED_SAMPLE_SIZE:
+                keep = np.argpartition(sample_keys, SEED_SAMPLE_SIZE)[:SEED_SAMPLE_SIZE]
+                sample, sample_keys = sample[keep], sample_keys[keep]
+
+        if count < n_segments:
+            raise ValueError(f"Need at least {n_segments} customer rows to build {n_segments} segments")
+        if value_column is not None and value_column not in features:
+            raise ValueError(f"Unknown value column '{value_column}' (numeric columns: {', '.join(features)})")
+
+        scale = np.sqrt(m2 / np.maximum(count_vec - 1, 1))
+        scale[scale == 0] = 1.0
+        centers = _kmeans_plus_plus(_standardize(sample, mean, scale), n_segments, rng)
+
+        # Pass 2: mini-batch k-means with per-center learning rates (Sculley, 2010)
+        seen = np.zeros(n_segments)
+        batches = 0
+        for chunk in chunks(features):
+            points = _standardize(_to_matrix(chunk, features), mean, scale)
+            points = points[rng.permutation(len(points))]
+            for start in range(0, len(points), batch_size):
+                batch = points[start:start + batch_size]
+                labels = _squared_distances(batch, centers).argmin(axis=1)
+                batch_counts = np.bincount(labels, minlength=n_segments)
+                batch_sums = np.zeros_like(centers)
+                np.add.at(batch_sums, labels, batch)
+                updated = batch_counts > 0
+                seen_after = seen + batch_counts
+                centers[updated] = (
+                    centers[updated] * seen[updated, None] + batch_sums[updated]
+                ) / seen_after[updated, None]
+                seen = seen_after
+                batches += 1
+
+        # Pass 3: assign every row against the final centroids, overlapping
+        # chunk parsing with numpy work on the other cores
+        sizes = np.zeros(n_segments, dtype=np.int64)
+        sums = np.zeros((n_segments, len(features)))
+        inertia = 0.0
+        workers = workers or os.cpu_count() or 1
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunks(features):
+                pending.append(executor.submit(_assign_chunk, chunk, features, mean, scale, centers))
+                # Cap chunks in flight so memory stays bounded
+                while len(pending) > workers * 2 or (pending and pending[0].done()):
+                    chunk_sizes, chunk_sums, chunk_inertia = pending.popleft().result()
+                    sizes += chunk_sizes
+                    sums += chunk_sums
+                    inertia += chunk_inertia
+            for future in pending:
+                chunk_sizes, chunk_sums, chunk_inertia = future.result()
+                sizes += chunk_sizes
+                sums += chunk_sums
+                inertia += chunk_inertia
+
+        centroids = sums / np.maximum(sizes, 1)[:, None]
+        rank_feature = value_column or features[0]
+        order = np.argsort(-centroids[:, features.index(rank_feature)])
+
+        segments = {}
+        for rank, cluster in enumerate(order):
+            label = SEGMENT_LABELS[rank] if rank < len(SEGMENT_LABELS) else f'segment_{rank + 1}'
+            segments[label] = {
+                'size': int(sizes[cluster]),
+                'share': round(float(sizes[cluster]) / count, 4),
+                'centroid': {name: round(float(value), 4) for name, value in zip(features, centroids[cluster])}
+            }
+
+        logger.info("Segmented %d customers into %d segments over %d mini-batches", count, n_segments, batches)
+
+        return {
+            'segments': segments,
+            'total_customers': int(count),
+            'features': features,
+            'value_column': rank_feature,
+            'inertia': round(inertia, 4),
+            'mini_batches': batches
+        }
+
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error("Error segmenting customers: %s", e)
+        raise Exception(f"Failed to segment customers: {str(e)}")
@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, NamedTuple, Optional
+
+from flask import Flask, Response, current_app, render_template, request, url_for
+
+from utils.http_cache import COMPRESSIBLE_TYPES, brotli
+
+# Fingerprinted URLs never change content, so caches may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# The page itself names the current asset URLs, so it is always revalidated
+PAGE_CACHE_CONTROL = 'no-cache'
+# Compressed once per process, so use the slowest, smallest settings
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+MIN_COMPRESS_SIZE = 256
+
+
+class Encoded(NamedTuple):
+    """A body and its precompressed variants, keyed by Content-Encoding (None = identity)"""
+    variants: Dict[Optional[str], bytes]
+    etag: str
+    mimetype: str
+
+
+def encode_variants(data: bytes, mimetype: str) -> Encoded:
+    variants = {None: data}
+    if mimetype in COMPRESSIBLE_TYPES and len(data) >= MIN_COMPRESS_SIZE:
+        variants['gzip'] = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            variants['br'] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return Encoded(variants, hashlib.blake2b(data, digest_size=16).hexdigest(), mimetype)
+
+
+def encoded_response(encoded: Encoded, cache_control: str) -> Response:
+    """The smallest variant the client accepts, or 304 when it already has it"""
+    accepted = request.accept_encodings
+    encoding = next((name for name in ('br', 'gzip') if name in encoded.variants and accepted[name]), None)
+    # Tagged like init_compression's output: "<etag>-gzip" / "<etag>-br"
+    tag = encoded.etag if encoding is None else f'{encoded.etag}-{encoding}'
+    if request.if_none_match.contains(tag) or request.if_none_match.star_tag:
+        response = Response(status=304)
+    else:
+        response = Response(encoded.variants[encoding], mimetype=encoded.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(tag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+class StaticAssets:
+    """
+    Content-hashed static URLs and a cached dashboard page
+
+    At startup every file under the static folder is hashed and, if
+    compressible, gzip (and brotli, when installed) compressed once.
+    Templates call `asset_url('css/style.css')`, which returns
+    `/static/css/style.<hash>.css`; that URL is served from memory with
+    a year-long immutable Cache-Control, so browsers never revalidate it and
+    a changed file simply gets a new URL. Plain /static paths still work,
+    with Flask's default headers. Rendered pages are cached per process with
+    their compressed variants. In debug mode pages are rendered per request
+    and link the plain paths, so edits show up on reload; STATIC_FINGERPRINT=0
+    turns all of it off.
+    """
+
+    def __init__(self):
+        self.assets: Dict[str, Encoded] = {}
+        # 'css/style.css' -> 'css/style.<hash>.css' and back
+        self.manifest: Dict[str, str] = {}
+        self._originals: Dict[str, str] = {}
+        self._pages: Dict[str, Encoded] = {}
+        self.enabled = False
+
+    def init_app(self, app: Flask):
+        self.enabled = os.environ.get('STATIC_FINGERPRINT', '1').lower() not in ('0', 'false', 'no')
+        if self.enabled and app.static_folder and os.path.isdir(app.static_folder):
+            self._build(app.static_folder)
+        send_static = app.view_functions['static']
+
+        def static(filename):
+            original = self._originals.get(filename)
+            if original is None:
+                return send_static(filename=filename)
+            return encoded_response(self.assets[original], IMMUTABLE_CACHE_CONTROL)
+
+        app.view_functions['static'] = static
+        app.add_template_global(self.url, 'asset_url')
+
+    def _build(self, folder: str):
+        for directory, _, files in os.walk(folder):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                encoded = encode_variants(data, mimetype)
+                stem, extension = os.path.splitext(name)
+                fingerprinted = f'{stem}.{encoded.etag[:12]}{extension}'
+                self.assets[name] = encoded
+                self.manifest[name] = fingerprinted
+                self._originals[fingerprinted] = name
+
+    def url(self, filename: str) -> str:
+        """URL of a static file, content-hashed when fingerprinting is on"""
+        if current_app.debug:
+            return url_for('static', filename=filename)
+        return url_for('static', filename=self.manifest.get(filename, filename))
+
+    def page(self, template: str, **context) -> Response:
+        """
+        render_template() rendered once and served from memory, with ETag and
+        compressed variants; only for pages that do not vary per request
+        """
+        if not self.enabled or current_app.debug:
+            return Response(render_template(template, **context), mimetype='text/html')
+        encoded = self._pages.get(template)
+        if encoded is None:
+            encoded = encode_variants(render_template(template, **context).encode('utf-8'), 'text/html')
+            self._pages[template] = encoded
+        return encoded_response(encoded, PAGE_CACHE_CONTROL)
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,409 @@
+import contextvars
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import chain
+from typing import Callable, Dict, Iterator, List, Optional
+
+from flask import Flask, g, request
+
+from utils import fast_json
+
+DEFAULT_TRACE_FILE = os.path.join('traces', 'traces.jsonl')
+# The file is moved to TRACE_FILE.1 (replacing the previous one) past this size
+DEFAULT_TRACE_FILE_MAX_BYTES = 100 * 1024 * 1024
+# Admin header that makes an incoming sampled traceparent count (with TRACE_TOKEN)
+TRACE_TOKEN_HEADER = 'X-Trace-Token'
+# Bytes read at a time when scanning a trace file backwards
+_TAIL_BLOCK = 1 << 16
+TRACE_EXPORTERS = ('file', 'console', 'none')
+SERVICE_NAME = 'novaedge-marketing'
+
+# W3C trace context: version-traceid-spanid-flags
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class _LocalTrace:
+    """Spans of one trace finished in this process, exported when the local root ends"""
+
+    __slots__ = ('spans', 'lock', 'exported')
+
+    def __init__(self):
+        self.spans: List['Span'] = []
+        self.lock = threading.Lock()
+        self.exported = False
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns',
+                 'status', 'local', 'is_local_root')
+
+    def __init__(self, tracer: 'Tracer', trace_id: str, parent_id: Optional[str], name: str,
+                 local: _LocalTrace, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_OK
+        self.local = local
+        self.is_local_root = False
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.attributes['exception.type'] = type(error).__name__
+        self.attributes['exception.message'] = str(error)[:500]
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.tracer._finished(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 2 if self.is_local_root and self.name.startswith('HTTP ') else 1,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': self.status},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _plain_value(value: Dict):
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return next(iter(value.values()), None)
+
+
+class Tracer:
+    """
+    Minimal in-process tracer with an OTLP/JSON exporter
+
+    A request is traced with probability TRACE_SAMPLE_RATE (default 0, off).
+    A sampled W3C `traceparent` from the caller is honoured when tracing is
+    on, or when the request carries `X-Trace-Token: <TRACE_TOKEN>`; anyone
+    else cannot make the server write traces. Spans nest through a context
+    variable, so they follow asyncio tasks and `asyncio.to_thread`; use
+    `propagate()` for other worker threads. When a trace's local root span
+    ends, its spans are written as one OTLP/JSON line (the OpenTelemetry
+    file exporter format) to TRACE_FILE, which is rotated to TRACE_FILE.1
+    past TRACE_FILE_MAX_BYTES, or to stderr with TRACE_EXPORTER=console.
+    Nothing else is needed to view them: `flask trace <trace_id>` prints a
+    waterfall.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, exporter: Optional[str] = None,
+                 path: Optional[str] = None, max_bytes: Optional[int] = None, token: Optional[str] = None):
+        self.sample_rate = float(sample_rate if sample_rate is not None
+                                 else os.environ.get('TRACE_SAMPLE_RATE', 0))
+        self.exporter = (exporter or os.environ.get('TRACE_EXPORTER') or 'file').lower()
+        if self.exporter not in TRACE_EXPORTERS:
+            raise ValueError(f"Unknown TRACE_EXPORTER: {self.exporter} (expected one of {', '.join(TRACE_EXPORTERS)})")
+        self.path = path or os.environ.get('TRACE_FILE') or DEFAULT_TRACE_FILE
+        # 0 turns rotation off
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else os.environ.get('TRACE_FILE_MAX_BYTES', DEFAULT_TRACE_FILE_MAX_BYTES))
+        self.token = token or os.environ.get('TRACE_TOKEN') or None
+        self._write_lock = threading.Lock()
+
+    def trusted(self, supplied: Optional[str]) -> bool:
+        """Whether supplied is the TRACE_TOKEN admin token"""
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, force: bool = False,
+                    attributes: Optional[Dict] = None, trusted: bool = False) -> Optional[Span]:
+        """
+        Local root span, or None when the trace is not sampled; activate it
+        with use(). The traceparent's sampled flag only counts when tracing is
+        on or the caller is trusted.
+        """
+        parent_id = None
+        match = _TRACEPARENT.match(traceparent or '')
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = force or (int(flags, 16) & 1 and (trusted or self.sample_rate > 0))
+        else:
+            trace_id = f'{random.getrandbits(128):032x}'
+            sampled = force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not sampled or self.exporter == 'none':
+            return None
+        root = Span(self, trace_id, parent_id, name, _LocalTrace(), attributes)
+        root.is_local_root = True
+        return root
+
+    @contextmanager
+    def use(self, span: Optional[Span]):
+        """Make span the current one (and end it) for the duration of the block"""
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _finished(self, span: Span):
+        local = span.local
+        with local.lock:
+            local.spans.append(span)
+            if not (span.is_local_root or local.exported):
+                return
+            # Spans that end after their root (background work) go out on their own
+            spans, local.spans = local.spans, []
+            local.exported = True
+        self._export(spans)
+
+    def _export(self, spans: List[Span]):
+        line = fast_json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+                                        {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': [span.to_otlp() for span in spans]}],
+        }]}) + b'\n'
+        with self._write_lock:
+            if self.exporter == 'console':
+                sys.stderr.buffer.write(line)
+                sys.stderr.flush()
+            else:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._rotate(len(line))
+                # One append per trace; O_APPEND keeps lines whole across workers
+                with open(self.path, 'ab') as f:
+                    f.write(line)
+
+    def _rotate(self, incoming: int):
+        if not self.max_bytes:
+            return
+        try:
+            if os.path.getsize(self.path) + incoming > self.max_bytes:
+                os.replace(self.path, f'{self.path}.1')
+        except FileNotFoundError:
+            # Not written yet, or another worker rotated it first
+            pass
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Child span of the current one; a no-op outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.tracer, parent.trace_id, parent.span_id, name, parent.local, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def propagate(fn: Callable) -> Callable:
+    """fn bound to the caller's trace context, for running in another thread"""
+    if _current_span.get() is None:
+        return fn
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def init_tracing(app: Flask):
+    """Root span per sampled request; its trace id is returned as X-Trace-Id"""
+
+    @app.before_request
+    def start_request_span():
+        root = tracer.start_trace(f'HTTP {request.method} {request.path}', request.headers.get('traceparent'),
+                                  attributes={'http.method': request.method, 'http.target': request.path},
+                                  trusted=tracer.trusted(request.headers.get(TRACE_TOKEN_HEADER)))
+        if root is not None:
+            g.trace_root = root
+            g.trace_token = _current_span.set(root)
+
+    @app.after_request
+    def add_trace_header(response):
+        root = g.get('trace_root')
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                root.status = STATUS_ERROR
+            response.headers['X-Trace-Id'] = root.trace_id
+        return response
+
+    @app.teardown_request
+    def end_request_span(exc):
+        root = g.pop('trace_root', None)
+        if root is None:
+            return
+        if request.url_rule is not None:
+            root.name = f'HTTP {request.method} {request.url_rule.rule}'
+        if exc is not None:
+            root.record_error(exc)
+        _current_span.reset(g.pop('trace_token'))
+        root.end()
+
+
+def _trace_files(path: Optional[str]) -> List[str]:
+    """The trace file and its rotated predecessor, oldest first"""
+    path = path or tracer.path
+    files = [name for name in (f'{path}.1', path) if os.path.exists(name)]
+    # Missing entirely: let open() raise FileNotFoundError for the caller
+    return files or [path]
+
+
+def _line_spans(line: bytes) -> Iterator[Dict]:
+    for resource in fast_json.loads(line).get('resourceSpans', []):
+        for scope in resource.get('scopeSpans', []):
+            yield from scope.get('spans', [])
+
+
+def _reversed_lines(path: str) -> Iterator[bytes]:
+    """Lines of a file from the last to the first, read in blocks from the end"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b''
+        while position > 0:
+            step = min(_TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + tail).split(b'\n')
+            # The first piece may be the end of a line that starts further back
+            tail = lines.pop(0)
+            yield from reversed(lines)
+        yield tail
+
+
+def load_traces(path: Optional[str] = None, limit: Optional[int] = None,
+                trace_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """
+    Spans from an OTLP/JSON lines file (and its rotated .1), grouped by trace
+    id, in file order. With limit only the newest `limit` traces are read,
+    from the end of the files; with trace_id only traces whose id starts
+    with it are kept. Either way memory stays bounded by what is returned.
+    """
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    files = _trace_files(path)
+    if limit is None:
+        for name in files:
+            with open(name, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    for item in _line_spans(line):
+                        if trace_id is None or item['traceId'].startswith(trace_id):
+                            traces[item['traceId']].append(item)
+        return traces
+
+    newest: List[bytes] = []
+    seen = set()
+    for line in chain.from_iterable(_reversed_lines(name) for name in reversed(files)):
+        if not line.strip():
+            continue
+        ids = {item['traceId'] for item in _line_spans(line)}
+        if trace_id is not None:
+            ids = {key for key in ids if key.startswith(trace_id)}
+            if not ids:
+                continue
+        if not ids <= seen and len(seen) >= limit:
+            break
+        seen |= ids
+        newest.append(line)
+    for line in reversed(newest):
+        for item in _line_spans(line):
+            if item['traceId'] in seen:
+                traces[item['traceId']].append(item)
+    return traces
+
+
+def render_waterfall(spans: List[Dict], width: int = 50) -> str:
+    """ASCII waterfall of one trace: spans in start order, indented by depth, with timing bars"""
+    spans = sorted(spans, key=lambda item: int(item['startTimeUnixNano']))
+    start = min(int(item['startTimeUnixNano']) for item in spans)
+    end = max(int(item['endTimeUnixNano']) for item in spans)
+    total = max(end - start, 1)
+
+    ids = {item['spanId'] for item in spans}
+    children = defaultdict(list)
+    for item in spans:
+        parent = item.get('parentSpanId')
+        children[parent if parent in ids else None].append(item)
+
+    rows = []
+
+    def walk(item, depth):
+        rows.append((depth, item))
+        for child in children.get(item['spanId'], []):
+            walk(child, depth + 1)
+
+    for root in children[None]:
+        walk(root, 0)
+
+    label_width = min(max(len(item['name']) + 2 * depth for depth, item in rows), 60)
+    lines = [f"trace {spans[0]['traceId']}  {total / 1e6:.1f} ms  {len(spans)} spans",
+             f"{'span':<{label_width}}  {'start ms':>9}  {'dur ms':>9}"]
+    for depth, item in rows:
+        begin = int(item['startTimeUnixNano']) - start
+        duration = int(item['endTimeUnixNano']) - int(item['startTimeUnixNano'])
+        left = int(begin / total * width)
+        bar = max(1, round(duration / total * width))
+        marker = '!' if item.get('status', {}).get('code') == STATUS_ERROR else '#'
+        label = ('  ' * depth + item['name'])[:label_width]
+        lines.append(f"{label:<{label_width}}  {begin / 1e6:>9.1f}  {duration / 1e6:>9.1f}  "
+                     f"|{' ' * left}{marker * min(bar, width - left)}{' ' * max(0, width - left - bar)}|")
+        attributes = {a['key']: _plain_value(a['value']) for a in item.get('attributes', [])}
+        if 'exception.message' in attributes:
+            lines.append(f"{'':<{label_width}}  ! {attributes.get('exception.type')}: {attributes['exception.message']}")
+    return '\n'.join(lines)